@@ -1,75 +1,104 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory
-from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import (Flask, render_template, stream_template, request, redirect, url_for, flash, session,
+                   jsonify, get_flashed_messages, Response, stream_with_context)
 import os
-import sqlite3
-from datetime import datetime
+import threading
+from werkzeug.utils import secure_filename
 from config import Config
+from database import connection
+from database.connection import get_db_connection, get_pool_stats
+from database.migrations import ensure_schema
+from database.models import User, File, decode_cursor
+from database.user_cache import user_cache
+from database.user_stats import get_user_stats, remaining_quota
+from utils.api import FILES_QUERY, USERS_QUERY, stream_listing
+from utils.archives import iter_archive_rows, iter_zip
+from utils.blobs import delete_file_entry
+from utils.bulk import delete_files, relink_files, delete_users
+from utils.downloads import send_stored_file, content_disposition
+from utils.fragment_cache import fragment_cache
+from utils.hot_cache import hot_file_cache
+from utils.metrics import metrics, init_app as init_metrics
+from utils.previews import preview_store, has_preview
+from utils.passwords import (HashingOverloaded, hash_password, verify_password, needs_rehash,
+                             get_hashing_stats)
+from utils.reconcile import start_scheduler
+from utils.tiering import start_scheduler as start_tiering
+from utils.unlinker import unlinker
+from utils.uploads import (UploadError, save_uploaded_files, create_upload,
+                           get_upload, append_chunk, finalize_upload, discard_upload)
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Mesurer les requêtes (avant les autres before_request pour inclure leur durée)
+init_metrics(app)
+
+# Lier le pool de connexions SQLite au contexte d'application
+connection.init_app(app)
+
 # Assurez-vous que le dossier d'upload existe
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Les templates n'affichent une miniature que pour les images (et si Pillow est installé)
+app.jinja_env.globals['has_preview'] = has_preview
+
 # Fonction pour vérifier si l'extension de fichier est autorisée
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
-# Fonction pour obtenir une connexion à la base de données
-def get_db_connection():
-    conn = sqlite3.connect(app.config['DATABASE_PATH'])
-    conn.row_factory = sqlite3.Row
-    return conn
+# Base de données à jour au démarrage : une lecture de PRAGMA user_version,
+# les migrations éventuelles n'étant appliquées que par un seul worker
+ensure_schema()
 
-# Initialisation de la base de données si elle n'existe pas
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Création de la table users si elle n'existe pas
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        username TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        is_admin INTEGER NOT NULL DEFAULT 0
-    )
-    ''')
-    
-    # Création de la table files si elle n'existe pas
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS files (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        filename TEXT NOT NULL,
-        original_filename TEXT NOT NULL,
-        uploaded_by INTEGER NOT NULL,
-        upload_date TIMESTAMP NOT NULL,
-        filesize INTEGER NOT NULL,
-        FOREIGN KEY (uploaded_by) REFERENCES users (id)
-    )
-    ''')
-    
-    # Vérifier si un admin existe déjà, sinon en créer un
-    cursor.execute("SELECT * FROM users WHERE is_admin = 1")
-    if not cursor.fetchone():
-        admin_password = generate_password_hash('admin123')
-        cursor.execute("INSERT INTO users (username, password, is_admin) VALUES (?, ?, 1)", 
-                      ('admin', admin_password))
-    
-    conn.commit()
-    conn.close()
+# Ne pas garder de connexion SQLite ouverte depuis l'import : avec gunicorn --preload,
+# les workers créés par fork en hériteraient
+connection.pool.clear()
+
+# Tâches de fond démarrées dans chaque processus à sa première requête : des threads
+# lancés à l'import ne survivraient pas au fork des workers (gunicorn --preload)
+_background_lock = threading.Lock()
+_background_pid = None
 
-# Initialiser la base de données au démarrage de l'application
-init_db()
+@app.before_request
+def start_background_jobs():
+    global _background_pid
+    if _background_pid == os.getpid():
+        return None
+    with _background_lock:
+        if _background_pid != os.getpid():
+            # Réconciliation périodique des fichiers et de la base (un seul worker à la fois)
+            start_scheduler()
+            # Mode 'tiered' : déplacement périodique des fichiers inutilisés vers le niveau froid
+            start_tiering()
+            _background_pid = os.getpid()
+    return None
 
 # Middleware pour vérifier si l'utilisateur est connecté
 @app.before_request
 def require_login():
     allowed_routes = ['login', 'static']
-    if request.endpoint not in allowed_routes and 'user_id' not in session:
+    if request.endpoint in allowed_routes:
+        return None
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    # Vérifier que le compte existe toujours et rafraîchir ses droits (cache, sans requête SQL)
+    user = User.get_cached(session['user_id'])
+    if user is None:
+        session.clear()
         return redirect(url_for('login'))
+    if session.get('is_admin') != user.is_admin:
+        session['is_admin'] = user.is_admin
+
+# Pool de hachage saturé : refuser la requête plutôt que de bloquer les workers
+@app.errorhandler(HashingOverloaded)
+def handle_hashing_overloaded(error):
+    message = 'Serveur momentanément surchargé, veuillez réessayer dans quelques instants'
+    if request.endpoint == 'login':
+        flash(message)
+        return render_template('login.html'), 503, {'Retry-After': '1'}
+    return message, 503, {'Retry-After': '1'}
 
 # Route pour la page de connexion
 @app.route('/', methods=['GET', 'POST'])
@@ -83,7 +112,16 @@ def login():
         user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
         conn.close()
         
-        if user and check_password_hash(user['password'], password):
+        if user and verify_password(user['password'], password):
+            # Recalculer le hash si la méthode configurée a changé depuis sa création
+            if needs_rehash(user['password']):
+                conn = get_db_connection()
+                conn.execute('UPDATE users SET password = ? WHERE id = ?',
+                             (hash_password(password), user['id']))
+                conn.commit()
+                conn.close()
+                user_cache.invalidate(user['id'])
+            
             session['user_id'] = user['id']
             session['username'] = user['username']
             session['is_admin'] = user['is_admin']
@@ -103,22 +141,49 @@ def logout():
     session.clear()
     return redirect(url_for('login'))
 
+# Liste de tous les utilisateurs (page d'administration)
+def get_all_users():
+    conn = get_db_connection()
+    # Compteurs d'utilisation lus dans user_stats (une recherche par utilisateur, sans parcourir files)
+    users = conn.execute('''
+        SELECT users.*, COALESCE(user_stats.file_count, 0) AS file_count,
+               COALESCE(user_stats.total_bytes, 0) AS total_bytes, user_stats.last_upload
+        FROM users
+        LEFT JOIN user_stats ON user_stats.user_id = users.id
+    ''').fetchall()
+    conn.close()
+    return users
+
+# Page envoyée au fil de son rendu (le début du HTML part avant la fin du template)
+def render_page(template, **context):
+    # Les messages flash sont retirés de la session maintenant : une fois la réponse
+    # commencée, le cookie de session ne peut plus être mis à jour
+    get_flashed_messages()
+    return Response(stream_template(template, **context))
+
+# Tableau des fichiers d'un tableau de bord, rendu une fois par version des données
+def render_files_table(template, with_users=False):
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    
+    def render():
+        files, next_cursor = File.get_page_with_users(limit=limit, cursor=decode_cursor(cursor))
+        users = get_all_users() if with_users else None
+        return render_template(template, files=files, next_cursor=next_cursor, users=users)
+    
+    # Le fragment dépend des paramètres bruts (repris dans les liens de pagination)
+    key = (template, request.args.get('limit'), cursor)
+    return fragment_cache.get_or_render(key, render)
+
 # Route pour le tableau de bord utilisateur
 @app.route('/user')
 def user_dashboard():
     if session.get('is_admin'):
         return redirect(url_for('admin_dashboard'))
     
-    conn = get_db_connection()
-    files = conn.execute('''
-    SELECT files.id, files.original_filename, files.upload_date, files.filesize, users.username 
-    FROM files 
-    JOIN users ON files.uploaded_by = users.id
-    ORDER BY files.upload_date DESC
-    ''').fetchall()
-    conn.close()
+    files_table = render_files_table('fragments/user_files.html')
     
-    return render_template('user.html', files=files)
+    return render_page('user.html', files_table=files_table, usage=get_user_stats(session['user_id']))
 
 # Route pour le tableau de bord admin
 @app.route('/admin')
@@ -126,70 +191,198 @@ def admin_dashboard():
     if not session.get('is_admin'):
         return redirect(url_for('user_dashboard'))
     
-    conn = get_db_connection()
-    users = conn.execute('SELECT * FROM users').fetchall()
-    files = conn.execute('''
-    SELECT files.id, files.original_filename, files.upload_date, files.filesize, users.username 
-    FROM files 
-    JOIN users ON files.uploaded_by = users.id
-    ORDER BY files.upload_date DESC
-    ''').fetchall()
-    conn.close()
+    # Le tableau des utilisateurs dépend de l'administrateur connecté (pas d'auto-suppression)
+    users_table = fragment_cache.get_or_render(
+        ('fragments/admin_users.html', session['user_id']),
+        lambda: render_template('fragments/admin_users.html', users=get_all_users())
+    )
+    files_table = render_files_table('fragments/admin_files.html', with_users=True)
     
-    return render_template('admin.html', users=users, files=files)
+    return render_page('admin.html', users_table=users_table, files_table=files_table)
+
+# Route pour la recherche de fichiers (nom du fichier ou de l'utilisateur)
+@app.route('/search')
+def search_files():
+    query = request.args.get('q', '').strip()
+    files, next_cursor = File.search(
+        query,
+        limit=request.args.get('limit', type=int),
+        cursor=decode_cursor(request.args.get('cursor'))
+    )
+    
+    return render_page('search.html', query=query, files=files, next_cursor=next_cursor)
 
 # Route pour télécharger un fichier
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
+    files = [f for f in request.files.getlist('file') if f.filename]
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    
+    if not files:
+        if wants_json:
+            return jsonify({'error': 'Aucun fichier sélectionné'}), 400
         flash('Aucun fichier sélectionné')
         return redirect(request.referrer)
     
-    file = request.files['file']
-    
-    if file.filename == '':
-        flash('Aucun fichier sélectionné')
+    # Quota déjà atteint : refuser avant d'écrire quoi que ce soit sur disque
+    # (le dépassement par les fichiers de ce lot est vérifié à l'enregistrement)
+    remaining = remaining_quota(session['user_id'])
+    if remaining is not None and remaining <= 0:
+        if wants_json:
+            return jsonify({'error': 'Quota de stockage dépassé'}), 413
+        flash('Quota de stockage dépassé')
         return redirect(request.referrer)
     
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        # Ajouter un timestamp pour éviter les conflits de noms de fichiers
-        unique_filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
-        
-        # Enregistrer les informations du fichier dans la base de données
-        conn = get_db_connection()
-        conn.execute('''
-        INSERT INTO files (filename, original_filename, uploaded_by, upload_date, filesize)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (unique_filename, filename, session['user_id'], datetime.now(), os.path.getsize(file_path)))
-        conn.commit()
-        conn.close()
-        
-        flash('Fichier téléchargé avec succès')
+    # Écriture des fichiers en parallèle, puis une seule transaction pour tout le lot
+    results = save_uploaded_files(files, session['user_id'], allowed_file)
+    # Miniatures générées en arrière-plan, après la validation de la transaction
+    preview_store.schedule(result['file_id'] for result in results if result['ok'])
+    
+    if wants_json:
+        return jsonify({'results': results})
+    
+    succeeded = sum(1 for result in results if result['ok'])
+    if len(results) == 1:
+        flash('Fichier téléchargé avec succès' if succeeded else results[0]['error'])
     else:
-        flash('Type de fichier non autorisé')
+        flash(f'{succeeded} fichier(s) sur {len(results)} téléchargé(s) avec succès')
+        for result in results:
+            if not result['ok']:
+                flash(f"{result['filename']} : {result['error']}")
     
     if session.get('is_admin'):
         return redirect(url_for('admin_dashboard'))
     else:
         return redirect(url_for('user_dashboard'))
 
-# Route pour télécharger un fichier
-@app.route('/download/<int:file_id>')
-def download_file(file_id):
+# Routes pour l'upload par morceaux (fichiers volumineux, reprise après interruption)
+@app.errorhandler(UploadError)
+def handle_upload_error(error):
+    payload = {'error': error.message}
+    if error.offset is not None:
+        payload['offset'] = error.offset
+    return jsonify(payload), error.status
+
+@app.route('/upload/init', methods=['POST'])
+def upload_init():
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    
+    if not filename or not allowed_file(filename):
+        raise UploadError('Type de fichier non autorisé')
+    
+    try:
+        total_size = int(data.get('size'))
+    except (TypeError, ValueError):
+        raise UploadError('Taille de fichier invalide')
+    
+    upload_id = create_upload(session['user_id'], filename, total_size)
+    return jsonify({
+        'upload_id': upload_id,
+        'offset': 0,
+        'chunk_size': app.config['UPLOAD_CHUNK_SIZE']
+    }), 201
+
+@app.route('/upload/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    upload = get_upload(upload_id, session['user_id'])
+    return jsonify({'upload_id': upload_id, 'offset': upload['received'], 'size': upload['total_size']})
+
+@app.route('/upload/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    upload = get_upload(upload_id, session['user_id'])
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        raise UploadError('Paramètre offset manquant', offset=upload['received'])
+    
+    new_offset = append_chunk(upload, offset, request.stream)
+    return jsonify({'upload_id': upload_id, 'offset': new_offset})
+
+@app.route('/upload/<upload_id>/finalize', methods=['POST'])
+def upload_finalize(upload_id):
+    upload = get_upload(upload_id, session['user_id'])
+    data = request.get_json(silent=True) or {}
+    
+    file_entry, sha256 = finalize_upload(upload, data.get('sha256'))
+    preview_store.schedule([file_entry.id])
+    flash('Fichier téléchargé avec succès')
+    return jsonify({'file_id': file_entry.id, 'uid': file_entry.uid, 'size': file_entry.filesize,
+                    'sha256': sha256})
+
+@app.route('/upload/<upload_id>', methods=['DELETE'])
+def upload_abort(upload_id):
+    get_upload(upload_id, session['user_id'])
+    discard_upload(upload_id)
+    return '', 204
+
+# Ligne files d'un téléchargement, lue par le cache des fichiers fréquents en cas d'absence
+def load_file_row(file_id):
     conn = get_db_connection()
     file = conn.execute('SELECT * FROM files WHERE id = ?', (file_id,)).fetchone()
     conn.close()
+    return file
+
+# Route pour télécharger un fichier
+@app.route('/download/<int:file_id>')
+def download_file(file_id):
+    # Petits fichiers fréquents : ligne et contenu servis depuis la mémoire du worker
+    file, data = hot_file_cache.get(file_id, load_file_row)
     
     if file:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], file['filename'], 
-                                   download_name=file['original_filename'], as_attachment=True)
+        # ETag / Last-Modified, 304, plages d'octets et délégation éventuelle au proxy
+        return send_stored_file(file, data)
     
     flash('Fichier non trouvé')
     return redirect(request.referrer)
 
+# Téléchargement groupé : archive ZIP des fichiers sélectionnés ou de tous ceux d'un utilisateur
+@app.route('/download/archive', methods=['GET', 'POST'])
+def download_archive():
+    file_ids = request.values.getlist('file_ids', type=int)
+    user_id = request.values.get('user_id', type=int)
+    
+    if file_ids:
+        rows = iter_archive_rows(file_ids=file_ids)
+        archive_name = 'fichiers.zip'
+    elif user_id is not None:
+        user = User.get_cached(user_id)
+        if user is None:
+            flash('Utilisateur introuvable')
+            return redirect(request.referrer or url_for('user_dashboard'))
+        rows = iter_archive_rows(user_id=user_id)
+        # Nom d'utilisateur assaini avant d'entrer dans Content-Disposition
+        archive_name = f"{secure_filename(user.username) or 'archive'}.zip"
+    else:
+        flash('Aucun fichier sélectionné')
+        return redirect(request.referrer or url_for('user_dashboard'))
+    
+    # Premier fichier lu avant de répondre : une sélection vide reste une erreur classique
+    first = next(rows, None)
+    if first is None:
+        flash('Aucun fichier à télécharger')
+        return redirect(request.referrer or url_for('user_dashboard'))
+    
+    def all_rows():
+        yield first
+        yield from rows
+    
+    response = Response(stream_with_context(iter_zip(all_rows())), mimetype='application/zip')
+    response.headers['Content-Disposition'] = content_disposition(archive_name)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# Miniature d'une image, chargée à la demande par les tableaux de bord
+@app.route('/preview/<int:file_id>')
+def preview_file(file_id):
+    conn = get_db_connection()
+    file = conn.execute('SELECT id, filename, original_filename, sha256, codec FROM files WHERE id = ?',
+                        (file_id,)).fetchone()
+    conn.close()
+    
+    if file is None:
+        return '', 404
+    return preview_store.send(file)
+
 # Routes pour la gestion des utilisateurs (admin uniquement)
 @app.route('/admin/create_user', methods=['POST'])
 def create_user():
@@ -200,20 +393,23 @@ def create_user():
     password = request.form['password']
     is_admin = 1 if request.form.get('is_admin') else 0
     
-    # Vérifier si l'utilisateur existe déjà
     conn = get_db_connection()
-    existing_user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-    
-    if existing_user:
-        flash('Ce nom d\'utilisateur existe déjà')
-        return redirect(url_for('admin_dashboard'))
-    
-    # Hasher le mot de passe et créer l'utilisateur
-    hashed_password = generate_password_hash(password)
-    conn.execute('INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)', 
-                (username, hashed_password, is_admin))
-    conn.commit()
-    conn.close()
+    try:
+        # Vérifier si l'utilisateur existe déjà
+        existing_user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
+        
+        if existing_user:
+            flash('Ce nom d\'utilisateur existe déjà')
+            return redirect(url_for('admin_dashboard'))
+        
+        # Hasher le mot de passe et créer l'utilisateur
+        hashed_password = hash_password(password)
+        cursor = conn.execute('INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)', 
+                              (username, hashed_password, is_admin))
+        conn.commit()
+    finally:
+        conn.close()
+    user_cache.invalidate(cursor.lastrowid)
     
     flash('Utilisateur créé avec succès')
     return redirect(url_for('admin_dashboard'))
@@ -228,10 +424,15 @@ def delete_user(user_id):
         flash('Vous ne pouvez pas supprimer votre propre compte')
         return redirect(url_for('admin_dashboard'))
     
+    # Supprimer l'utilisateur et ses fichiers ; les fichiers physiques sont supprimés en arrière-plan
     conn = get_db_connection()
-    conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+    conn.execute('BEGIN IMMEDIATE')
+    _, _, released = delete_users(conn, [user_id])
     conn.commit()
     conn.close()
+    user_cache.invalidate()
+    hot_file_cache.invalidate()
+    unlinker.enqueue(released)
     
     flash('Utilisateur supprimé avec succès')
     return redirect(url_for('admin_dashboard'))
@@ -247,6 +448,7 @@ def update_user(user_id):
     conn.execute('UPDATE users SET is_admin = ? WHERE id = ?', (is_admin, user_id))
     conn.commit()
     conn.close()
+    user_cache.invalidate(user_id)
     
     flash('Droits utilisateur mis à jour avec succès')
     return redirect(url_for('admin_dashboard'))
@@ -260,15 +462,13 @@ def delete_file(file_id):
     file = conn.execute('SELECT * FROM files WHERE id = ?', (file_id,)).fetchone()
     
     if file:
-        # Supprimer le fichier physique
-        try:
-            os.remove(os.path.join(app.config['UPLOAD_FOLDER'], file['filename']))
-        except:
-            pass
-        
-        # Supprimer l'entrée de la base de données
-        conn.execute('DELETE FROM files WHERE id = ?', (file_id,))
+        # Supprimer l'entrée de la base de données ; le fichier physique n'est
+        # supprimé (en arrière-plan) que si plus aucune entrée ne référence son contenu
+        released = delete_file_entry(conn, file)
         conn.commit()
+        hot_file_cache.invalidate([file_id])
+        if released:
+            unlinker.enqueue([released])
         flash('Fichier supprimé avec succès')
     else:
         flash('Fichier non trouvé')
@@ -276,5 +476,132 @@ def delete_file(file_id):
     conn.close()
     return redirect(url_for('admin_dashboard'))
 
+# Opérations groupées sur les fichiers (admin uniquement) : suppression ou réattribution
+@app.route('/admin/files/bulk', methods=['POST'])
+def bulk_files():
+    if not session.get('is_admin'):
+        return redirect(url_for('user_dashboard'))
+    
+    file_ids = request.form.getlist('file_ids', type=int)
+    action = request.form.get('action')
+    if not file_ids:
+        flash('Aucun fichier sélectionné')
+        return redirect(url_for('admin_dashboard'))
+    
+    conn = get_db_connection()
+    if action == 'delete':
+        conn.execute('BEGIN IMMEDIATE')
+        count, released = delete_files(conn, file_ids)
+        conn.commit()
+        hot_file_cache.invalidate(file_ids)
+        unlinker.enqueue(released)
+        flash(f'{count} fichier(s) supprimé(s)')
+    elif action == 'relink':
+        target_user_id = request.form.get('target_user_id', type=int)
+        if not conn.execute('SELECT 1 FROM users WHERE id = ?', (target_user_id,)).fetchone():
+            flash('Utilisateur de destination introuvable')
+        else:
+            count = relink_files(conn, file_ids, target_user_id)
+            conn.commit()
+            flash(f'{count} fichier(s) réattribué(s)')
+    else:
+        flash('Action inconnue')
+    conn.close()
+    
+    return redirect(url_for('admin_dashboard'))
+
+# Suppression groupée d'utilisateurs (admin uniquement), avec suppression ou réattribution de leurs fichiers
+@app.route('/admin/users/bulk', methods=['POST'])
+def bulk_users():
+    if not session.get('is_admin'):
+        return redirect(url_for('user_dashboard'))
+    
+    # Ne pas permettre de supprimer l'administrateur courant
+    user_ids = [uid for uid in request.form.getlist('user_ids', type=int) if uid != session['user_id']]
+    files_action = request.form.get('files_action', 'delete')
+    target_user_id = request.form.get('target_user_id', type=int)
+    if not user_ids:
+        flash('Aucun utilisateur sélectionné')
+        return redirect(url_for('admin_dashboard'))
+    
+    conn = get_db_connection()
+    if files_action == 'relink' and (
+            target_user_id in user_ids
+            or not conn.execute('SELECT 1 FROM users WHERE id = ?', (target_user_id,)).fetchone()):
+        conn.close()
+        flash('Utilisateur de destination invalide')
+        return redirect(url_for('admin_dashboard'))
+    
+    conn.execute('BEGIN IMMEDIATE')
+    deleted, files_count, released = delete_users(conn, user_ids, files_action, target_user_id)
+    conn.commit()
+    conn.close()
+    user_cache.invalidate()
+    hot_file_cache.invalidate()
+    unlinker.enqueue(released)
+    
+    verb = 'réattribué(s)' if files_action == 'relink' else 'supprimé(s)'
+    flash(f'{deleted} utilisateur(s) supprimé(s), {files_count} fichier(s) {verb}')
+    return redirect(url_for('admin_dashboard'))
+
+# API de liste des fichiers (JSON ou NDJSON en flux, since=<id> pour le mode incrémental)
+@app.route('/api/files')
+def api_files():
+    return stream_listing(FILES_QUERY, since=request.args.get('since', 0, type=int))
+
+# API de liste des utilisateurs (admin uniquement)
+@app.route('/api/users')
+def api_users():
+    if not session.get('is_admin'):
+        return jsonify({'error': 'Accès refusé'}), 403
+    
+    return stream_listing(USERS_QUERY, since=request.args.get('since', 0, type=int))
+
+# Statistiques du pool de connexions (admin uniquement)
+@app.route('/admin/db_stats')
+def db_stats():
+    if not session.get('is_admin'):
+        return redirect(url_for('user_dashboard'))
+    
+    return jsonify(get_pool_stats())
+
+# Statistiques des caches en mémoire (admin uniquement)
+@app.route('/admin/cache_stats')
+def cache_stats():
+    if not session.get('is_admin'):
+        return redirect(url_for('user_dashboard'))
+    
+    return jsonify({'fragments': fragment_cache.stats(), 'users': user_cache.stats(),
+                    'hot_files': hot_file_cache.stats()})
+
+# Métriques au format texte Prometheus (admin uniquement)
+@app.route('/admin/metrics')
+def metrics_endpoint():
+    if not session.get('is_admin'):
+        return redirect(url_for('user_dashboard'))
+    
+    gauges = {}
+    for prefix, stats in (('sqlite_pool', get_pool_stats()), ('fragment_cache', fragment_cache.stats()),
+                          ('user_cache', user_cache.stats()), ('unlinker', unlinker.stats()),
+                          ('previews', preview_store.stats()), ('hot_files', hot_file_cache.stats())):
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges[f"{prefix}_{key}"] = value
+    hashing = get_hashing_stats()
+    gauges['password_hash_rejected'] = hashing['rejected']
+    for operation, stats in hashing['operations'].items():
+        gauges[f"password_{operation}_count"] = stats['count']
+        gauges[f"password_{operation}_avg_ms"] = stats['avg_ms']
+    
+    return metrics.render(gauges), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+# Métriques du pool de hachage des mots de passe (admin uniquement)
+@app.route('/admin/hash_stats')
+def hash_stats():
+    if not session.get('is_admin'):
+        return redirect(url_for('user_dashboard'))
+    
+    return jsonify(get_hashing_stats())
+
 if __name__ == '__main__':
     app.run(debug=True)
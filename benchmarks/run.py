@@ -0,0 +1,453 @@
+"""
+Benchmark de charge et de latence des routes principales.
+
+1. Crée une base et un dossier d'uploads temporaires, remplis via
+   database/db_setup.py:init_database et les modèles User / File.
+2. Lance l'application dans un processus séparé (benchmarks/server.py,
+   ou la commande donnée par --server-cmd, par exemple gunicorn).
+3. Envoie des requêtes à concurrence fixe sur login, user_dashboard,
+   admin_dashboard, upload_file et download_file.
+4. Écrit un rapport JSON (débit, latences p50/p95/p99, RSS du serveur,
+   durée de démarrage d'un worker, taille de la base) pour comparer les commits entre eux.
+
+Usage : python -m benchmarks.run --files 100000 --users 1000 --concurrency 8 --output bench.json
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import random
+import shlex
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ['login', 'user_dashboard', 'admin_dashboard', 'upload_file', 'download_file']
+ADMIN_CREDENTIALS = ('admin', 'admin123')  # administrateur créé par init_database()
+USER_PASSWORD = 'benchmark'
+BLOB_COUNT = 64  # contenus distincts partagés par les fichiers générés
+SEED_BATCH_SIZE = 10000
+
+
+def configure_paths(workdir):
+    """
+    Redirige la base et les uploads vers workdir (lu par config.py à l'import).
+    """
+    env = {
+        'DATABASE_PATH': os.path.join(workdir, 'file_sharing.db'),
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'UPLOAD_TEMP_FOLDER': os.path.join(workdir, 'uploads_tmp'),
+    }
+    os.environ.update(env)
+    return env
+
+
+def seed(files_count, users_count, file_size, rng):
+    """
+    Remplit la base : utilisateurs via User.save(), blobs via prepare_blob()/store_blob(),
+    fichiers via File.save_many() par lots.
+
+    Returns:
+        dict: Nombre d'utilisateurs et de fichiers créés, durée en secondes.
+    """
+    from database.connection import get_db_connection
+    from database.db_setup import init_database
+    from database.models import User, File
+    from utils.blobs import prepare_blob, store_blob
+    from utils.passwords import hash_password
+    from utils.uploads import stream_to_temp
+
+    started = time.perf_counter()
+    init_database()
+
+    # Un seul calcul de hash pour tous les comptes générés (le hachage n'est pas ce qui est mesuré ici)
+    password_hash = hash_password(USER_PASSWORD)
+    for index in range(users_count):
+        User(username=f"user{index:06d}", password=password_hash, is_admin=0).save()
+
+    conn = get_db_connection()
+    user_ids = [row['id'] for row in conn.execute("SELECT id FROM users")]
+    blobs = []
+    for _ in range(BLOB_COUNT):
+        temp_path, size, sha256 = stream_to_temp(io.BytesIO(rng.randbytes(file_size)))
+        _, token = prepare_blob(temp_path, sha256, size)
+        blobs.append((sha256, store_blob(conn, sha256, token)[0], size))
+        conn.commit()
+        os.remove(temp_path)
+
+    start_date = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / max(files_count, 1)
+    created = 0
+    extensions = ['txt', 'pdf', 'png', 'jpg', 'docx', 'zip']
+    while created < files_count:
+        batch = []
+        for index in range(created, min(created + SEED_BATCH_SIZE, files_count)):
+            sha256, filename, size = blobs[index % BLOB_COUNT]
+            batch.append(File(
+                filename=filename,
+                original_filename=f"document_{index}.{extensions[index % len(extensions)]}",
+                uploaded_by=rng.choice(user_ids),
+                upload_date=start_date + step * index,
+                filesize=size,
+                sha256=sha256,
+            ))
+        File.save_many(batch)
+        created += len(batch)
+
+    # Compteurs de références cohérents avec les lignes insérées
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("UPDATE blobs SET refcount = (SELECT COUNT(*) FROM files WHERE files.sha256 = blobs.sha256)")
+    conn.commit()
+    conn.close()
+    return {'users': users_count, 'files': files_count, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+def measure_startup(env, runs):
+    """
+    Mesure le démarrage d'un worker : durée de l'import de app.py dans un nouveau
+    processus, sur la base déjà initialisée (cas d'un redémarrage).
+
+    Returns:
+        dict: Nombre de mesures, durées médiane et maximale en millisecondes.
+    """
+    code = "import time; started = time.perf_counter(); import app; print(time.perf_counter() - started)"
+    durations = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env={**os.environ, **env},
+                                capture_output=True, text=True, check=True)
+        durations.append(float(result.stdout.strip().splitlines()[-1]))
+    durations.sort()
+    return {
+        'runs': runs,
+        'median_ms': round(percentile(durations, 0.5) * 1000, 3) if durations else None,
+        'max_ms': round(durations[-1] * 1000, 3) if durations else None,
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, env, server_cmd=None):
+    if server_cmd:
+        command = shlex.split(server_cmd.format(port=port))
+    else:
+        command = [sys.executable, '-m', 'benchmarks.server', '--port', str(port)]
+    process = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Le serveur s'est arrêté au démarrage (code {process.returncode})")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Le serveur n'a pas démarré dans les temps")
+
+
+def _process_tree(pid):
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as children:
+                    pids.extend(int(child) for child in children.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def server_memory(pid):
+    """
+    Mémoire résidente du serveur et de ses processus enfants (workers, pool de hachage).
+
+    Returns:
+        dict: RSS courante et pic de RSS en octets (somme sur l'arbre de processus).
+    """
+    totals = {'rss_bytes': 0, 'peak_rss_bytes': 0}
+    for current in _process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        totals['rss_bytes'] += int(line.split()[1]) * 1024
+                    elif line.startswith('VmHWM:'):
+                        totals['peak_rss_bytes'] += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return totals
+
+
+def database_size(path):
+    size = 0
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            size += os.path.getsize(path + suffix)
+    return size
+
+
+class Client:
+    """
+    Client HTTP minimal (http.client) qui conserve le cookie de session.
+    """
+    def __init__(self, port):
+        self.port = port
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{key}={morsel.value}" for key, morsel in self.cookies.items())
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            for header in response.headers.get_all('Set-Cookie') or []:
+                self.cookies.load(header)
+            # Lire tout le corps : la latence inclut le transfert
+            while response.read(64 * 1024):
+                pass
+            return response.status
+        finally:
+            conn.close()
+
+    def login(self, username, password):
+        body = urlencode({'username': username, 'password': password})
+        status = self.request('POST', '/', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+        return status == 302
+
+
+def multipart(filename, content):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode('utf-8') + content + f"\r\n--{boundary}--\r\n".encode('utf-8')
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def make_scenario(name, port, args, max_file_id, rng):
+    """
+    Retourne (préparation d'un client, exécution d'une requête) pour un scénario.
+    Chaque requête renvoie le code HTTP obtenu et le code attendu.
+    """
+    user_credentials = ('user000000', USER_PASSWORD) if args.users else ADMIN_CREDENTIALS
+
+    def admin_client():
+        client = Client(port)
+        client.login(*ADMIN_CREDENTIALS)
+        return client
+
+    def user_client():
+        client = Client(port)
+        client.login(*user_credentials)
+        return client
+
+    if name == 'login':
+        def run(client):
+            return Client(port).request(
+                'POST', '/', urlencode({'username': user_credentials[0], 'password': user_credentials[1]}),
+                {'Content-Type': 'application/x-www-form-urlencoded'}
+            ), 302
+        return (lambda: None), run
+
+    if name == 'user_dashboard':
+        return user_client, lambda client: (client.request('GET', '/user'), 200)
+
+    if name == 'admin_dashboard':
+        return admin_client, lambda client: (client.request('GET', '/admin'), 200)
+
+    if name == 'upload_file':
+        def run(client):
+            body, content_type = multipart(f"bench_{uuid.uuid4().hex}.txt", rng.randbytes(args.upload_size))
+            return client.request('POST', '/upload', body, {
+                'Content-Type': content_type, 'Accept': 'application/json'
+            }), 200
+        return user_client, run
+
+    if name == 'download_file':
+        def run(client):
+            return client.request('GET', f"/download/{rng.randint(1, max_file_id)}"), 200
+        return user_client, run
+
+    raise ValueError(f"Scénario inconnu : {name}")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(name, port, args, max_file_id):
+    """
+    Exécute un scénario avec args.concurrency threads pendant args.duration secondes
+    (ou jusqu'à args.requests requêtes au total).
+
+    Returns:
+        dict: Nombre de requêtes, erreurs, débit et latences en millisecondes.
+    """
+    rng = random.Random(args.seed)
+    prepare, run = make_scenario(name, port, args, max_file_id, rng)
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    remaining = [args.requests] if args.requests else None
+    stop_at = time.perf_counter() + args.duration
+
+    def worker():
+        client = prepare()
+        while time.perf_counter() < stop_at:
+            if remaining is not None:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                status, expected = run(client)
+                failed = status != expected
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if failed:
+                    errors.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            'p50': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+            'p95': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+            'max': round(latencies[-1] * 1000, 3) if latencies else None,
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de charge des routes principales.")
+    parser.add_argument('--files', type=int, default=1000, help="fichiers générés (1k à 5M)")
+    parser.add_argument('--users', type=int, default=10, help="utilisateurs générés (10 à 100k)")
+    parser.add_argument('--file-size', type=int, default=64 * 1024, help="taille des fichiers générés (octets)")
+    parser.add_argument('--upload-size', type=int, default=64 * 1024, help="taille des fichiers envoyés (octets)")
+    parser.add_argument('--concurrency', type=int, default=4, help="clients simultanés")
+    parser.add_argument('--duration', type=float, default=10.0, help="durée de chaque scénario (secondes)")
+    parser.add_argument('--requests', type=int, default=0, help="nombre de requêtes par scénario (0 : selon la durée)")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="scénarios séparés par des virgules")
+    parser.add_argument('--startup-runs', type=int, default=5, help="démarrages de worker mesurés (0 : aucun)")
+    parser.add_argument('--seed', type=int, default=1, help="graine aléatoire (runs reproductibles)")
+    parser.add_argument('--workdir', default=None, help="dossier de travail (temporaire par défaut, réutilisé s'il existe)")
+    parser.add_argument('--server-cmd', default=None,
+                        help="commande du serveur, {port} est remplacé (ex. \"gunicorn -w 4 -b 127.0.0.1:{port} app:app\")")
+    parser.add_argument('--output', default=None, help="fichier du rapport JSON (sortie standard par défaut)")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"scénario inconnu : {name}")
+
+    temporary = args.workdir is None
+    workdir = tempfile.mkdtemp(prefix='file-sharing-bench-') if temporary else args.workdir
+    os.makedirs(workdir, exist_ok=True)
+    env = configure_paths(workdir)
+    sys.path.insert(0, ROOT)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'sqlite': sqlite3.sqlite_version,
+            'cpus': os.cpu_count(),
+            'parameters': vars(args),
+        },
+    }
+    process = None
+    try:
+        rng = random.Random(args.seed)
+        if os.path.exists(env['DATABASE_PATH']):
+            report['seed'] = {'reused': True}
+        else:
+            # Les messages d'init_database() ne doivent pas se mêler au rapport JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                report['seed'] = seed(args.files, args.users, args.file_size, rng)
+
+        with sqlite3.connect(env['DATABASE_PATH']) as conn:
+            max_file_id = conn.execute("SELECT COALESCE(MAX(id), 1) FROM files").fetchone()[0]
+
+        report['startup'] = measure_startup(env, args.startup_runs)
+
+        port = free_port()
+        process = start_server(port, env, args.server_cmd)
+        report['server_start'] = server_memory(process.pid)
+
+        report['scenarios'] = {}
+        for name in scenarios:
+            report['scenarios'][name] = run_scenario(name, port, args, max_file_id)
+            report['scenarios'][name]['server_memory'] = server_memory(process.pid)
+
+        report['server_end'] = server_memory(process.pid)
+        report['database_bytes'] = database_size(env['DATABASE_PATH'])
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            report_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Serveur lancé par benchmarks/run.py dans un processus séparé, pour que la
+mémoire (RSS) mesurée soit celle de l'application seule.
+
+Les chemins de la base et des uploads sont fournis par variables d'environnement
+(DATABASE_PATH, UPLOAD_FOLDER, UPLOAD_TEMP_FOLDER), lues par config.py.
+
+Usage : python -m benchmarks.server --port 8765
+"""
+import argparse
+from werkzeug.serving import make_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur WSGI multi-thread pour les benchmarks.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    from app import app
+    server = make_server(args.host, args.port, app, threaded=True)
+    print(f"Serveur de benchmark prêt sur http://{args.host}:{args.port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
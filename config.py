@@ -2,7 +2,122 @@ import os
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'clé-secrète-par-défaut'
-    UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
+    # Les chemins peuvent être redirigés par variables d'environnement (benchmarks, déploiement)
+    UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'zip'}
-    DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'file_sharing.db')
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 Mo - limite de taille pour le téléchargement
+    DATABASE_PATH = os.environ.get('DATABASE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'file_sharing.db')
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 Mo - limite de taille par requête (formulaire ou morceau)
+
+    # Uploads par morceaux (init / PUT morceau / finalisation)
+    UPLOAD_TEMP_FOLDER = os.environ.get('UPLOAD_TEMP_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads_tmp')
+    UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8 Mo par morceau, doit rester < MAX_CONTENT_LENGTH
+    MAX_UPLOAD_SIZE = 20 * 1024 * 1024 * 1024  # 20 Go - taille maximale d'un fichier
+    UPLOAD_WORKERS = 4  # threads d'écriture sur disque pour un envoi de plusieurs fichiers
+    UPLOAD_SHARD_LEVELS = 2  # niveaux de sous-dossiers (2 caractères hexadécimaux chacun) dans UPLOAD_FOLDER
+    USER_QUOTA_BYTES = 0  # espace maximal par utilisateur (somme des tailles de ses fichiers), 0 : illimité
+    UPLOAD_SESSION_TTL = 7 * 24 * 3600  # secondes d'inactivité avant qu'une session soit considérée abandonnée
+
+    # Compression à l'enregistrement (utils/compression.py) des formats qui s'y prêtent
+    COMPRESS_EXTENSIONS = {'txt', 'doc', 'xls', 'ppt'}  # sous-ensemble de ALLOWED_EXTENSIONS
+    COMPRESSION_LEVEL = 6
+
+    # Hachage des mots de passe (utils/passwords.py), exécuté dans un pool de processus.
+    # Changer la méthode déclenche un nouveau hachage à la connexion suivante de chaque utilisateur.
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:600000'
+    PASSWORD_SALT_LENGTH = 16
+    HASH_POOL_WORKERS = 2  # 0 : hachage dans le thread appelant
+    HASH_POOL_MAX_PENDING = 32  # au-delà, la requête reçoit une réponse 503
+
+    # Paramètres de la couche de connexion SQLite (database/connection.py)
+    SQLITE_POOL_SIZE = 4  # connexions inactives conservées par thread
+    SQLITE_JOURNAL_MODE = 'WAL'
+    SQLITE_SYNCHRONOUS = 'NORMAL'
+    SQLITE_CACHE_SIZE = -20000  # valeur négative : taille en Kio (ici ~20 Mo)
+    SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+    SQLITE_BUSY_TIMEOUT = 5000  # millisecondes
+    SQLITE_STATEMENT_CACHE = 256  # requêtes préparées conservées par connexion
+
+    # Suppression des fichiers physiques en arrière-plan (utils/unlinker.py)
+    UNLINK_BATCH_SIZE = 256
+    UNLINK_MAX_RETRIES = 5
+    UNLINK_RETRY_DELAY = 2.0  # secondes entre deux tentatives
+    BLOB_CLAIM_TIMEOUT = 3600  # secondes avant qu'un envoi ou une suppression en cours d'un blob soit considéré abandonné
+
+    # Backend de stockage des fichiers (utils/storage.py) : 'local', 'memory', 's3' ou 'tiered'
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND') or 'local'
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_PREFIX = os.environ.get('S3_PREFIX') or ''
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') or None  # service compatible S3 (MinIO...), None : AWS
+    # Mode 'tiered' : UPLOAD_FOLDER sert de niveau chaud devant S3 (utils/tiering.py)
+    TIER_DEMOTE_AFTER_DAYS = 30  # jours sans téléchargement avant le passage au niveau froid
+    TIER_INTERVAL = 24 * 3600  # secondes entre deux passes de déplacement, 0 : désactivé
+    TIER_MAX_OPS_PER_SEC = 50  # fichiers examinés par seconde, 0 : illimité
+    TIER_TOUCH_INTERVAL = 3600  # secondes entre deux mises à jour de la date d'accès d'un fichier local
+    TIER_LOCK_PATH = os.path.join(os.path.dirname(DATABASE_PATH), 'tiering.lock')
+
+    # Migrations du schéma (database/migrations.py), appliquées par un seul processus à la fois
+    MIGRATION_LOCK_PATH = os.path.join(os.path.dirname(DATABASE_PATH), 'migrations.lock')
+
+    # Réconciliation UPLOAD_FOLDER / base de données (utils/reconcile.py)
+    RECONCILE_INTERVAL = 6 * 3600  # secondes entre deux passes automatiques, 0 : désactivé
+    RECONCILE_REPAIR = False  # la passe automatique se contente de signaler les anomalies
+    RECONCILE_MAX_OPS_PER_SEC = 2000  # opérations d'E/S par seconde, 0 : illimité
+    RECONCILE_GRACE_PERIOD = 3600  # un fichier plus récent n'est jamais considéré orphelin
+    RECONCILE_LOCK_PATH = os.path.join(os.path.dirname(DATABASE_PATH), 'reconcile.lock')
+
+    # Migration vers l'arborescence répartie (utils/migrate_storage.py)
+    STORAGE_MIGRATION_MAX_FILES_PER_SEC = 200  # 0 : illimité
+    STORAGE_MIGRATION_GRACE_PERIOD = 30  # secondes avant suppression des anciens chemins
+    STORAGE_MIGRATION_STATE = os.path.join(os.path.dirname(DATABASE_PATH), 'storage_migration.state')
+
+    # Téléchargements : délégation de l'envoi au proxy inverse (None, 'x-sendfile' ou 'x-accel-redirect')
+    DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD') or None
+    DOWNLOAD_ACCEL_PREFIX = '/protected-uploads/'  # location interne nginx pointant sur UPLOAD_FOLDER
+    DOWNLOAD_MAX_RANGES = 16  # au-delà, l'en-tête Range est ignoré et le fichier envoyé en entier
+
+    # Lignes lues par lot (fetchmany) par les parcours complets des modèles (database/models.py)
+    MODEL_FETCH_SIZE = 500
+
+    # Pagination des listes de fichiers
+    FILES_PAGE_SIZE = 50
+    FILES_MAX_PAGE_SIZE = 500
+
+    # Cache des utilisateurs en mémoire (database/user_cache.py)
+    USER_CACHE_SIZE = 4096
+    USER_CACHE_TTL = 300  # secondes
+    USER_CACHE_VERSION_CHECK = 1.0  # délai maximal (s) avant de voir une modification faite par un autre worker
+
+    # API de liste en flux (utils/api.py)
+    API_FETCH_SIZE = 500  # lignes lues et sérialisées par lot
+    API_GZIP_LEVEL = 6
+
+    # Métriques (utils/metrics.py, /admin/metrics) et profilage des requêtes lentes
+    METRICS_ENABLED = True
+    PROFILE_SAMPLE_RATE = 0.0  # fraction des requêtes profilées automatiquement (0 : sur demande uniquement)
+    PROFILE_INTERVAL = 0.005  # secondes entre deux relevés de pile
+    SLOW_REQUEST_THRESHOLD = 1.0  # secondes : une requête profilée plus lente est enregistrée
+    PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+    # Cache des fragments HTML des tableaux de bord (utils/fragment_cache.py)
+    FRAGMENT_CACHE_MAX_BYTES = 32 * 1024 * 1024  # 32 Mo
+
+    # Cache en mémoire des petits fichiers les plus téléchargés (utils/hot_cache.py), par worker
+    HOT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64 Mo, 0 : désactivé
+    HOT_CACHE_MAX_FILE_SIZE = 1024 * 1024  # 1 Mo, taille stockée maximale d'un fichier mis en cache
+    HOT_CACHE_MIN_FREQUENCY = 2  # demandes récentes avant d'admettre un fichier
+    HOT_CACHE_SKETCH_WIDTH = 16384  # compteurs par ligne de l'estimateur de fréquence
+    HOT_CACHE_VERSION_CHECK = 1.0  # délai maximal (s) avant de voir une suppression faite par un autre worker
+
+    # Miniatures des images (utils/previews.py), générées en arrière-plan si Pillow est installé
+    PREVIEW_FOLDER = os.environ.get('PREVIEW_FOLDER') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'previews')
+    PREVIEW_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    PREVIEW_SIZE = 256  # pixels, plus grand côté
+    PREVIEW_QUALITY = 80  # qualité JPEG
+    PREVIEW_WORKERS = 2
+    PREVIEW_MAX_PENDING = 256  # au-delà, les nouvelles demandes sont ignorées (régénérées à l'affichage)
+    PREVIEW_CACHE_MAX_BYTES = 256 * 1024 * 1024  # 256 Mo
+    PREVIEW_TOUCH_INTERVAL = 3600  # secondes entre deux mises à jour de la date d'accès d'une miniature
+    PREVIEW_MAX_AGE = 7 * 24 * 3600  # durée de cache navigateur (secondes)
+
+    # Archives ZIP de plusieurs fichiers (utils/archives.py) : formats déjà compressés, stockés tels quels
+    ARCHIVE_STORED_EXTENSIONS = {'zip', 'docx', 'xlsx', 'pptx', 'jpg', 'jpeg', 'png', 'gif', 'pdf'}
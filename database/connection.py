@@ -0,0 +1,262 @@
+import sqlite3
+import threading
+import time
+from flask import g, has_app_context, current_app
+from config import Config
+from utils.metrics import observe_sql
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Curseur qui mesure la durée de chaque requête (utils/metrics.py).
+    """
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe_sql(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe_sql(sql, time.perf_counter() - start)
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    Connexion SQLite rendue au pool au lieu d'être fermée.
+
+    Les appels existants à conn.close() restent valides : ils libèrent
+    simplement la connexion pour qu'elle soit réutilisée par le même thread.
+    La connexion liée à un contexte Flask (bound) ne l'est qu'à la fin du
+    contexte : les fonctions appelées pendant la requête la partagent et leur
+    close() n'annule pas la transaction en cours de l'appelant.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.released = False
+        self.bound = False
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Durée mesurée : préparation et exécution jusqu'à la première ligne
+    # (les lignes lues ensuite par fetchall/fetchmany ne sont pas comptées)
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe_sql(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe_sql(sql, time.perf_counter() - start)
+
+    def close(self):
+        """
+        Rend la connexion au pool (annule toute transaction non validée).
+        Sans effet sur la connexion liée au contexte Flask (voir release_db_connection).
+        """
+        if self.bound:
+            return
+        if self.pool is None:
+            super().close()
+        elif not self.released:
+            self.pool.release(self)
+
+    def really_close(self):
+        """
+        Ferme définitivement la connexion SQLite sous-jacente.
+        """
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Pool de connexions SQLite par thread.
+
+    Une connexion SQLite ne peut être utilisée que par le thread qui l'a créée :
+    chaque thread dispose donc de sa propre pile de connexions inactives,
+    indexée par chemin de base de données.
+    """
+    def __init__(self, max_idle=None):
+        self.max_idle = max_idle if max_idle is not None else Config.SQLITE_POOL_SIZE
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def _idle(self, path):
+        idle = getattr(self._local, 'idle', None)
+        if idle is None:
+            idle = self._local.idle = {}
+        return idle.setdefault(path, [])
+
+    def _connect(self, path, settings):
+        conn = sqlite3.connect(
+            path,
+            factory=PooledConnection,
+            timeout=settings['SQLITE_BUSY_TIMEOUT'] / 1000,
+            cached_statements=settings['SQLITE_STATEMENT_CACHE'],
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode = {settings['SQLITE_JOURNAL_MODE']}")
+        conn.execute(f"PRAGMA synchronous = {settings['SQLITE_SYNCHRONOUS']}")
+        conn.execute(f"PRAGMA cache_size = {int(settings['SQLITE_CACHE_SIZE'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(settings['SQLITE_MMAP_SIZE'])}")
+        conn.execute(f"PRAGMA busy_timeout = {int(settings['SQLITE_BUSY_TIMEOUT'])}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.pool = self
+        conn.path = path
+        return conn
+
+    def acquire(self, path, settings):
+        """
+        Récupère une connexion inactive du thread courant ou en ouvre une nouvelle.
+
+        Args:
+            path (str): Chemin de la base de données.
+            settings (dict): Paramètres SQLITE_* de la configuration.
+
+        Returns:
+            PooledConnection: Connexion prête à l'emploi.
+        """
+        idle = self._idle(path)
+        if idle:
+            conn = idle.pop()
+            with self._lock:
+                self.hits += 1
+        else:
+            conn = self._connect(path, settings)
+            with self._lock:
+                self.misses += 1
+        conn.released = False
+        return conn
+
+    def release(self, conn):
+        """
+        Rend une connexion au pool du thread courant.
+
+        Args:
+            conn (PooledConnection): Connexion à libérer.
+        """
+        if conn.in_transaction:
+            conn.rollback()
+        conn.released = True
+        idle = self._idle(conn.path)
+        if len(idle) < self.max_idle:
+            idle.append(conn)
+        else:
+            conn.really_close()
+            with self._lock:
+                self.discarded += 1
+
+    def clear(self):
+        """
+        Ferme les connexions inactives du thread courant, par exemple après
+        l'initialisation : un processus créé par fork (gunicorn --preload) ne
+        doit pas hériter d'une connexion SQLite ouverte.
+
+        Returns:
+            int: Nombre de connexions fermées.
+        """
+        idle = getattr(self._local, 'idle', None) or {}
+        closed = 0
+        for connections in idle.values():
+            while connections:
+                connections.pop().really_close()
+                closed += 1
+        return closed
+
+    def stats(self):
+        """
+        Retourne les compteurs du pool.
+
+        Returns:
+            dict: Nombre de réutilisations (hits), d'ouvertures (misses)
+                  et de connexions fermées faute de place (discarded).
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'discarded': self.discarded,
+                'hit_rate': (self.hits / total) if total else 0.0,
+            }
+
+
+pool = ConnectionPool()
+
+_SETTINGS = ('SQLITE_JOURNAL_MODE', 'SQLITE_SYNCHRONOUS', 'SQLITE_CACHE_SIZE',
+             'SQLITE_MMAP_SIZE', 'SQLITE_BUSY_TIMEOUT', 'SQLITE_STATEMENT_CACHE')
+
+
+def _current_settings():
+    if has_app_context():
+        config = current_app.config
+        return config['DATABASE_PATH'], {key: config.get(key, getattr(Config, key)) for key in _SETTINGS}
+    return Config.DATABASE_PATH, {key: getattr(Config, key) for key in _SETTINGS}
+
+
+def get_db_connection():
+    """
+    Point d'accès unique aux connexions SQLite de l'application.
+
+    Dans un contexte Flask, la même connexion est réutilisée pendant toute
+    la requête puis rendue au pool à la fin du contexte d'application ;
+    conn.close() n'a alors pas d'effet.
+    Hors contexte (scripts, initialisation), une connexion du pool du thread
+    courant est retournée ; conn.close() la rend au pool.
+
+    Returns:
+        sqlite3.Connection: Connexion à la base de données.
+    """
+    path, settings = _current_settings()
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None or conn.released or conn.path != path:
+            conn = g._db_conn = pool.acquire(path, settings)
+            conn.bound = True
+        return conn
+    return pool.acquire(path, settings)
+
+
+def release_db_connection(exception=None):
+    """
+    Rend au pool la connexion liée au contexte d'application courant.
+    """
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.bound = False
+        if not conn.released:
+            conn.close()
+
+
+def get_pool_stats():
+    """
+    Retourne les compteurs hit/miss du pool de connexions.
+
+    Returns:
+        dict: Statistiques du pool.
+    """
+    return pool.stats()
+
+
+def init_app(app):
+    """
+    Lie le pool de connexions au cycle de vie du contexte d'application Flask.
+
+    Args:
+        app (Flask): Application Flask.
+    """
+    app.teardown_appcontext(release_db_connection)
@@ -1,20 +1,12 @@
-import sqlite3
-import os
-from werkzeug.security import generate_password_hash
-from config import Config
 
-def init_database():
-    """
-    Initialise la base de données en créant les tables nécessaires
-    et l'utilisateur administrateur par défaut si nécessaire.
+def create_schema(cursor):
     """
-    # S'assurer que le répertoire parent existe
-    os.makedirs(os.path.dirname(Config.DATABASE_PATH), exist_ok=True)
-    
-    # Établir une connexion à la base de données
-    conn = sqlite3.connect(Config.DATABASE_PATH)
-    cursor = conn.cursor()
+    Crée les tables et les index de l'application s'ils n'existent pas.
+    Appliqué comme première migration par database/migrations.py.
     
+    Args:
+        cursor (sqlite3.Cursor): Curseur sur la base de données.
+    """
     # Créer la table des utilisateurs
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS users (
@@ -38,26 +30,233 @@ def init_database():
     )
     ''')
     
-    # Vérifier si un administrateur existe déjà
-    cursor.execute("SELECT COUNT(*) FROM users WHERE is_admin = 1")
-    admin_count = cursor.fetchone()[0]
+    # Colonne sha256 : référence vers le blob stocké par empreinte (NULL pour les anciens fichiers)
+    columns = [column[1] for column in cursor.execute("PRAGMA table_info(files)").fetchall()]
+    if 'sha256' not in columns:
+        cursor.execute("ALTER TABLE files ADD COLUMN sha256 TEXT")
+    # Colonne codec : compression du fichier stocké ('gzip', NULL si non compressé)
+    if 'codec' not in columns:
+        cursor.execute("ALTER TABLE files ADD COLUMN codec TEXT")
+    
+    # Créer la table des blobs (contenu stocké une seule fois, avec compteur de références)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS blobs (
+        sha256 TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP NOT NULL
+    )
+    ''')
+    columns = [column[1] for column in cursor.execute("PRAGMA table_info(blobs)").fetchall()]
+    if 'codec' not in columns:
+        cursor.execute("ALTER TABLE blobs ADD COLUMN codec TEXT")
+    
+    # Créer la table des uploads par morceaux en cours
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS uploads (
+        id TEXT PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        original_filename TEXT NOT NULL,
+        total_size INTEGER NOT NULL,
+        received INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP NOT NULL,
+        updated_at TIMESTAMP NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
     
-    # Si aucun administrateur n'existe, en créer un par défaut
-    if admin_count == 0:
-        admin_username = 'admin'
-        admin_password = 'admin123'  # Mot de passe par défaut, à modifier après la première connexion
-        hashed_password = generate_password_hash(admin_password)
-        
-        cursor.execute(
-            "INSERT INTO users (username, password, is_admin) VALUES (?, ?, ?)",
-            (admin_username, hashed_password, 1)
-        )
-        print(f"Utilisateur administrateur créé : {admin_username} (mot de passe: {admin_password})")
+    # Compteurs de version partagés entre workers (invalidation des caches)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
     
-    # Valider les modifications et fermer la connexion
-    conn.commit()
-    conn.close()
+    # Index plein texte des noms de fichiers et des utilisateurs (rowid = files.id)
+    fts_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'files_fts'"
+    ).fetchone()
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+        original_filename,
+        username,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    ''')
+    if not fts_exists:
+        cursor.execute('''
+        INSERT INTO files_fts (rowid, original_filename, username)
+        SELECT files.id, files.original_filename, users.username
+        FROM files
+        LEFT JOIN users ON files.uploaded_by = users.id
+        ''')
+    
+    # Triggers maintenant l'index plein texte synchronisé avec files et users
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_fts_insert AFTER INSERT ON files BEGIN
+        INSERT INTO files_fts (rowid, original_filename, username)
+        VALUES (new.id, new.original_filename, (SELECT username FROM users WHERE id = new.uploaded_by));
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_fts_delete AFTER DELETE ON files BEGIN
+        DELETE FROM files_fts WHERE rowid = old.id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_fts_update AFTER UPDATE OF original_filename, uploaded_by ON files BEGIN
+        UPDATE files_fts
+        SET original_filename = new.original_filename,
+            username = (SELECT username FROM users WHERE id = new.uploaded_by)
+        WHERE rowid = new.id;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF username ON users BEGIN
+        UPDATE files_fts SET username = new.username
+        WHERE rowid IN (SELECT id FROM files WHERE uploaded_by = new.id);
+    END
+    ''')
+    
+    # Version des données affichées : les fragments HTML en cache (utils/fragment_cache.py)
+    # sont invalidés à chaque écriture sur files ou users (le changement de mot de passe exclu)
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_version_insert AFTER INSERT ON files BEGIN
+        INSERT INTO data_versions (name, version) VALUES ('data', 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_version_delete AFTER DELETE ON files BEGIN
+        INSERT INTO data_versions (name, version) VALUES ('data', 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_version_update AFTER UPDATE ON files BEGIN
+        INSERT INTO data_versions (name, version) VALUES ('data', 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_version_insert AFTER INSERT ON users BEGIN
+        INSERT INTO data_versions (name, version) VALUES ('data', 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_version_delete AFTER DELETE ON users BEGIN
+        INSERT INTO data_versions (name, version) VALUES ('data', 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_version_update AFTER UPDATE OF username, is_admin ON users BEGIN
+        INSERT INTO data_versions (name, version) VALUES ('data', 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1;
+    END
+    ''')
+    
+    # Compteurs d'utilisation par utilisateur (database/user_stats.py), tenus à jour
+    # par les triggers ci-dessous : ni la page d'administration ni le contrôle de
+    # quota n'ont à parcourir la table files
+    stats_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_stats'"
+    ).fetchone()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY,
+        file_count INTEGER NOT NULL DEFAULT 0,
+        total_bytes INTEGER NOT NULL DEFAULT 0,
+        last_upload TIMESTAMP
+    )
+    ''')
+    if not stats_exists:
+        cursor.execute('''
+        INSERT INTO user_stats (user_id, file_count, total_bytes, last_upload)
+        SELECT uploaded_by, COUNT(*), SUM(filesize), MAX(upload_date)
+        FROM files
+        GROUP BY uploaded_by
+        ''')
+    
+    # Le dernier envoi n'est recalculé que si le fichier retiré était le plus récent
+    # (index idx_files_uploaded_by_date : une seule recherche)
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_stats_insert AFTER INSERT ON files BEGIN
+        INSERT INTO user_stats (user_id, file_count, total_bytes, last_upload)
+        VALUES (new.uploaded_by, 1, new.filesize, new.upload_date)
+        ON CONFLICT (user_id) DO UPDATE SET
+            file_count = file_count + 1,
+            total_bytes = total_bytes + excluded.total_bytes,
+            last_upload = MAX(COALESCE(last_upload, excluded.last_upload), excluded.last_upload);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_stats_delete AFTER DELETE ON files BEGIN
+        UPDATE user_stats SET
+            file_count = file_count - 1,
+            total_bytes = total_bytes - old.filesize,
+            last_upload = CASE WHEN old.upload_date >= last_upload
+                THEN (SELECT MAX(upload_date) FROM files WHERE uploaded_by = old.uploaded_by)
+                ELSE last_upload END
+        WHERE user_id = old.uploaded_by;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_stats_update AFTER UPDATE OF uploaded_by, filesize, upload_date ON files BEGIN
+        UPDATE user_stats SET
+            file_count = file_count - 1,
+            total_bytes = total_bytes - old.filesize,
+            last_upload = CASE WHEN old.upload_date >= last_upload
+                THEN (SELECT MAX(upload_date) FROM files WHERE uploaded_by = old.uploaded_by)
+                ELSE last_upload END
+        WHERE user_id = old.uploaded_by;
+        INSERT INTO user_stats (user_id, file_count, total_bytes, last_upload)
+        VALUES (new.uploaded_by, 1, new.filesize, new.upload_date)
+        ON CONFLICT (user_id) DO UPDATE SET
+            file_count = file_count + 1,
+            total_bytes = total_bytes + excluded.total_bytes,
+            last_upload = MAX(COALESCE(last_upload, excluded.last_upload), excluded.last_upload);
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_stats_delete AFTER DELETE ON users BEGIN
+        DELETE FROM user_stats WHERE user_id = old.id;
+    END
+    ''')
+    
+    # Index pour la pagination par curseur (upload_date, id) des listes de fichiers
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_files_upload_date_id ON files (upload_date DESC, id DESC)
+    ''')
+    
+    # Index pour retrouver les fichiers d'un utilisateur, et son envoi le plus récent
+    # (remplace l'ancien index sur uploaded_by seul, dont il couvre les usages)
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_files_uploaded_by_date ON files (uploaded_by, upload_date)
+    ''')
+    cursor.execute("DROP INDEX IF EXISTS idx_files_uploaded_by")
+    
+    # Index pour les recherches par nom de stockage et par contenu (réconciliation, blobs)
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_files_filename ON files (filename)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files (sha256)
+    ''')
+
+def init_database():
+    """
+    Initialise la base de données : crée les tables nécessaires et l'utilisateur
+    administrateur par défaut si nécessaire, en appliquant les migrations
+    numérotées (database/migrations.py) qui manquent encore.
+    """
+    # Import local : database/migrations.py s'appuie sur create_schema() défini ici
+    from database.migrations import ensure_schema
     
+    ensure_schema()
     print("Base de données initialisée avec succès.")
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+"""
+Migrations du schéma de la base, numérotées et suivies par PRAGMA user_version.
+
+Au démarrage, chaque worker se contente de lire la version de la base
+(ensure_schema) ; seul le premier à trouver une base en retard applique les
+migrations manquantes, sous verrou de fichier, les autres attendent puis
+constatent qu'il n'y a plus rien à faire. Chaque migration est appliquée dans
+sa propre transaction avec la mise à jour de user_version : une migration
+interrompue est entièrement annulée et sera rejouée.
+
+Pour faire évoluer le schéma, ajouter une fonction à la fin de MIGRATIONS
+(ne jamais modifier ni réordonner les migrations existantes).
+
+Usage : python -m database.migrations
+"""
+import fcntl
+import os
+from datetime import datetime
+from config import Config
+from database.connection import get_db_connection
+from database.db_setup import create_schema
+from utils.ids import ulid_at
+from utils.passwords import hash_password
+
+
+def _base_schema(cursor):
+    # Tables, index et triggers existants. create_schema() ne crée que ce qui
+    # manque : les bases antérieures aux migrations (user_version = 0) sont reprises telles quelles.
+    create_schema(cursor)
+
+
+def _default_admin(cursor):
+    # Administrateur par défaut, seulement si la base n'en a aucun
+    if cursor.execute("SELECT 1 FROM users WHERE is_admin = 1").fetchone():
+        return
+    admin_username = 'admin'
+    admin_password = 'admin123'  # Mot de passe par défaut, à modifier après la première connexion
+    cursor.execute(
+        "INSERT INTO users (username, password, is_admin) VALUES (?, ?, 1)",
+        (admin_username, hash_password(admin_password))
+    )
+    print(f"Utilisateur administrateur créé : {admin_username} (mot de passe: {admin_password})")
+
+
+def _files_uid(cursor):
+    # Identifiant unique triable des fichiers (utils/ids.py, exposé par File.uid).
+    # Les fichiers existants reçoivent un ULID daté de leur envoi.
+    columns = [column[1] for column in cursor.execute("PRAGMA table_info(files)").fetchall()]
+    if 'uid' not in columns:
+        cursor.execute("ALTER TABLE files ADD COLUMN uid TEXT")
+    last_id = 0
+    while True:
+        rows = cursor.execute(
+            "SELECT id, upload_date FROM files WHERE id > ? AND uid IS NULL ORDER BY id LIMIT 1000",
+            (last_id,)
+        ).fetchall()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            try:
+                uid = ulid_at(row['upload_date'])
+            except (TypeError, ValueError):
+                uid = ulid_at(datetime.now())
+            updates.append((uid, row['id']))
+        cursor.executemany("UPDATE files SET uid = ? WHERE id = ?", updates)
+        last_id = rows[-1]['id']
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_files_uid ON files (uid)")
+
+
+def _files_version(cursor):
+    # Compteur 'files' (table data_versions) incrémenté quand le contenu servi par
+    # un téléchargement peut changer : suppression d'un fichier ou modification
+    # de son stockage. Les workers vident leur cache de fichiers (utils/hot_cache.py)
+    # quand il change ; les nouveaux uploads ne l'incrémentent pas.
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_content_delete AFTER DELETE ON files BEGIN
+        INSERT INTO data_versions (name, version) VALUES ('files', 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1;
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS files_content_update
+    AFTER UPDATE OF filename, original_filename, filesize, codec, sha256, upload_date ON files BEGIN
+        INSERT INTO data_versions (name, version) VALUES ('files', 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1;
+    END
+    ''')
+
+
+def _pending_unlinks(cursor):
+    # Noms de stockage en cours de suppression physique (utils/unlinker.py). La
+    # suppression a lieu hors transaction ; un envoi du même contenu attend qu'elle
+    # soit terminée avant de ranger son propre exemplaire (utils/blobs.py:prepare_blob).
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS pending_unlinks (
+        filename TEXT PRIMARY KEY,
+        claimed_at TIMESTAMP NOT NULL
+    )
+    ''')
+
+
+# Migration n (à partir de 1) : MIGRATIONS[n - 1]
+MIGRATIONS = [
+    _base_schema,
+    _default_admin,
+    _files_uid,
+    _files_version,
+    _pending_unlinks,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(conn):
+    """
+    Lit la version du schéma enregistrée dans la base.
+
+    Args:
+        conn (sqlite3.Connection): Connexion à la base.
+
+    Returns:
+        int: Numéro de la dernière migration appliquée (0 pour une base vierge).
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate():
+    """
+    Applique les migrations manquantes, une transaction par migration.
+    À appeler sous le verrou de ensure_schema() si d'autres processus peuvent démarrer.
+
+    Returns:
+        list: Numéros des migrations appliquées.
+    """
+    applied = []
+    conn = get_db_connection()
+    try:
+        for version in range(get_schema_version(conn) + 1, SCHEMA_VERSION + 1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                MIGRATIONS[version - 1](conn.cursor())
+                # PRAGMA user_version fait partie de la transaction : annulée avec elle en cas d'erreur
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            applied.append(version)
+    finally:
+        conn.close()
+    return applied
+
+
+def ensure_schema():
+    """
+    Met la base à jour si nécessaire. Coût habituel (base à jour) : une lecture de
+    PRAGMA user_version, sans verrou ni transaction d'écriture.
+
+    Returns:
+        list: Numéros des migrations appliquées par ce processus (vide le plus souvent).
+    """
+    os.makedirs(os.path.dirname(Config.DATABASE_PATH), exist_ok=True)
+    conn = get_db_connection()
+    try:
+        if get_schema_version(conn) >= SCHEMA_VERSION:
+            return []
+    finally:
+        conn.close()
+
+    # Un seul processus migre ; les autres attendent le verrou puis ne trouvent plus rien à faire
+    with open(Config.MIGRATION_LOCK_PATH, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            return migrate()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+if __name__ == "__main__":
+    applied = ensure_schema()
+    if applied:
+        print(f"Migration(s) appliquée(s) : {', '.join(map(str, applied))}")
+    print(f"Version du schéma : {SCHEMA_VERSION}")
@@ -1,29 +1,129 @@
-import sqlite3
+import base64
+import binascii
+import re
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
 from config import Config
+from database.connection import get_db_connection
+from database.user_cache import user_cache
+from utils.blobs import delete_file_entry
+from utils.ids import new_ulid
+from utils.passwords import hash_password, verify_password
+from utils.unlinker import unlinker
+
+
+def encode_cursor(upload_date, file_id):
+    """
+    Encode la position (upload_date, id) d'un fichier en curseur opaque pour l'URL.
+    Sert aussi aux résultats de recherche, avec le rang à la place de la date.
+    
+    Args:
+        upload_date: Date de téléchargement (ou rang) du dernier fichier de la page.
+        file_id (int): ID du dernier fichier de la page.
+        
+    Returns:
+        str: Curseur encodé en base64 compatible URL.
+    """
+    raw = f"{upload_date}|{file_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Décode un curseur produit par encode_cursor().
+    
+    Args:
+        cursor (str): Curseur encodé (peut être None).
+        
+    Returns:
+        tuple or None: (upload_date, id), ou None si le curseur est absent ou invalide.
+    """
+    if not cursor:
+        return None
+    try:
+        upload_date, file_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return upload_date, int(file_id)
+    except (ValueError, UnicodeError, binascii.Error):
+        return None
+
+
+def clamp_page_size(limit):
+    """
+    Borne une taille de page demandée entre 1 et Config.FILES_MAX_PAGE_SIZE.
+    
+    Args:
+        limit (int): Taille demandée (None pour la taille par défaut).
+        
+    Returns:
+        int: Taille de page effective.
+    """
+    if not limit or limit < 1:
+        return Config.FILES_PAGE_SIZE
+    return min(limit, Config.FILES_MAX_PAGE_SIZE)
+
+def iter_rows(query, params=(), conn=None):
+    """
+    Parcourt le résultat d'une requête par lots de Config.MODEL_FETCH_SIZE lignes
+    (fetchmany) : seul le lot courant est en mémoire, quelle que soit la taille de la table.
+    
+    Args:
+        query (str): Requête SELECT.
+        params (tuple): Paramètres de la requête.
+        conn (sqlite3.Connection): Connexion à réutiliser (optionnel). Sinon, une
+                                   connexion est prise au pool et rendue à la fin du parcours.
+        
+    Yields:
+        sqlite3.Row: Lignes du résultat.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        cursor = conn.execute(query, params)
+        cursor.arraysize = Config.MODEL_FETCH_SIZE
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            yield from rows
+    finally:
+        if own_conn:
+            conn.close()
 
 class User:
     """
     Modèle pour la gestion des utilisateurs.
     """
+    # Pas de __dict__ par instance : listes et cache des utilisateurs plus compacts
+    __slots__ = ('id', 'username', 'password', 'is_admin')
+    
     def __init__(self, id=None, username=None, password=None, is_admin=0):
         self.id = id
         self.username = username
         self.password = password  # Stocke le hash du mot de passe
         self.is_admin = is_admin
     
+    @classmethod
+    def from_row(cls, row):
+        """
+        Construit un utilisateur à partir d'une ligne de la table users.
+        
+        Args:
+            row (sqlite3.Row): Ligne contenant au moins id, username, password et is_admin.
+            
+        Returns:
+            User: Instance correspondante.
+        """
+        return cls(row['id'], row['username'], row['password'], row['is_admin'])
+    
     @classmethod
     def get_db_connection(cls):
         """
-        Établit une connexion à la base de données.
+        Retourne une connexion à la base de données.
         
         Returns:
-            sqlite3.Connection: Objet de connexion à la base de données.
+            sqlite3.Connection: Connexion issue du pool partagé (database/connection.py).
         """
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return get_db_connection()
     
     @classmethod
     def get_by_id(cls, user_id):
@@ -41,12 +141,7 @@ class User:
         conn.close()
         
         if user_data:
-            return cls(
-                id=user_data['id'],
-                username=user_data['username'],
-                password=user_data['password'],
-                is_admin=user_data['is_admin']
-            )
+            return cls.from_row(user_data)
         return None
     
     @classmethod
@@ -65,32 +160,57 @@ class User:
         conn.close()
         
         if user_data:
-            return cls(
-                id=user_data['id'],
-                username=user_data['username'],
-                password=user_data['password'],
-                is_admin=user_data['is_admin']
-            )
+            return cls.from_row(user_data)
         return None
     
+    @classmethod
+    def get_cached(cls, user_id):
+        """
+        Récupère un utilisateur par son ID via le cache en mémoire.
+        Utilisé à chaque requête par require_login et les décorateurs d'authentification.
+        
+        Args:
+            user_id (int): ID de l'utilisateur à récupérer.
+            
+        Returns:
+            User: Instance de User si trouvé, None sinon.
+        """
+        return user_cache.get(user_id, cls.get_by_id)
+    
+    @classmethod
+    def get_cached_by_username(cls, username):
+        """
+        Récupère un utilisateur par son nom via le cache en mémoire.
+        
+        Args:
+            username (str): Nom d'utilisateur à rechercher.
+            
+        Returns:
+            User: Instance de User si trouvé, None sinon.
+        """
+        return user_cache.get_by_username(username, cls.get_by_username)
+    
+    @classmethod
+    def iter_all(cls):
+        """
+        Parcourt tous les utilisateurs par ordre d'ID, lus par lots.
+        
+        Yields:
+            User: Instances construites une à une, au fil du parcours.
+        """
+        for row in iter_rows("SELECT * FROM users ORDER BY id"):
+            yield cls.from_row(row)
+    
     @classmethod
     def get_all(cls):
         """
         Récupère tous les utilisateurs.
+        Pour parcourir une grande table sans tout charger, utiliser iter_all().
         
         Returns:
             list: Liste d'instances de User.
         """
-        conn = cls.get_db_connection()
-        users_data = conn.execute("SELECT * FROM users ORDER BY id").fetchall()
-        conn.close()
-        
-        return [cls(
-            id=user['id'],
-            username=user['username'],
-            password=user['password'],
-            is_admin=user['is_admin']
-        ) for user in users_data]
+        return list(cls.iter_all())
     
     def save(self):
         """
@@ -115,6 +235,8 @@ class User:
         
         conn.commit()
         conn.close()
+        # Invalider le cache des utilisateurs (tous les workers), une fois l'écriture validée
+        user_cache.invalidate(self.id)
         return self.id
     
     def delete(self):
@@ -131,6 +253,7 @@ class User:
         conn.execute("DELETE FROM users WHERE id = ?", (self.id,))
         conn.commit()
         conn.close()
+        user_cache.invalidate(self.id)
         return True
     
     def set_password(self, password):
@@ -140,7 +263,7 @@ class User:
         Args:
             password (str): Mot de passe en clair.
         """
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
     
     def check_password(self, password):
         """
@@ -152,33 +275,51 @@ class User:
         Returns:
             bool: True si le mot de passe correspond, False sinon.
         """
-        return check_password_hash(self.password, password)
+        return verify_password(self.password, password)
 
 
 class File:
     """
     Modèle pour la gestion des fichiers.
     """
+    __slots__ = ('id', 'uid', 'filename', 'original_filename', 'uploaded_by', 'upload_date',
+                 'filesize', 'sha256', 'codec')
+    
     def __init__(self, id=None, filename=None, original_filename=None, 
-                 uploaded_by=None, upload_date=None, filesize=None):
+                 uploaded_by=None, upload_date=None, filesize=None, sha256=None, codec=None, uid=None):
         self.id = id
+        self.uid = uid or new_ulid()  # Identifiant unique triable, attribué sans passer par la base
         self.filename = filename  # Nom du fichier stocké sur le serveur
         self.original_filename = original_filename  # Nom original du fichier
         self.uploaded_by = uploaded_by  # ID de l'utilisateur qui a téléchargé le fichier
         self.upload_date = upload_date or datetime.now()  # Date de téléchargement
         self.filesize = filesize  # Taille du fichier en octets
+        self.sha256 = sha256  # Empreinte du contenu (blob partagé), None pour les anciens fichiers
+        self.codec = codec  # Compression du fichier stocké ('gzip'), None si stocké tel quel
+    
+    @classmethod
+    def from_row(cls, row):
+        """
+        Construit un fichier à partir d'une ligne de la table files.
+        
+        Args:
+            row (sqlite3.Row): Ligne complète de la table files (SELECT *).
+            
+        Returns:
+            File: Instance correspondante.
+        """
+        return cls(row['id'], row['filename'], row['original_filename'], row['uploaded_by'],
+                   row['upload_date'], row['filesize'], row['sha256'], row['codec'], row['uid'])
     
     @classmethod
     def get_db_connection(cls):
         """
-        Établit une connexion à la base de données.
+        Retourne une connexion à la base de données.
         
         Returns:
-            sqlite3.Connection: Objet de connexion à la base de données.
+            sqlite3.Connection: Connexion issue du pool partagé (database/connection.py).
         """
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return get_db_connection()
     
     @classmethod
     def get_by_id(cls, file_id):
@@ -196,93 +337,235 @@ class File:
         conn.close()
         
         if file_data:
-            return cls(
-                id=file_data['id'],
-                filename=file_data['filename'],
-                original_filename=file_data['original_filename'],
-                uploaded_by=file_data['uploaded_by'],
-                upload_date=file_data['upload_date'],
-                filesize=file_data['filesize']
-            )
+            return cls.from_row(file_data)
         return None
     
+    @classmethod
+    def iter_all(cls):
+        """
+        Parcourt tous les fichiers, du plus récent au plus ancien, lus par lots.
+        
+        Yields:
+            File: Instances construites une à une, au fil du parcours.
+        """
+        for row in iter_rows("SELECT * FROM files ORDER BY upload_date DESC"):
+            yield cls.from_row(row)
+    
     @classmethod
     def get_all(cls):
         """
         Récupère tous les fichiers.
+        Pour parcourir une grande table sans tout charger, utiliser iter_all().
         
         Returns:
             list: Liste d'instances de File.
         """
-        conn = cls.get_db_connection()
-        files_data = conn.execute(
-            "SELECT * FROM files ORDER BY upload_date DESC"
-        ).fetchall()
-        conn.close()
+        return list(cls.iter_all())
+    
+    @classmethod
+    def iter_with_users(cls):
+        """
+        Parcourt tous les fichiers avec le nom de l'utilisateur qui les a téléchargés,
+        du plus récent au plus ancien, lus par lots.
         
-        return [cls(
-            id=file['id'],
-            filename=file['filename'],
-            original_filename=file['original_filename'],
-            uploaded_by=file['uploaded_by'],
-            upload_date=file['upload_date'],
-            filesize=file['filesize']
-        ) for file in files_data]
+        Yields:
+            sqlite3.Row: Lignes de files complétées de users.username.
+        """
+        yield from iter_rows("""
+            SELECT files.*, users.username 
+            FROM files 
+            JOIN users ON files.uploaded_by = users.id
+            ORDER BY files.upload_date DESC
+        """)
     
     @classmethod
     def get_all_with_users(cls):
         """
         Récupère tous les fichiers avec les informations des utilisateurs qui les ont téléchargés.
+        Pour parcourir une grande table sans tout charger, utiliser iter_with_users().
         
         Returns:
             list: Liste de dictionnaires contenant les informations des fichiers et utilisateurs.
         """
-        conn = cls.get_db_connection()
-        files_data = conn.execute("""
-            SELECT files.*, users.username 
-            FROM files 
+        return list(cls.iter_with_users())
+    
+    @classmethod
+    def get_page_with_users(cls, limit=None, cursor=None):
+        """
+        Récupère une page de fichiers avec le nom de l'utilisateur, du plus récent
+        au plus ancien, par pagination sur curseur (upload_date, id).
+        
+        Args:
+            limit (int): Nombre de fichiers par page (borné par clamp_page_size).
+            cursor (tuple): Position (upload_date, id) renvoyée par decode_cursor(),
+                            None pour la première page.
+            
+        Returns:
+            tuple: (liste de lignes, curseur encodé de la page suivante ou None).
+        """
+        limit = clamp_page_size(limit)
+        query = """
+            SELECT files.id, files.original_filename, files.upload_date, files.filesize, users.username
+            FROM files
             JOIN users ON files.uploaded_by = users.id
-            ORDER BY files.upload_date DESC
-        """).fetchall()
+        """
+        params = []
+        if cursor:
+            query += " WHERE (files.upload_date, files.id) < (?, ?)"
+            params.extend(cursor)
+        query += " ORDER BY files.upload_date DESC, files.id DESC LIMIT ?"
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        params.append(limit + 1)
+        
+        conn = cls.get_db_connection()
+        files_data = conn.execute(query, params).fetchall()
+        conn.close()
+        
+        next_cursor = None
+        if len(files_data) > limit:
+            files_data = files_data[:limit]
+            last = files_data[-1]
+            next_cursor = encode_cursor(last['upload_date'], last['id'])
+        
+        return files_data, next_cursor
+    
+    @classmethod
+    def search(cls, query, limit=None, cursor=None):
+        """
+        Recherche des fichiers par nom ou par utilisateur dans l'index plein texte FTS5.
+        Chaque mot de la recherche est traité comme un préfixe ; les résultats sont
+        classés par pertinence (bm25) et paginés par curseur (rang, id).
+        
+        Args:
+            query (str): Texte recherché.
+            limit (int): Nombre de résultats par page (borné par clamp_page_size).
+            cursor (tuple): Position (rang, id) renvoyée par decode_cursor(),
+                            None pour la première page.
+            
+        Returns:
+            tuple: (liste de lignes, curseur encodé de la page suivante ou None).
+        """
+        terms = re.findall(r'\w+', query or '')
+        if not terms:
+            return [], None
+        # Chaque terme entre guillemets (pas de syntaxe FTS5 injectée) suivi de * pour le préfixe
+        match = ' '.join(f'"{term}"*' for term in terms)
+        
+        limit = clamp_page_size(limit)
+        sql = """
+            SELECT files.id, files.original_filename, files.upload_date, files.filesize,
+                   files_fts.username, files_fts.rank AS rank
+            FROM files_fts
+            JOIN files ON files.id = files_fts.rowid
+            WHERE files_fts MATCH ?
+        """
+        params = [match]
+        if cursor:
+            try:
+                rank, last_id = float(cursor[0]), cursor[1]
+            except ValueError:
+                return [], None
+            sql += " AND (files_fts.rank > ? OR (files_fts.rank = ? AND files_fts.rowid > ?))"
+            params.extend([rank, rank, last_id])
+        sql += " ORDER BY files_fts.rank, files_fts.rowid LIMIT ?"
+        params.append(limit + 1)
+        
+        conn = cls.get_db_connection()
+        files_data = conn.execute(sql, params).fetchall()
         conn.close()
         
-        return files_data
+        next_cursor = None
+        if len(files_data) > limit:
+            files_data = files_data[:limit]
+            last = files_data[-1]
+            next_cursor = encode_cursor(repr(last['rank']), last['id'])
+        
+        return files_data, next_cursor
     
-    def save(self):
+    def save(self, conn=None):
         """
         Enregistre le fichier dans la base de données (création ou mise à jour).
         
+        Args:
+            conn (sqlite3.Connection): Connexion d'une transaction en cours (optionnel).
+                                       Si fournie, l'appelant se charge du commit.
+        
         Returns:
             int: ID du fichier.
         """
-        conn = self.get_db_connection()
+        own_conn = conn is None
+        if own_conn:
+            conn = self.get_db_connection()
         
         if self.id:  # Mise à jour
             conn.execute(
                 """UPDATE files 
-                   SET filename = ?, original_filename = ?, uploaded_by = ?, 
-                       upload_date = ?, filesize = ? 
+                   SET uid = ?, filename = ?, original_filename = ?, uploaded_by = ?, 
+                       upload_date = ?, filesize = ?, sha256 = ?, codec = ? 
                    WHERE id = ?""",
-                (self.filename, self.original_filename, self.uploaded_by, 
-                 self.upload_date, self.filesize, self.id)
+                (self.uid, self.filename, self.original_filename, self.uploaded_by, 
+                 self.upload_date, self.filesize, self.sha256, self.codec, self.id)
             )
         else:  # Création
             cursor = conn.execute(
                 """INSERT INTO files 
-                   (filename, original_filename, uploaded_by, upload_date, filesize) 
-                   VALUES (?, ?, ?, ?, ?)""",
-                (self.filename, self.original_filename, self.uploaded_by, 
-                 self.upload_date, self.filesize)
+                   (uid, filename, original_filename, uploaded_by, upload_date, filesize, sha256, codec) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (self.uid, self.filename, self.original_filename, self.uploaded_by, 
+                 self.upload_date, self.filesize, self.sha256, self.codec)
             )
             self.id = cursor.lastrowid
         
-        conn.commit()
-        conn.close()
+        if own_conn:
+            conn.commit()
+            conn.close()
         return self.id
     
+    @classmethod
+    def save_many(cls, files, conn=None):
+        """
+        Insère plusieurs nouveaux fichiers en une seule transaction (executemany).
+        
+        Args:
+            files (list): Instances de File sans ID.
+            conn (sqlite3.Connection): Connexion d'une transaction en cours (optionnel).
+                                       Si fournie, l'appelant se charge du commit.
+        
+        Returns:
+            list: IDs attribués, dans l'ordre de la liste.
+        """
+        if not files:
+            return []
+        
+        own_conn = conn is None
+        if own_conn:
+            conn = cls.get_db_connection()
+        try:
+            if not conn.in_transaction:
+                # Verrou d'écriture : les IDs AUTOINCREMENT attribués sont alors consécutifs
+                conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                """INSERT INTO files 
+                   (uid, filename, original_filename, uploaded_by, upload_date, filesize, sha256, codec) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(f.uid, f.filename, f.original_filename, f.uploaded_by, f.upload_date, f.filesize,
+                  f.sha256, f.codec) for f in files]
+            )
+            last_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'files'").fetchone()['seq']
+            for offset, file_entry in enumerate(files):
+                file_entry.id = last_id - len(files) + 1 + offset
+            
+            if own_conn:
+                conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+        return [f.id for f in files]
+    
     def delete(self):
         """
-        Supprime le fichier de la base de données.
+        Supprime le fichier de la base de données et libère sa référence au blob ;
+        le fichier physique est supprimé en arrière-plan s'il n'est plus référencé.
         
         Returns:
             bool: True si supprimé avec succès, False sinon.
@@ -291,7 +574,19 @@ class File:
             return False
         
         conn = self.get_db_connection()
-        conn.execute("DELETE FROM files WHERE id = ?", (self.id,))
-        conn.commit()
-        conn.close()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM files WHERE id = ?", (self.id,)).fetchone()
+            if row is None:
+                conn.rollback()
+                return False
+            released = delete_file_entry(conn, row)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        if released:
+            unlinker.enqueue([released])
         return True
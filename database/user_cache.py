@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from database.versions import get_version, bump_version
+
+# Nom du compteur de version partagé (table data_versions)
+USERS_VERSION = 'users'
+
+
+class UserCache:
+    """
+    Cache LRU + TTL d'objets User, partagé par les threads d'un worker.
+
+    Chaque écriture sur la table users incrémente un compteur de version stocké
+    dans SQLite. Les autres workers relisent ce compteur au plus toutes les
+    Config.USER_CACHE_VERSION_CHECK secondes et vident leur cache s'il a changé.
+    """
+    def __init__(self, max_size=None, ttl=None, check_interval=None):
+        self.max_size = max_size if max_size is not None else Config.USER_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else Config.USER_CACHE_TTL
+        self.check_interval = check_interval if check_interval is not None else Config.USER_CACHE_VERSION_CHECK
+        self._entries = OrderedDict()  # {user_id: (user, expire_at)}
+        self._usernames = {}  # {username: user_id}
+        self._lock = threading.Lock()
+        self._version = None
+        self._next_check = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _sync(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        version = get_version(USERS_VERSION)
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._usernames.clear()
+                self._version = version
+            self._next_check = now + self.check_interval
+
+    def _lookup(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        user, expire_at = entry
+        if expire_at < time.monotonic():
+            self._remove(user_id)
+            return None
+        self._entries.move_to_end(user_id)
+        return user
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._usernames.pop(entry[0].username, None)
+
+    def _store(self, user):
+        self._remove(user.id)
+        self._entries[user.id] = (user, time.monotonic() + self.ttl)
+        self._usernames[user.username] = user.id
+        while len(self._entries) > self.max_size:
+            oldest_id, _ = next(iter(self._entries.items()))
+            self._remove(oldest_id)
+
+    def get(self, user_id, loader):
+        """
+        Retourne un utilisateur depuis le cache, ou via loader(user_id) en cas d'absence.
+
+        Args:
+            user_id (int): ID de l'utilisateur.
+            loader: Fonction de chargement depuis la base (User.get_by_id).
+
+        Returns:
+            User or None: Utilisateur trouvé.
+        """
+        self._sync()
+        with self._lock:
+            user = self._lookup(user_id)
+            if user is not None:
+                self.hits += 1
+                return user
+            self.misses += 1
+            version = self._version
+
+        user = loader(user_id)
+        if user is not None:
+            with self._lock:
+                # Ne pas mettre en cache une ligne lue avant une invalidation concurrente
+                if version == self._version:
+                    self._store(user)
+        return user
+
+    def get_by_username(self, username, loader):
+        """
+        Retourne un utilisateur par son nom, depuis le cache ou via loader(username).
+
+        Args:
+            username (str): Nom d'utilisateur.
+            loader: Fonction de chargement depuis la base (User.get_by_username).
+
+        Returns:
+            User or None: Utilisateur trouvé.
+        """
+        self._sync()
+        with self._lock:
+            user_id = self._usernames.get(username)
+            user = self._lookup(user_id) if user_id is not None else None
+            if user is not None:
+                self.hits += 1
+                return user
+            self.misses += 1
+            version = self._version
+
+        user = loader(username)
+        if user is not None:
+            with self._lock:
+                if version == self._version:
+                    self._store(user)
+        return user
+
+    def invalidate(self, user_id=None):
+        """
+        Retire un utilisateur du cache local et incrémente la version partagée
+        pour que les autres workers vident le leur.
+
+        À appeler après le commit de l'écriture : appelée avant, un get() concurrent
+        relirait l'ancienne ligne et la garderait en cache jusqu'à expiration du TTL,
+        la version locale étant déjà à jour.
+
+        Args:
+            user_id (int): ID de l'utilisateur modifié (None pour tout vider).
+        """
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+                self._usernames.clear()
+            else:
+                self._remove(user_id)
+
+        version = bump_version(USERS_VERSION)
+        with self._lock:
+            if self._version is not None and version == self._version + 1:
+                # Seule notre écriture a eu lieu : le reste du cache local reste valide
+                self._version = version
+            else:
+                self._entries.clear()
+                self._usernames.clear()
+                self._version = version
+
+    def stats(self):
+        """
+        Retourne les compteurs du cache.
+
+        Returns:
+            dict: Taille, hits et misses.
+        """
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+user_cache = UserCache()
@@ -0,0 +1,96 @@
+"""
+Compteurs d'utilisation par utilisateur (nombre de fichiers, octets, dernier envoi).
+
+La table user_stats est tenue à jour par des triggers sur files
+(database/db_setup.py) : la lire coûte une recherche par clé primaire, sans
+parcourir files. rebuild_user_stats() la recalcule entièrement, au cas où
+elle aurait été modifiée hors de l'application.
+
+Usage : python -m database.user_stats --rebuild
+"""
+import argparse
+import json
+from config import Config
+from database.connection import get_db_connection
+
+
+def get_user_stats(user_id, conn=None):
+    """
+    Lit les compteurs d'un utilisateur.
+
+    Args:
+        user_id (int): ID de l'utilisateur.
+        conn (sqlite3.Connection): Connexion à réutiliser (optionnel).
+
+    Returns:
+        dict: file_count, total_bytes et last_upload (None si aucun fichier).
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    row = conn.execute(
+        "SELECT file_count, total_bytes, last_upload FROM user_stats WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    if own_conn:
+        conn.close()
+    if row is None:
+        return {'file_count': 0, 'total_bytes': 0, 'last_upload': None}
+    return dict(row)
+
+
+def remaining_quota(user_id, conn=None):
+    """
+    Calcule l'espace encore disponible pour un utilisateur (Config.USER_QUOTA_BYTES).
+
+    Args:
+        user_id (int): ID de l'utilisateur.
+        conn (sqlite3.Connection): Connexion à réutiliser, par exemple celle de la
+                                   transaction qui enregistre les fichiers (optionnel).
+
+    Returns:
+        int or None: Octets disponibles (éventuellement négatif), None sans quota.
+    """
+    if not Config.USER_QUOTA_BYTES:
+        return None
+    return Config.USER_QUOTA_BYTES - get_user_stats(user_id, conn)['total_bytes']
+
+
+def rebuild_user_stats(conn=None):
+    """
+    Recalcule user_stats à partir de la table files.
+
+    Args:
+        conn (sqlite3.Connection): Connexion d'une transaction en cours (optionnel).
+                                   Si fournie, l'appelant se charge du commit.
+
+    Returns:
+        int: Nombre d'utilisateurs ayant au moins un fichier.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+        conn.execute("BEGIN IMMEDIATE")
+    conn.execute("DELETE FROM user_stats")
+    cursor = conn.execute('''
+        INSERT INTO user_stats (user_id, file_count, total_bytes, last_upload)
+        SELECT uploaded_by, COUNT(*), SUM(filesize), MAX(upload_date)
+        FROM files
+        GROUP BY uploaded_by
+    ''')
+    count = cursor.rowcount
+    if own_conn:
+        conn.commit()
+        conn.close()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compteurs d'utilisation par utilisateur.")
+    parser.add_argument('--rebuild', action='store_true', help="recalculer la table à partir de files")
+    args = parser.parse_args()
+    if args.rebuild:
+        print(f"{rebuild_user_stats()} utilisateur(s) recalculé(s)")
+    conn = get_db_connection()
+    rows = conn.execute("SELECT * FROM user_stats ORDER BY total_bytes DESC").fetchall()
+    conn.close()
+    print(json.dumps([dict(row) for row in rows], indent=2))
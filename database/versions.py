@@ -0,0 +1,48 @@
+from database.connection import get_db_connection
+
+
+def get_version(name, conn=None):
+    """
+    Lit un compteur de version partagé entre les workers.
+    
+    Args:
+        name (str): Nom du compteur (par exemple 'users').
+        conn (sqlite3.Connection): Connexion à réutiliser (optionnel).
+        
+    Returns:
+        int: Version courante (0 si le compteur n'existe pas encore).
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()
+    if own_conn:
+        conn.close()
+    return row['version'] if row else 0
+
+
+def bump_version(name, conn=None):
+    """
+    Incrémente un compteur de version partagé.
+    
+    Args:
+        name (str): Nom du compteur.
+        conn (sqlite3.Connection): Connexion d'une transaction en cours (optionnel).
+                                   Si fournie, l'appelant se charge du commit.
+        
+    Returns:
+        int: Nouvelle version.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    conn.execute(
+        """INSERT INTO data_versions (name, version) VALUES (?, 1)
+           ON CONFLICT (name) DO UPDATE SET version = version + 1""",
+        (name,)
+    )
+    version = conn.execute("SELECT version FROM data_versions WHERE name = ?", (name,)).fetchone()['version']
+    if own_conn:
+        conn.commit()
+        conn.close()
+    return version
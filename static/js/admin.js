@@ -31,46 +31,16 @@ document.addEventListener('DOMContentLoaded', function() {
     // Sélectionner le formulaire de téléchargement de fichier
     const uploadForm = document.querySelector('.upload-section form');
     
-    // Ajouter un gestionnaire d'événements pour la soumission du formulaire
+    // Envoyer le fichier par morceaux avec barre de progression (voir upload.js)
     if (uploadForm) {
-        uploadForm.addEventListener('submit', function(event) {
-            const fileInput = document.getElementById('file');
-            
-            // Validation simple côté client
-            if (!fileInput.files || fileInput.files.length === 0) {
-                event.preventDefault();
-                alert('Veuillez sélectionner un fichier.');
-                return false;
-            }
-            
-            // Vérifier l'extension du fichier
-            const fileName = fileInput.files[0].name;
-            const fileExt = fileName.split('.').pop().toLowerCase();
-            const allowedExtensions = ['txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'zip'];
-            
-            if (!allowedExtensions.includes(fileExt)) {
-                event.preventDefault();
-                alert('Type de fichier non autorisé. Veuillez sélectionner un fichier avec une extension valide : ' + allowedExtensions.join(', '));
-                return false;
-            }
-            
-            // Vérifier la taille du fichier (max 16 Mo)
-            const maxSize = 16 * 1024 * 1024; // 16 Mo en octets
-            if (fileInput.files[0].size > maxSize) {
-                event.preventDefault();
-                alert('Le fichier est trop volumineux. La taille maximale autorisée est de 16 Mo.');
-                return false;
-            }
-            
-            // Si tout est valide, le formulaire sera soumis normalement
-        });
+        attachChunkedUpload(uploadForm);
     }
     
     // Ajouter une confirmation pour la suppression d'utilisateurs
     const deleteUserForms = document.querySelectorAll('form[action*="delete_user"]');
     deleteUserForms.forEach(function(form) {
         form.addEventListener('submit', function(event) {
-            if (!confirm('Êtes-vous sûr de vouloir supprimer cet utilisateur ? Cette action est irréversible.')) {
+            if (!confirm('Êtes-vous sûr de vouloir supprimer cet utilisateur et tous ses fichiers ? Cette action est irréversible.')) {
                 event.preventDefault();
                 return false;
             }
@@ -88,6 +58,38 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
+    // Cases « tout sélectionner » des tableaux
+    const selectAllBoxes = document.querySelectorAll('.select-all');
+    selectAllBoxes.forEach(function(box) {
+        box.addEventListener('change', function() {
+            const boxes = document.querySelectorAll('input[name="' + box.dataset.target + '"]');
+            boxes.forEach(function(item) {
+                item.checked = box.checked;
+            });
+        });
+    });
+    
+    // Ajouter une confirmation pour les opérations groupées
+    const bulkForms = document.querySelectorAll('.bulk-form');
+    bulkForms.forEach(function(form) {
+        form.addEventListener('submit', function(event) {
+            const selected = document.querySelectorAll('input[form="' + form.id + '"]:checked').length;
+            if (selected === 0) {
+                event.preventDefault();
+                alert('Veuillez sélectionner au moins un élément.');
+                return false;
+            }
+            // Téléchargement de la sélection : rien d'irréversible, pas de confirmation
+            if (event.submitter && event.submitter.hasAttribute('data-no-confirm')) {
+                return true;
+            }
+            if (!confirm('Appliquer cette action à ' + selected + ' élément(s) ? Cette action est irréversible.')) {
+                event.preventDefault();
+                return false;
+            }
+        });
+    });
+    
     // Faire disparaître les messages flash après quelques secondes
     const flashMessages = document.querySelectorAll('.flash-message');
     if (flashMessages.length > 0) {
@@ -102,7 +104,7 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     // Formatage de la date pour un affichage plus convivial
-    const dateCells = document.querySelectorAll('td:nth-child(3)');
+    const dateCells = document.querySelectorAll('.files-table td:nth-child(4)');
     dateCells.forEach(function(cell) {
         try {
             const date = new Date(cell.textContent);
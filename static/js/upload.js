@@ -0,0 +1,178 @@
+// Upload par morceaux avec reprise, ou par lot pour les petits fichiers (partagé par user.js et admin.js)
+
+const ALLOWED_EXTENSIONS = ['txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'zip'];
+
+// Clé de reprise : un même fichier sélectionné à nouveau reprend son upload interrompu
+function uploadResumeKey(file) {
+    return 'upload:' + file.name + ':' + file.size + ':' + file.lastModified;
+}
+
+async function uploadJson(url, method, body) {
+    const response = await fetch(url, {
+        method: method,
+        headers: body ? { 'Content-Type': 'application/json' } : {},
+        body: body ? JSON.stringify(body) : undefined
+    });
+    const data = await response.json().catch(function() { return {}; });
+    if (!response.ok && response.status !== 409) {
+        throw new Error(data.error || ('Erreur HTTP ' + response.status));
+    }
+    data.status = response.status;
+    return data;
+}
+
+// Retourne l'identifiant et l'offset d'une session existante, ou en crée une nouvelle
+async function uploadOpenSession(file) {
+    const key = uploadResumeKey(file);
+    const savedId = localStorage.getItem(key);
+    if (savedId) {
+        try {
+            const status = await uploadJson('/upload/' + savedId, 'GET');
+            return { uploadId: savedId, offset: status.offset, chunkSize: null };
+        } catch (e) {
+            localStorage.removeItem(key);
+        }
+    }
+    const session = await uploadJson('/upload/init', 'POST', { filename: file.name, size: file.size });
+    localStorage.setItem(key, session.upload_id);
+    return { uploadId: session.upload_id, offset: session.offset, chunkSize: session.chunk_size };
+}
+
+// Envoie un fichier morceau par morceau ; onProgress(octetsEnvoyés, total) est appelé après chaque morceau
+async function uploadFileInChunks(file, defaultChunkSize, onProgress) {
+    const session = await uploadOpenSession(file);
+    const chunkSize = session.chunkSize || defaultChunkSize;
+    let offset = session.offset;
+    onProgress(offset, file.size);
+
+    while (offset < file.size) {
+        const chunk = file.slice(offset, Math.min(offset + chunkSize, file.size));
+        const response = await fetch('/upload/' + session.uploadId + '?offset=' + offset, {
+            method: 'PUT',
+            headers: { 'Content-Type': 'application/octet-stream' },
+            body: chunk
+        });
+        const data = await response.json().catch(function() { return {}; });
+        if (response.status === 409 && data.offset !== undefined) {
+            // Le serveur indique le dernier offset acquitté : reprendre à partir de là
+            offset = data.offset;
+            continue;
+        }
+        if (!response.ok) {
+            throw new Error(data.error || ('Erreur HTTP ' + response.status));
+        }
+        offset = data.offset;
+        onProgress(offset, file.size);
+    }
+
+    const result = await uploadJson('/upload/' + session.uploadId + '/finalize', 'POST', {});
+    if (result.status !== 200) {
+        throw new Error(result.error || 'Finalisation impossible');
+    }
+    localStorage.removeItem(uploadResumeKey(file));
+    return result;
+}
+
+// Envoie plusieurs petits fichiers en une seule requête multipart ; le serveur répond fichier par fichier
+function uploadBatch(uploadForm, files, onProgress) {
+    return new Promise(function(resolve, reject) {
+        const formData = new FormData();
+        files.forEach(function(file) {
+            formData.append('file', file);
+        });
+        const xhr = new XMLHttpRequest();
+        xhr.open('POST', uploadForm.action);
+        xhr.setRequestHeader('Accept', 'application/json');
+        xhr.upload.addEventListener('progress', function(event) {
+            if (event.lengthComputable) {
+                onProgress(event.loaded, event.total);
+            }
+        });
+        xhr.addEventListener('load', function() {
+            let data = {};
+            try {
+                data = JSON.parse(xhr.responseText);
+            } catch (e) {
+                // Réponse non JSON : traitée comme une erreur ci-dessous
+            }
+            if (xhr.status !== 200 || !data.results) {
+                reject(new Error(data.error || ('Erreur HTTP ' + xhr.status)));
+                return;
+            }
+            const failures = data.results.filter(function(result) { return !result.ok; });
+            if (failures.length > 0) {
+                alert(failures.map(function(result) { return result.filename + ' : ' + result.error; }).join('\n'));
+            }
+            resolve(data.results);
+        });
+        xhr.addEventListener('error', function() {
+            reject(new Error('Erreur réseau'));
+        });
+        xhr.send(formData);
+    });
+}
+
+// Remplace la soumission classique d'un formulaire d'upload :
+// plusieurs petits fichiers partent en un seul lot, les autres par morceaux
+function attachChunkedUpload(uploadForm) {
+    const fileInput = uploadForm.querySelector('input[type="file"]');
+    const progress = uploadForm.querySelector('.upload-progress');
+    const chunkSize = parseInt(uploadForm.dataset.chunkSize, 10) || 8 * 1024 * 1024;
+    const maxSize = parseInt(uploadForm.dataset.maxSize, 10) || 0;
+    const batchMaxSize = parseInt(uploadForm.dataset.batchMaxSize, 10) || 0;
+
+    uploadForm.addEventListener('submit', function(event) {
+        event.preventDefault();
+
+        // Validation simple côté client
+        if (!fileInput.files || fileInput.files.length === 0) {
+            alert('Veuillez sélectionner un fichier.');
+            return false;
+        }
+
+        const files = Array.from(fileInput.files);
+        for (const file of files) {
+            // Vérifier l'extension du fichier
+            const fileExt = file.name.split('.').pop().toLowerCase();
+            if (!ALLOWED_EXTENSIONS.includes(fileExt)) {
+                alert('Type de fichier non autorisé (' + file.name + '). Veuillez sélectionner des fichiers avec une extension valide : ' + ALLOWED_EXTENSIONS.join(', '));
+                return false;
+            }
+
+            // Vérifier la taille maximale d'un fichier
+            if (maxSize && file.size > maxSize) {
+                alert('Le fichier ' + file.name + ' est trop volumineux.');
+                return false;
+            }
+        }
+
+        const submitButton = uploadForm.querySelector('button[type="submit"]');
+        submitButton.disabled = true;
+        progress.hidden = false;
+
+        function showProgress(sent, total) {
+            progress.max = total || 1;
+            progress.value = total ? sent : 1;
+        }
+
+        const totalSize = files.reduce(function(sum, file) { return sum + file.size; }, 0);
+        let upload;
+        if (files.length > 1 && batchMaxSize && totalSize <= batchMaxSize) {
+            upload = uploadBatch(uploadForm, files, showProgress);
+        } else {
+            // Fichiers envoyés l'un après l'autre, par morceaux
+            upload = files.reduce(function(previous, file) {
+                return previous.then(function() {
+                    return uploadFileInChunks(file, chunkSize, showProgress);
+                });
+            }, Promise.resolve());
+        }
+
+        upload.then(function() {
+            window.location.reload();
+        }).catch(function(error) {
+            alert('Échec de l\'envoi : ' + error.message + '. Sélectionnez à nouveau le fichier pour reprendre.');
+            submitButton.disabled = false;
+        });
+    });
+}
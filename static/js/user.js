@@ -2,41 +2,11 @@
 
 document.addEventListener('DOMContentLoaded', function() {
     // Sélectionner le formulaire de téléchargement de fichier
-    const uploadForm = document.querySelector('form');
+    const uploadForm = document.querySelector('.upload-section form');
     
-    // Ajouter un gestionnaire d'événements pour la soumission du formulaire
+    // Envoyer le fichier par morceaux avec barre de progression (voir upload.js)
     if (uploadForm) {
-        uploadForm.addEventListener('submit', function(event) {
-            const fileInput = document.getElementById('file');
-            
-            // Validation simple côté client
-            if (!fileInput.files || fileInput.files.length === 0) {
-                event.preventDefault();
-                alert('Veuillez sélectionner un fichier.');
-                return false;
-            }
-            
-            // Vérifier l'extension du fichier
-            const fileName = fileInput.files[0].name;
-            const fileExt = fileName.split('.').pop().toLowerCase();
-            const allowedExtensions = ['txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'zip'];
-            
-            if (!allowedExtensions.includes(fileExt)) {
-                event.preventDefault();
-                alert('Type de fichier non autorisé. Veuillez sélectionner un fichier avec une extension valide : ' + allowedExtensions.join(', '));
-                return false;
-            }
-            
-            // Vérifier la taille du fichier (max 16 Mo)
-            const maxSize = 16 * 1024 * 1024; // 16 Mo en octets
-            if (fileInput.files[0].size > maxSize) {
-                event.preventDefault();
-                alert('Le fichier est trop volumineux. La taille maximale autorisée est de 16 Mo.');
-                return false;
-            }
-            
-            // Si tout est valide, le formulaire sera soumis normalement
-        });
+        attachChunkedUpload(uploadForm);
     }
     
     // Faire disparaître les messages flash après quelques secondes
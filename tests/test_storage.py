@@ -0,0 +1,214 @@
+"""
+Tests de S3Storage et de TieredStorage avec un client S3 factice, passé par
+le paramètre client= (mêmes appels et mêmes erreurs que boto3).
+
+Usage : python -m pytest tests
+"""
+import io
+import os
+import time
+from datetime import datetime, timezone
+import pytest
+from utils.storage import ClientError, LocalStorage, S3Storage, TieredStorage
+
+
+class FakeS3Client:
+    """
+    Bucket S3 en mémoire : {clé: octets}. Les appels reçus sont notés dans calls.
+    """
+    def __init__(self, page_size=2):
+        self.objects = {}
+        self.calls = []
+        self.page_size = page_size
+
+    def _get(self, key, operation, code):
+        if key not in self.objects:
+            raise ClientError({'Error': {'Code': code, 'Message': 'Not Found'}}, operation)
+        return self.objects[key]
+
+    def head_object(self, Bucket, Key):
+        self.calls.append(('head_object', Key))
+        return {'ContentLength': len(self._get(Key, 'HeadObject', '404'))}
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.calls.append(('get_object', Key, Range))
+        data = self._get(Key, 'GetObject', 'NoSuchKey')
+        if Range is not None:
+            start, stop = Range[len('bytes='):].split('-')
+            data = data[int(start):int(stop) + 1 if stop else None]
+        return {'Body': io.BytesIO(data)}
+
+    def upload_fileobj(self, fileobj, bucket, key):
+        self.calls.append(('upload_fileobj', key))
+        chunks = []
+        while True:
+            block = fileobj.read(3)
+            if not block:
+                break
+            chunks.append(block)
+        self.objects[key] = b''.join(chunks)
+
+    def upload_file(self, filename, bucket, key):
+        self.calls.append(('upload_file', key))
+        with open(filename, 'rb') as f:
+            self.objects[key] = f.read()
+
+    def delete_object(self, Bucket, Key):
+        self.calls.append(('delete_object', Key))
+        self.objects.pop(Key, None)
+
+    def get_paginator(self, operation):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix=''):
+                keys = sorted(key for key in client.objects if key.startswith(Prefix))
+                modified = datetime(2024, 1, 1, tzinfo=timezone.utc)
+                for index in range(0, len(keys), client.page_size):
+                    yield {'Contents': [{'Key': key, 'LastModified': modified}
+                                        for key in keys[index:index + client.page_size]]}
+        return Paginator()
+
+
+@pytest.fixture
+def client():
+    return FakeS3Client()
+
+
+@pytest.fixture
+def s3(client):
+    return S3Storage('bucket', prefix='files', client=client)
+
+
+def read(storage, name, start=0, stop=None):
+    with storage.open_read(name, start, stop) as f:
+        return f.read()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition non remplie")
+        time.sleep(0.01)
+
+
+def test_open_read_ranges(s3, client):
+    client.objects['files/ab/blob'] = b'0123456789'
+
+    assert read(s3, 'ab/blob') == b'0123456789'
+    assert client.calls[-1] == ('get_object', 'files/ab/blob', None)
+    assert read(s3, 'ab/blob', 2, 5) == b'234'
+    assert client.calls[-1] == ('get_object', 'files/ab/blob', 'bytes=2-4')
+    assert read(s3, 'ab/blob', 7) == b'789'
+    assert client.calls[-1] == ('get_object', 'files/ab/blob', 'bytes=7-')
+    # Plage vide : aucun appel au service
+    count = len(client.calls)
+    assert read(s3, 'ab/blob', 4, 4) == b''
+    assert len(client.calls) == count
+
+
+def test_write_stream(s3, client):
+    assert s3.write_stream('ab/blob', io.BytesIO(b'hello world')) == 11
+    assert client.objects['files/ab/blob'] == b'hello world'
+    assert s3.size('ab/blob') == 11
+    assert s3.exists('ab/blob')
+
+
+def test_put_file_keeps_local_file(s3, client, tmp_path):
+    local = tmp_path / 'upload.part'
+    local.write_bytes(b'content')
+
+    s3.put_file('ab/blob', str(local))
+
+    assert client.objects['files/ab/blob'] == b'content'
+    # Le fichier temporaire reste à l'appelant (supprimé après la transaction)
+    assert local.exists()
+
+
+def test_delete(s3, client):
+    client.objects['files/ab/blob'] = b'data'
+    s3.delete('ab/blob')
+    assert 'files/ab/blob' not in client.objects
+    assert not s3.exists('ab/blob')
+
+
+def test_missing_key(s3):
+    assert not s3.exists('ab/missing')
+    with pytest.raises(FileNotFoundError):
+        s3.open_read('ab/missing')
+    with pytest.raises(FileNotFoundError):
+        s3.open_read('ab/missing', 2, 5)
+    with pytest.raises(FileNotFoundError):
+        s3.delete('ab/missing')
+    with pytest.raises(FileNotFoundError):
+        s3.size('ab/missing')
+
+
+def test_other_errors_are_raised(s3, client):
+    def denied(**kwargs):
+        raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'HeadObject')
+    client.head_object = denied
+    with pytest.raises(ClientError):
+        s3.exists('ab/blob')
+
+
+def test_iter_entries_strips_prefix(s3, client):
+    for key in ('files/a', 'files/b/c', 'files/d', 'other/e'):
+        client.objects[key] = b'x'
+    entries = dict(s3.iter_entries())
+    assert sorted(entries) == ['a', 'b/c', 'd']
+    assert entries['a'] == datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def tiered(s3, tmp_path):
+    return TieredStorage(LocalStorage(str(tmp_path / 'hot')), s3)
+
+
+def test_tiered_demote(tiered, client):
+    tiered.write_stream('ab/blob', io.BytesIO(b'cold soon'))
+    path = tiered.hot.local_path('ab/blob')
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+
+    assert tiered.demote('ab/blob', time.time() - 60)
+    assert tiered.hot.local_path('ab/blob') is None
+    assert client.objects['files/ab/blob'] == b'cold soon'
+    assert tiered.exists('ab/blob')
+    assert tiered.size('ab/blob') == 9
+    # Déjà parti du disque local
+    assert not tiered.demote('ab/blob', time.time() - 60)
+
+
+def test_tiered_demote_keeps_recent_files(tiered, client):
+    tiered.write_stream('ab/blob', io.BytesIO(b'hot'))
+    assert not tiered.demote('ab/blob', time.time() - 60)
+    assert tiered.hot.local_path('ab/blob') is not None
+    assert 'files/ab/blob' not in client.objects
+
+
+def test_tiered_promote_on_read(tiered, client):
+    client.objects['files/ab/blob'] = b'0123456789'
+
+    assert read(tiered, 'ab/blob', 3, 6) == b'345'
+    assert ('get_object', 'files/ab/blob', 'bytes=3-5') in client.calls
+    wait_for(lambda: tiered.hot.local_path('ab/blob') is not None)
+    assert read(tiered.hot, 'ab/blob') == b'0123456789'
+    # La copie froide est conservée ; les lectures suivantes restent locales
+    assert 'files/ab/blob' in client.objects
+    count = len(client.calls)
+    assert read(tiered, 'ab/blob', 3, 6) == b'345'
+    assert len(client.calls) == count
+
+
+def test_tiered_delete_both_tiers(tiered, client):
+    client.objects['files/ab/blob'] = b'data'
+    tiered.write_stream('ab/blob', io.BytesIO(b'data'))
+
+    tiered.delete('ab/blob')
+
+    assert not tiered.exists('ab/blob')
+    assert 'files/ab/blob' not in client.objects
+    with pytest.raises(FileNotFoundError):
+        tiered.delete('ab/blob')
@@ -0,0 +1,121 @@
+import json
+import zlib
+from flask import request, Response, stream_with_context
+from config import Config
+from database.connection import get_db_connection
+from utils.fragment_cache import DATA_VERSION
+
+# Requêtes des listes exposées par l'API, triées par ID pour le mode incrémental (since=<id>)
+FILES_QUERY = """
+    SELECT files.id, files.uid, files.original_filename, files.filesize, files.upload_date,
+           files.sha256, files.uploaded_by, users.username
+    FROM files
+    JOIN users ON files.uploaded_by = users.id
+    WHERE files.id > ?
+    ORDER BY files.id
+"""
+USERS_QUERY = """
+    SELECT id, username, is_admin
+    FROM users
+    WHERE id > ?
+    ORDER BY id
+"""
+
+
+def wants_ndjson():
+    """
+    Indique si le client demande du NDJSON (?format=ndjson ou Accept: application/x-ndjson).
+
+    Returns:
+        bool: True pour une ligne JSON par élément, False pour un document JSON.
+    """
+    if request.args.get('format') == 'ndjson':
+        return True
+    accept = request.accept_mimetypes
+    return accept['application/x-ndjson'] > accept['application/json']
+
+
+def _encode_rows(cursor, ndjson, version):
+    """
+    Sérialise les lignes d'un curseur par lots de Config.API_FETCH_SIZE,
+    sans jamais charger tout le résultat en mémoire.
+    """
+    last_id = None
+    first = True
+    if not ndjson:
+        yield f'{{"version": {version}, "items": ['
+    while True:
+        rows = cursor.fetchmany(Config.API_FETCH_SIZE)
+        if not rows:
+            break
+        items = [json.dumps(dict(row), ensure_ascii=False, default=str) for row in rows]
+        last_id = rows[-1]['id']
+        if ndjson:
+            yield '\n'.join(items) + '\n'
+        else:
+            yield ('' if first else ', ') + ', '.join(items)
+        first = False
+    if not ndjson:
+        # last_id sert de valeur since= pour la synchronisation suivante
+        yield f'], "last_id": {json.dumps(last_id)}}}'
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(Config.API_GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_listing(query, since=0):
+    """
+    Construit une réponse qui diffuse une liste JSON ou NDJSON directement depuis
+    un curseur SQLite, avec un ETag faible basé sur la version des données.
+
+    La version et les lignes sont lues dans la même transaction de lecture :
+    le contenu envoyé correspond exactement à l'ETag annoncé.
+
+    Args:
+        query (str): Requête SQL triée par ID, avec un paramètre pour since.
+        since (int): Ne renvoyer que les éléments d'ID strictement supérieur.
+
+    Returns:
+        Response: Réponse 200 en flux, ou 304 si l'ETag du client est à jour.
+    """
+    ndjson = wants_ndjson()
+    use_gzip = request.accept_encodings['gzip'] > 0
+
+    conn = get_db_connection()
+    conn.execute("BEGIN")
+    row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (DATA_VERSION,)).fetchone()
+    version = row['version'] if row else 0
+    etag = f"{version}-{since}-{'ndjson' if ndjson else 'json'}"
+
+    headers = {'Vary': 'Accept, Accept-Encoding', 'Cache-Control': 'private, no-cache'}
+    if request.if_none_match.contains_weak(etag):
+        conn.rollback()
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag, weak=True)
+        return response
+
+    cursor = conn.execute(query, (since,))
+
+    def generate():
+        try:
+            for chunk in _encode_rows(cursor, ndjson, version):
+                yield chunk.encode('utf-8')
+        finally:
+            cursor.close()
+            conn.rollback()
+
+    body = generate()
+    if use_gzip:
+        body = _gzip(body)
+        headers['Content-Encoding'] = 'gzip'
+
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    response = Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+    response.set_etag(etag, weak=True)
+    return response
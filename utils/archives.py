@@ -0,0 +1,165 @@
+"""
+Téléchargement de plusieurs fichiers en une archive ZIP construite à la volée.
+
+L'archive est écrite par zipfile dans un tampon non « seekable » vidé après
+chaque bloc : les octets partent vers le client au fur et à mesure, sans
+fichier temporaire et en mémoire constante quel que soit le nombre ou la
+taille des fichiers. Les tailles et CRC sont alors écrits après chaque
+contenu (descripteur de données) et les extensions ZIP64 sont utilisées
+au-delà de 4 Go ou de 65535 entrées.
+"""
+import io
+import zipfile
+from datetime import datetime
+from config import Config
+from database.connection import get_db_connection
+from utils.compression import BLOCK_SIZE, open_stored
+from utils.metrics import metrics
+
+# Lignes lues par requête SQL pendant la construction de l'archive
+BATCH_SIZE = 500
+
+ARCHIVE_QUERY = "SELECT id, filename, original_filename, upload_date, filesize, codec FROM files"
+
+
+class _StreamSink(io.RawIOBase):
+    """
+    Destination de zipfile : accumule les octets écrits jusqu'au prochain take().
+    Sans seek() ni tell(), zipfile passe en mode flux (descripteurs de données).
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_archive_rows(file_ids=None, user_id=None):
+    """
+    Parcourt les fichiers à archiver par lots, dans l'ordre des IDs.
+
+    Args:
+        file_ids (list): IDs des fichiers sélectionnés.
+        user_id (int): À défaut, tous les fichiers envoyés par cet utilisateur.
+
+    Yields:
+        sqlite3.Row: Lignes de la table files.
+    """
+    if file_ids is not None:
+        file_ids = sorted(set(file_ids))
+        for start in range(0, len(file_ids), BATCH_SIZE):
+            batch = file_ids[start:start + BATCH_SIZE]
+            conn = get_db_connection()
+            try:
+                rows = conn.execute(
+                    f"{ARCHIVE_QUERY} WHERE id IN ({', '.join('?' * len(batch))}) ORDER BY id", batch
+                ).fetchall()
+            finally:
+                conn.close()
+            yield from rows
+        return
+
+    last_id = 0
+    while True:
+        # Une connexion par lot : pas de transaction de lecture ouverte pendant tout l'envoi
+        conn = get_db_connection()
+        try:
+            rows = conn.execute(
+                f"{ARCHIVE_QUERY} WHERE uploaded_by = ? AND id > ? ORDER BY id LIMIT ?",
+                (user_id, last_id, BATCH_SIZE)
+            ).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1]['id']
+
+
+def _entry_name(original_filename, used):
+    # Deux fichiers de même nom : « rapport (2).pdf », « rapport (3).pdf »...
+    name = original_filename
+    stem, dot, extension = original_filename.rpartition('.')
+    if not dot:
+        stem, extension = original_filename, ''
+    counter = 1
+    while name in used:
+        counter += 1
+        name = f"{stem} ({counter}){dot}{extension}"
+    used.add(name)
+    return name
+
+
+def _zip_info(row, name):
+    upload_date = row['upload_date']
+    if isinstance(upload_date, str):
+        try:
+            upload_date = datetime.fromisoformat(upload_date)
+        except ValueError:
+            upload_date = datetime.now()
+    # Le format ZIP ne représente pas les dates antérieures à 1980
+    date_time = max(upload_date.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+    info = zipfile.ZipInfo(name, date_time=date_time)
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    if extension in Config.ARCHIVE_STORED_EXTENSIONS:
+        # Format déjà compressé : recompresser coûterait du CPU sans rien gagner
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    # Taille annoncée : zipfile choisit seul les en-têtes ZIP64 au-delà de 4 Go
+    info.file_size = row['filesize']
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def iter_zip(rows):
+    """
+    Produit une archive ZIP des fichiers donnés, bloc par bloc.
+    Un fichier absent du stockage est omis de l'archive.
+
+    Args:
+        rows (iterable): Lignes de la table files (voir iter_archive_rows).
+
+    Yields:
+        bytes: Morceaux successifs de l'archive.
+    """
+    sink = _StreamSink()
+    used = set()
+    sent = 0
+    try:
+        with zipfile.ZipFile(sink, mode='w', allowZip64=True) as archive:
+            for row in rows:
+                try:
+                    source = open_stored(row['filename'], row['codec'])
+                except FileNotFoundError:
+                    continue
+                info = _zip_info(row, _entry_name(row['original_filename'], used))
+                with source, archive.open(info, mode='w') as entry:
+                    while True:
+                        block = source.read(BLOCK_SIZE)
+                        if not block:
+                            break
+                        entry.write(block)
+                        data = sink.take()
+                        if data:
+                            sent += len(data)
+                            yield data
+                # Descripteur de données de l'entrée, écrit à sa fermeture
+                data = sink.take()
+                sent += len(data)
+                yield data
+        # Répertoire central, écrit à la fermeture de l'archive
+        data = sink.take()
+        sent += len(data)
+        yield data
+    finally:
+        metrics.inc('download_bytes_total', sent, mode='archive')
@@ -2,6 +2,18 @@ from functools import wraps
 from flask import session, redirect, url_for, request, flash
 from database.models import User
 
+def current_user():
+    """
+    Retourne l'utilisateur connecté depuis le cache des utilisateurs.
+    
+    Returns:
+        User or None: L'utilisateur de la session, None s'il n'existe plus
+    """
+    user_id = session.get('user_id')
+    if user_id is None:
+        return None
+    return User.get_cached(user_id)
+
 def login_required(f):
     """
     Décorateur pour protéger les routes qui nécessitent une authentification.
@@ -9,7 +21,7 @@ def login_required(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if 'user_id' not in session or current_user() is None:
             return redirect(url_for('login', next=request.url))
         return f(*args, **kwargs)
     return decorated_function
@@ -23,7 +35,11 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return redirect(url_for('login', next=request.url))
-        if not session.get('is_admin'):
+        user = current_user()
+        if user is None:
+            return redirect(url_for('login', next=request.url))
+        # Droits lus dans le cache (à jour après update_user), pas dans la session
+        if not user.is_admin:
             flash("Vous n'avez pas les droits d'accès nécessaires.")
             return redirect(url_for('user_dashboard'))
         return f(*args, **kwargs)
@@ -40,7 +56,7 @@ def authenticate_user(username, password):
     Returns:
         User or None: L'objet utilisateur s'il est authentifié, None sinon
     """
-    user = User.get_by_username(username)
+    user = User.get_cached_by_username(username)
     if user and user.check_password(password):
         return user
     return None
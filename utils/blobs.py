@@ -0,0 +1,272 @@
+import hashlib
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from config import Config
+from database.connection import get_db_connection
+from utils.storage import get_storage
+
+_SHA256 = re.compile(r'[0-9a-f]{64}')
+
+
+def storage_name(name):
+    """
+    Calcule le nom de stockage d'un fichier : chemin relatif à UPLOAD_FOLDER,
+    réparti sur Config.UPLOAD_SHARD_LEVELS niveaux de sous-dossiers
+    (par exemple ab/cd/abcd1234...) pour garder des dossiers de taille raisonnable.
+
+    Les blobs sont répartis selon leur empreinte, les anciens fichiers
+    horodatés selon l'empreinte SHA-1 de leur nom.
+
+    Args:
+        name (str): Empreinte SHA-256 d'un blob ou nom d'un ancien fichier.
+
+    Returns:
+        str: Chemin relatif (séparateur /) à enregistrer dans files.filename.
+    """
+    key = name if _SHA256.fullmatch(name) else hashlib.sha1(name.encode('utf-8')).hexdigest()
+    parts = [key[2 * level:2 * level + 2] for level in range(Config.UPLOAD_SHARD_LEVELS)]
+    return '/'.join(parts + [name])
+
+
+def blob_path(filename):
+    """
+    Retourne le chemin d'un fichier dans UPLOAD_FOLDER, quel que soit le backend
+    de stockage (outils propres au disque local : migrate_storage).
+
+    Args:
+        filename (str): Valeur de files.filename (chemin réparti, ou ancien nom à plat).
+
+    Returns:
+        str: Chemin complet dans UPLOAD_FOLDER.
+    """
+    return os.path.join(Config.UPLOAD_FOLDER, *filename.split('/'))
+
+
+def blob_sha256(filename):
+    """
+    Retourne l'empreinte du blob stocké sous ce nom, si c'est son emplacement actuel.
+
+    Args:
+        filename (str): Nom de stockage.
+
+    Returns:
+        str or None: Empreinte SHA-256, None pour un ancien fichier ou un emplacement périmé.
+    """
+    sha256 = filename.rsplit('/', 1)[-1]
+    if _SHA256.fullmatch(sha256) and storage_name(sha256) == filename:
+        return sha256
+    return None
+
+
+def is_referenced(conn, filename):
+    """
+    Indique si un nom de stockage est encore utilisé par une ligne files ou par un blob.
+
+    Args:
+        conn (sqlite3.Connection): Connexion à la base de données.
+        filename (str): Nom de stockage.
+
+    Returns:
+        bool: True si le fichier physique doit être conservé.
+    """
+    if conn.execute("SELECT 1 FROM files WHERE filename = ? LIMIT 1", (filename,)).fetchone():
+        return True
+    sha256 = blob_sha256(filename)
+    return bool(sha256 and conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone())
+
+
+class BlobUnavailable(Exception):
+    """
+    Le blob préparé par prepare_blob() a disparu avant d'être référencé (dernière
+    référence supprimée entre-temps) : annuler la transaction et le préparer de nouveau.
+    """
+    def __init__(self, sha256):
+        super().__init__(sha256)
+        self.sha256 = sha256
+
+
+def prepare_blob(temp_path, sha256, size, codec=None):
+    """
+    Range un contenu dans le stockage adressé par contenu, hors de toute transaction :
+    avec un backend distant, l'envoi ne bloque pas les autres écritures SQLite.
+
+    Si un blob de même empreinte est déjà référencé, rien n'est envoyé et il garde
+    sa propre compression. Sinon, une ligne blobs à refcount 0 réserve l'empreinte
+    le temps de l'envoi (le worker de suppression n'y touche pas) ; un autre envoi
+    du même contenu attend qu'elle soit référencée, ou abandonnée depuis plus de
+    BLOB_CLAIM_TIMEOUT secondes. Il attend de même la fin d'une suppression en cours
+    du même nom (table pending_unlinks). Le fichier temporaire est conservé : l'appelant
+    le supprime après avoir validé store_blob().
+
+    Args:
+        temp_path (str): Fichier temporaire produit par stream_to_temp().
+        sha256 (str): Empreinte SHA-256 du contenu d'origine.
+        size (int): Taille en octets du contenu d'origine.
+        codec (str): Compression du fichier temporaire ('gzip'), None s'il ne l'est pas.
+
+    Returns:
+        tuple: (compression du blob stocké, jeton de réservation à passer à
+                store_blob() et abandon_blob(), None si le blob existait déjà).
+    """
+    filename = storage_name(sha256)
+    delay = 0.05
+    conn = get_db_connection()
+    try:
+        while True:
+            now = datetime.now()
+            abandoned = now - timedelta(seconds=Config.BLOB_CLAIM_TIMEOUT)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                blob = conn.execute(
+                    "SELECT codec, refcount, created_at < ? AS abandoned FROM blobs WHERE sha256 = ?",
+                    (abandoned, sha256)
+                ).fetchone()
+                if blob is not None and blob['refcount'] > 0:
+                    conn.commit()
+                    return blob['codec'], None
+                unlinking = conn.execute(
+                    "SELECT claimed_at < ? AS abandoned FROM pending_unlinks WHERE filename = ?",
+                    (abandoned, filename)
+                ).fetchone()
+                busy = (blob is not None and not blob['abandoned']) or (unlinking is not None and not unlinking['abandoned'])
+                if not busy:
+                    conn.execute("DELETE FROM pending_unlinks WHERE filename = ?", (filename,))
+                    conn.execute(
+                        """INSERT INTO blobs (sha256, size, refcount, created_at, codec) VALUES (?, ?, 0, ?, ?)
+                           ON CONFLICT (sha256) DO UPDATE SET
+                               size = excluded.size, refcount = 0,
+                               created_at = excluded.created_at, codec = excluded.codec""",
+                        (sha256, size, now, codec)
+                    )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            if not busy:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+        try:
+            get_storage().put_file(filename, temp_path)
+        except BaseException:
+            conn.execute(
+                "DELETE FROM blobs WHERE sha256 = ? AND refcount = 0 AND created_at = ?", (sha256, now)
+            )
+            conn.commit()
+            raise
+    finally:
+        conn.close()
+    return codec, now
+
+
+def store_blob(conn, sha256, token=None):
+    """
+    Ajoute une référence à un blob préparé par prepare_blob(), dans la transaction
+    de l'appelant (ouverte en BEGIN IMMEDIATE si nécessaire), sans accès au stockage.
+    La transaction n'est pas validée : l'appelant insère la ligne files
+    correspondante puis appelle conn.commit().
+
+    Args:
+        conn (sqlite3.Connection): Connexion à la base de données.
+        sha256 (str): Empreinte SHA-256 du contenu d'origine.
+        token: Jeton renvoyé par prepare_blob().
+
+    Returns:
+        tuple: (nom de stockage à enregistrer dans files.filename,
+                compression du blob stocké à enregistrer dans files.codec).
+
+    Raises:
+        BlobUnavailable: Le blob n'existe plus ; recommencer à prepare_blob().
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+    cursor = conn.execute(
+        "UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ? AND (refcount > 0 OR created_at = ?)",
+        (sha256, token)
+    )
+    if cursor.rowcount != 1:
+        raise BlobUnavailable(sha256)
+    codec = conn.execute("SELECT codec FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()['codec']
+    return storage_name(sha256), codec
+
+
+def abandon_blob(sha256, token):
+    """
+    Libère la réservation d'un blob préparé mais finalement pas référencé
+    (quota dépassé, erreur). Sans effet si store_blob() a été validé.
+
+    Args:
+        sha256 (str): Empreinte du blob.
+        token: Jeton renvoyé par prepare_blob() (None : rien à libérer).
+
+    Returns:
+        str or None: Nom du fichier envoyé à confier au worker de suppression.
+    """
+    if token is None:
+        return None
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            "DELETE FROM blobs WHERE sha256 = ? AND refcount = 0 AND created_at = ?", (sha256, token)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return storage_name(sha256) if cursor.rowcount else None
+
+
+def release_blob(conn, sha256, filename=None):
+    """
+    Retire une référence à un blob et supprime sa ligne à la dernière.
+
+    Le fichier physique n'est pas supprimé ici : son nom est renvoyé pour être
+    confié au worker de suppression (utils/unlinker.py) après le commit, afin
+    que la transaction d'écriture ne dure pas le temps d'un appel au stockage.
+
+    Args:
+        conn (sqlite3.Connection): Connexion à la base de données.
+        sha256 (str): Empreinte du blob.
+        filename (str): Nom de stockage utilisé par la ligne supprimée
+                        (par défaut, l'emplacement réparti du blob).
+
+    Returns:
+        str or None: Nom du fichier à supprimer, None si le blob est encore référencé.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+    conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?", (sha256,))
+    blob = conn.execute("SELECT refcount FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    if blob is None or blob['refcount'] > 0:
+        return None
+
+    conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+    return filename or storage_name(sha256)
+
+
+def delete_file_entry(conn, file_row):
+    """
+    Supprime une ligne files et libère le fichier physique qu'elle référence.
+
+    Les lignes antérieures au stockage par empreinte (sha256 NULL) possèdent
+    leur fichier en propre : il est toujours libéré.
+
+    Args:
+        conn (sqlite3.Connection): Connexion à la base de données.
+        file_row (sqlite3.Row): Ligne de la table files.
+
+    Returns:
+        str or None: Nom du fichier à confier au worker de suppression après
+                     le commit, None s'il reste référencé.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+    conn.execute("DELETE FROM files WHERE id = ?", (file_row['id'],))
+    if file_row['sha256']:
+        return release_blob(conn, file_row['sha256'], file_row['filename'])
+    return file_row['filename']
@@ -0,0 +1,139 @@
+from collections import Counter
+from utils.blobs import storage_name
+
+# Nombre maximal d'identifiants par clause IN (limite de variables SQLite)
+IN_CHUNK_SIZE = 500
+
+
+def _chunks(values, size=IN_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _placeholders(values):
+    return ', '.join('?' for _ in values)
+
+
+def delete_files(conn, file_ids):
+    """
+    Supprime un ensemble de fichiers dans la transaction courante.
+
+    Les compteurs de références des blobs sont décrémentés en une passe ; les
+    fichiers physiques libérés sont renvoyés pour être supprimés en arrière-plan
+    (utils/unlinker.py) une fois la transaction validée.
+
+    Args:
+        conn (sqlite3.Connection): Connexion d'une transaction en cours (BEGIN IMMEDIATE).
+        file_ids (iterable): IDs des fichiers à supprimer.
+
+    Returns:
+        tuple: (nombre de lignes supprimées, liste des noms de fichiers à supprimer).
+    """
+    deleted = 0
+    released = []
+    references = Counter()
+    filenames = {}  # {sha256: nom de stockage utilisé par les lignes supprimées}
+    for chunk in _chunks(file_ids):
+        rows = conn.execute(
+            f"SELECT id, filename, sha256 FROM files WHERE id IN ({_placeholders(chunk)})", chunk
+        ).fetchall()
+        if not rows:
+            continue
+        conn.execute(f"DELETE FROM files WHERE id IN ({_placeholders(chunk)})", chunk)
+        deleted += len(rows)
+        for row in rows:
+            if row['sha256']:
+                references[row['sha256']] += 1
+                filenames[row['sha256']] = row['filename']
+            else:
+                # Ancien fichier non partagé : il appartient à cette seule ligne
+                released.append(row['filename'])
+
+    conn.executemany(
+        "UPDATE blobs SET refcount = refcount - ? WHERE sha256 = ?",
+        [(count, sha256) for sha256, count in references.items()]
+    )
+    for chunk in _chunks(references):
+        rows = conn.execute(
+            f"SELECT sha256 FROM blobs WHERE refcount <= 0 AND sha256 IN ({_placeholders(chunk)})", chunk
+        ).fetchall()
+        orphans = [row['sha256'] for row in rows]
+        if orphans:
+            conn.execute(f"DELETE FROM blobs WHERE sha256 IN ({_placeholders(orphans)})", orphans)
+            released.extend(filenames.get(sha256) or storage_name(sha256) for sha256 in orphans)
+
+    return deleted, released
+
+
+def relink_files(conn, file_ids, target_user_id):
+    """
+    Attribue un ensemble de fichiers à un autre utilisateur.
+
+    Args:
+        conn (sqlite3.Connection): Connexion d'une transaction en cours.
+        file_ids (iterable): IDs des fichiers à réattribuer.
+        target_user_id (int): ID du nouvel utilisateur propriétaire.
+
+    Returns:
+        int: Nombre de fichiers réattribués.
+    """
+    updated = 0
+    for chunk in _chunks(file_ids):
+        cursor = conn.execute(
+            f"UPDATE files SET uploaded_by = ? WHERE id IN ({_placeholders(chunk)})",
+            [target_user_id] + chunk
+        )
+        updated += cursor.rowcount
+    return updated
+
+
+def user_file_ids(conn, user_ids):
+    """
+    Retourne les IDs des fichiers téléchargés par un ensemble d'utilisateurs.
+
+    Args:
+        conn (sqlite3.Connection): Connexion à la base de données.
+        user_ids (iterable): IDs des utilisateurs.
+
+    Returns:
+        list: IDs des fichiers.
+    """
+    file_ids = []
+    for chunk in _chunks(user_ids):
+        rows = conn.execute(
+            f"SELECT id FROM files WHERE uploaded_by IN ({_placeholders(chunk)})", chunk
+        ).fetchall()
+        file_ids.extend(row['id'] for row in rows)
+    return file_ids
+
+
+def delete_users(conn, user_ids, files_action='delete', target_user_id=None):
+    """
+    Supprime un ensemble d'utilisateurs et traite leurs fichiers dans la même transaction.
+    Après le commit, l'appelant invalide user_cache.
+
+    Args:
+        conn (sqlite3.Connection): Connexion d'une transaction en cours (BEGIN IMMEDIATE).
+        user_ids (iterable): IDs des utilisateurs à supprimer.
+        files_action (str): 'delete' pour supprimer leurs fichiers,
+                            'relink' pour les attribuer à target_user_id.
+        target_user_id (int): Nouveau propriétaire des fichiers (pour 'relink').
+
+    Returns:
+        tuple: (utilisateurs supprimés, fichiers traités, noms de fichiers à supprimer).
+    """
+    user_ids = list(user_ids)
+    file_ids = user_file_ids(conn, user_ids)
+    released = []
+    if files_action == 'relink':
+        files_count = relink_files(conn, file_ids, target_user_id)
+    else:
+        files_count, released = delete_files(conn, file_ids)
+
+    deleted = 0
+    for chunk in _chunks(user_ids):
+        cursor = conn.execute(f"DELETE FROM users WHERE id IN ({_placeholders(chunk)})", chunk)
+        deleted += cursor.rowcount
+
+    return deleted, files_count, released
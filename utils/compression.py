@@ -0,0 +1,133 @@
+import gzip
+import shutil
+import zlib
+from config import Config
+from utils.storage import get_storage
+
+# Taille des blocs lus et écrits lors de la (dé)compression
+BLOCK_SIZE = 64 * 1024
+
+GZIP = 'gzip'
+
+
+def codec_for(filename):
+    """
+    Choisit la compression à appliquer à un fichier selon son extension.
+
+    Args:
+        filename (str): Nom original du fichier.
+
+    Returns:
+        str or None: 'gzip' pour les extensions de Config.COMPRESS_EXTENSIONS, None sinon.
+    """
+    if '.' not in filename:
+        return None
+    extension = filename.rsplit('.', 1)[1].lower()
+    return GZIP if extension in Config.COMPRESS_EXTENSIONS else None
+
+
+def compressing_writer(fileobj, codec):
+    """
+    Enveloppe un fichier ouvert en écriture pour compresser les données au fil de l'eau.
+
+    Args:
+        fileobj: Fichier destination ouvert en écriture binaire.
+        codec (str): 'gzip' ou None (pas de compression).
+
+    Returns:
+        Objet fichier à utiliser pour l'écriture ; à fermer pour finaliser le flux compressé.
+    """
+    if codec == GZIP:
+        # mtime=0 : un même contenu donne toujours les mêmes octets compressés
+        return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=Config.COMPRESSION_LEVEL, mtime=0)
+    return fileobj
+
+
+def compress_file(source, target, codec):
+    """
+    Compresse un fichier existant par blocs.
+
+    Args:
+        source (str): Fichier à compresser.
+        target (str): Fichier compressé à créer.
+        codec (str): Compression à appliquer ('gzip').
+    """
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        writer = compressing_writer(dst, codec)
+        shutil.copyfileobj(src, writer, BLOCK_SIZE)
+        writer.close()
+
+
+class _StoredGzipFile(gzip.GzipFile):
+    """
+    GzipFile qui ferme aussi le fichier stocké qu'il décompresse.
+    """
+    def close(self):
+        fileobj = self.fileobj
+        try:
+            super().close()
+        finally:
+            if fileobj is not None:
+                fileobj.close()
+
+
+def open_stored(name, codec):
+    """
+    Ouvre un fichier stocké en lecture, décompressé de façon transparente.
+
+    Args:
+        name (str): Nom de stockage (files.filename), lu via utils/storage.py.
+        codec (str): Compression du fichier stocké, None s'il ne l'est pas.
+
+    Returns:
+        Fichier binaire en lecture renvoyant le contenu d'origine.
+    """
+    fileobj = get_storage().open_read(name)
+    if codec == GZIP:
+        return _StoredGzipFile(fileobj=fileobj, mode='rb')
+    return fileobj
+
+
+def decompress(data, codec):
+    """
+    Décompresse un contenu stocké déjà chargé en mémoire.
+
+    Args:
+        data (bytes): Octets stockés.
+        codec (str): Compression du fichier stocké, None s'il ne l'est pas.
+
+    Returns:
+        bytes: Contenu d'origine.
+    """
+    if codec == GZIP:
+        return zlib.decompress(data, 31)
+    return data
+
+
+def iter_decompressed(name, codec):
+    """
+    Lit un fichier stocké par blocs en le décompressant au fil de l'eau.
+
+    Args:
+        name (str): Nom de stockage.
+        codec (str): Compression du fichier stocké.
+
+    Yields:
+        bytes: Blocs du contenu d'origine.
+    """
+    decompressor = zlib.decompressobj(31) if codec == GZIP else None
+    with get_storage().open_read(name) as f:
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if not block:
+                break
+            if decompressor is None:
+                yield block
+                continue
+            data = decompressor.decompress(block)
+            if data:
+                yield data
+    if decompressor is not None:
+        tail = decompressor.flush()
+        if tail:
+            yield tail
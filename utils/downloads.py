@@ -0,0 +1,324 @@
+import hashlib
+import io
+import mimetypes
+import os
+import secrets
+from datetime import datetime, timezone
+from urllib.parse import quote
+from flask import request, current_app, send_file, Response, abort
+from utils.compression import decompress, iter_decompressed, open_stored
+from utils.metrics import metrics
+from utils.storage import get_storage
+
+# Taille des blocs lus lors de l'envoi d'une plage d'octets
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def file_etag(file_row):
+    """
+    Calcule l'ETag fort d'un fichier à partir de ses métadonnées en base.
+
+    Args:
+        file_row (sqlite3.Row): Ligne de la table files.
+
+    Returns:
+        str: Valeur de l'ETag (sans guillemets).
+    """
+    if file_row['sha256']:
+        return file_row['sha256']
+    key = f"{file_row['id']}-{file_row['filesize']}-{file_row['upload_date']}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def file_last_modified(file_row):
+    """
+    Retourne la date de dernière modification d'un fichier (date d'upload, en UTC).
+
+    Args:
+        file_row (sqlite3.Row): Ligne de la table files.
+
+    Returns:
+        datetime or None: Date à la seconde près, None si elle est illisible.
+    """
+    upload_date = file_row['upload_date']
+    if isinstance(upload_date, str):
+        try:
+            upload_date = datetime.fromisoformat(upload_date)
+        except ValueError:
+            return None
+    if upload_date.tzinfo is None:
+        upload_date = upload_date.astimezone()
+    return upload_date.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def content_disposition(filename):
+    """
+    Construit l'en-tête Content-Disposition d'un téléchargement.
+
+    Args:
+        filename (str): Nom proposé au navigateur.
+
+    Returns:
+        str: Valeur de l'en-tête (avec filename* si le nom n'est pas ASCII).
+    """
+    try:
+        filename.encode('ascii')
+        return f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        fallback = filename.encode('ascii', 'ignore').decode('ascii') or 'download'
+        return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quote(filename)}'
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def _range_allowed(etag, last_modified):
+    # If-Range : n'honorer la plage que si la représentation n'a pas changé
+    if_range = request.if_range
+    if if_range.etag:
+        return if_range.etag == etag
+    if if_range.date:
+        return last_modified is not None and if_range.date == last_modified
+    return True
+
+
+def resolve_ranges(range_header, length, max_ranges):
+    """
+    Convertit l'en-tête Range en plages absolues triées et fusionnées.
+
+    Args:
+        range_header (werkzeug.datastructures.Range): En-tête Range analysé.
+        length (int): Taille du fichier.
+        max_ranges (int): Nombre maximal de plages acceptées.
+
+    Returns:
+        list or None: Liste de (début, fin exclusive), [] si aucune plage n'est
+                      satisfiable, None si l'en-tête doit être ignoré.
+    """
+    if range_header is None or range_header.units != 'bytes':
+        return None
+    if len(range_header.ranges) > max_ranges:
+        return None
+
+    ranges = []
+    for start, stop in range_header.ranges:
+        if start < 0:  # plage de suffixe : les N derniers octets
+            start, stop = max(length + start, 0), length
+        elif stop is None or stop > length:
+            stop = length
+        if start < stop:
+            ranges.append((start, stop))
+
+    # Fusionner les plages qui se chevauchent ou se touchent
+    ranges.sort()
+    merged = []
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def _read_range(name, start=0, stop=None, data=None):
+    if data is not None:
+        # Contenu déjà en mémoire (utils/hot_cache.py) : ni disque ni backend
+        yield data[start:stop]
+        return
+    # Le backend ne renvoie que la plage demandée (Range HTTP pour S3)
+    with get_storage().open_read(name, start, stop) as f:
+        while True:
+            block = f.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+
+def _open_identity(name, codec, data=None):
+    # Contenu d'origine d'un fichier stocké compressé : seek() en avant décompresse et ignore
+    if data is not None:
+        return io.BytesIO(decompress(data, codec))
+    return open_stored(name, codec)
+
+
+def _read_identity(source, start, stop):
+    source.seek(start)
+    remaining = stop - start
+    while remaining > 0:
+        block = source.read(min(READ_BLOCK_SIZE, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        yield block
+
+
+def _identity_range(name, codec, start, stop, data=None):
+    with _open_identity(name, codec, data) as source:
+        yield from _read_identity(source, start, stop)
+
+
+def _multipart_body(ranges, length, mimetype, boundary, read):
+    # read(début, fin) produit les blocs d'une plage ; les plages sont triées
+    for start, stop in ranges:
+        yield (f"\r\n--{boundary}\r\n"
+               f"Content-Type: {mimetype}\r\n"
+               f"Content-Range: bytes {start}-{stop - 1}/{length}\r\n\r\n").encode('ascii')
+        yield from read(start, stop)
+    yield f"\r\n--{boundary}--\r\n".encode('ascii')
+
+
+def _identity_multipart(name, codec, ranges, length, mimetype, boundary, data=None):
+    # Une seule décompression pour toutes les plages, parcourues dans l'ordre
+    with _open_identity(name, codec, data) as source:
+        yield from _multipart_body(ranges, length, mimetype, boundary,
+                                   lambda start, stop: _read_identity(source, start, stop))
+
+
+def _offload_response(file_row, path):
+    mode = current_app.config['DOWNLOAD_OFFLOAD']
+    response = Response(status=200)
+    if mode == 'x-sendfile':
+        response.headers['X-Sendfile'] = path
+    else:
+        prefix = current_app.config['DOWNLOAD_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f"{prefix}/{quote(file_row['filename'])}"
+    return response
+
+
+def _encoded_response(file_row, path, codec, mimetype, data=None):
+    """
+    Réponse pour un fichier stocké compressé dont le client accepte le codage :
+    octets stockés envoyés tels quels avec Content-Encoding.
+    """
+    name = file_row['filename']
+    if data is not None:
+        stored_size = len(data)
+        response = Response(data, status=200, mimetype=mimetype)
+    elif path is None:
+        stored_size = get_storage().size(name)
+        response = Response(_read_range(name), status=200, mimetype=mimetype, direct_passthrough=True)
+        response.content_length = stored_size
+    elif current_app.config['DOWNLOAD_OFFLOAD']:
+        stored_size = os.path.getsize(path)
+        response = _offload_response(file_row, path)
+        response.headers['Content-Type'] = mimetype
+    else:
+        stored_size = os.path.getsize(path)
+        response = send_file(path, mimetype=mimetype, conditional=False, etag=False,
+                             last_modified=None, max_age=None)
+    response.headers['Content-Encoding'] = codec
+    metrics.inc('download_bytes_total', stored_size, mode='encoded')
+    return response
+
+
+def send_stored_file(file_row, data=None):
+    """
+    Envoie un fichier stocké en gérant ETag, Last-Modified, requêtes
+    conditionnelles (304) et plages d'octets (206, simples ou multiples).
+
+    Si Config.DOWNLOAD_OFFLOAD vaut 'x-sendfile' ou 'x-accel-redirect', le corps
+    est délégué au proxy inverse (envoi sans copie) ; l'application ne renvoie
+    que les en-têtes.
+
+    Les fichiers stockés compressés (files.codec) sont envoyés compressés avec
+    Content-Encoding au client qui l'accepte, et décompressés à la volée sinon.
+    Une requête Range porte sur le contenu d'origine : la plage est servie
+    décompressée (le flux est décompressé jusqu'au début de la plage), ce qui
+    permet de reprendre un téléchargement interrompu.
+
+    Les fichiers absents du disque local (backend S3, niveau froid de
+    TieredStorage) sont lus en flux depuis le backend de stockage ; le proxy
+    inverse et sendfile ne servent que les fichiers locaux.
+
+    Args:
+        file_row (sqlite3.Row or dict): Ligne de la table files.
+        data (bytes): Contenu stocké déjà en mémoire (utils/hot_cache.py), servi
+                      sans accès au stockage (optionnel).
+
+    Returns:
+        flask.Response: Réponse HTTP du téléchargement.
+    """
+    name = file_row['filename']
+    path = None
+    if data is None:
+        storage = get_storage()
+        path = storage.local_path(name)
+        if path is None and not storage.exists(name):
+            abort(404)
+    codec = file_row['codec']
+    # Les plages d'octets portent sur le contenu d'origine, jamais sur la forme compressée
+    encoded = codec is not None and request.range is None and request.accept_encodings[codec] > 0
+    etag = file_etag(file_row)
+    if encoded:
+        # Représentation différente du contenu d'origine : ETag distinct
+        etag = f"{etag}-{codec}"
+    last_modified = file_last_modified(file_row)
+    mimetype = mimetypes.guess_type(file_row['original_filename'])[0] or 'application/octet-stream'
+    length = file_row['filesize']
+
+    if _not_modified(etag, last_modified):
+        response = Response(status=304)
+    elif encoded:
+        response = _encoded_response(file_row, path, codec, mimetype, data)
+    elif current_app.config['DOWNLOAD_OFFLOAD'] and path is not None and not codec:
+        response = _offload_response(file_row, path)
+        response.headers['Content-Type'] = mimetype
+        metrics.inc('download_bytes_total', length, mode='offload')
+    else:
+        ranges = None
+        if request.range is not None and _range_allowed(etag, last_modified):
+            ranges = resolve_ranges(request.range, length, current_app.config['DOWNLOAD_MAX_RANGES'])
+
+        if ranges == []:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f"bytes */{length}"
+        elif ranges and len(ranges) == 1:
+            start, stop = ranges[0]
+            if codec:
+                body = _identity_range(name, codec, start, stop, data)
+            else:
+                body = _read_range(name, start, stop, data)
+            response = Response(body, status=206, mimetype=mimetype, direct_passthrough=True)
+            response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{length}"
+            response.content_length = stop - start
+            metrics.inc('download_bytes_total', stop - start, mode='range')
+        elif ranges:
+            boundary = secrets.token_hex(16)
+            if codec:
+                body = _identity_multipart(name, codec, ranges, length, mimetype, boundary, data)
+            else:
+                body = _multipart_body(ranges, length, mimetype, boundary,
+                                       lambda start, stop: _read_range(name, start, stop, data))
+            response = Response(body, status=206, direct_passthrough=True)
+            response.headers['Content-Type'] = f"multipart/byteranges; boundary={boundary}"
+            metrics.inc('download_bytes_total', sum(stop - start for start, stop in ranges), mode='range')
+        elif codec:
+            body = [decompress(data, codec)] if data is not None else iter_decompressed(name, codec)
+            response = Response(body, status=200, mimetype=mimetype, direct_passthrough=True)
+            response.content_length = length
+            metrics.inc('download_bytes_total', length, mode='decompressed')
+        elif path is not None:
+            # Fichier complet : send_file utilise wsgi.file_wrapper (sendfile) si le serveur le propose
+            response = send_file(path, mimetype=mimetype, conditional=False, etag=False,
+                                 last_modified=None, max_age=None)
+            metrics.inc('download_bytes_total', length, mode='full')
+        else:
+            response = Response(_read_range(name, data=data), status=200, mimetype=mimetype,
+                                direct_passthrough=True)
+            response.content_length = length
+            metrics.inc('download_bytes_total', length, mode='full')
+
+    response.headers['Content-Disposition'] = content_disposition(file_row['original_filename'])
+    if codec:
+        response.vary.add('Accept-Encoding')
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
@@ -1,8 +1,8 @@
-import os
-from datetime import datetime
-from werkzeug.utils import secure_filename
 from config import Config
 from database.models import File
+from utils.blobs import delete_file_entry
+from utils.unlinker import unlinker
+from utils.uploads import save_uploaded_files
 
 def allowed_file(filename):
     """
@@ -20,6 +20,8 @@ def allowed_file(filename):
 def save_file(file, user_id):
     """
     Enregistre un fichier téléchargé et crée une entrée dans la base de données.
+    Passe par le même chemin que les uploads de formulaire (save_uploaded_files) :
+    compression, stockage par empreinte et quota dans une transaction d'écriture.
     
     Args:
         file: L'objet fichier provenant de request.files
@@ -31,40 +33,11 @@ def save_file(file, user_id):
     if not file or file.filename == '':
         return None
     
-    if not allowed_file(file.filename):
+    result = save_uploaded_files([file], user_id, allowed_file)[0]
+    if not result['ok']:
         return None
     
-    # Sécuriser le nom du fichier
-    original_filename = file.filename
-    filename = secure_filename(original_filename)
-    
-    # Ajouter un timestamp pour éviter les collisions de noms
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    unique_filename = f"{timestamp}_{filename}"
-    
-    # S'assurer que le dossier d'upload existe
-    os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
-    
-    # Chemin complet du fichier
-    file_path = os.path.join(Config.UPLOAD_FOLDER, unique_filename)
-    
-    # Enregistrer le fichier physiquement
-    file.save(file_path)
-    
-    # Obtenir la taille du fichier
-    filesize = os.path.getsize(file_path)
-    
-    # Créer et enregistrer l'entrée dans la base de données
-    file_entry = File(
-        filename=unique_filename,
-        original_filename=original_filename,
-        uploaded_by=user_id,
-        upload_date=datetime.now(),
-        filesize=filesize
-    )
-    file_entry.save()
-    
-    return file_entry
+    return File.get_by_id(result['file_id'])
 
 def delete_file(file_id):
     """
@@ -76,26 +49,22 @@ def delete_file(file_id):
     Returns:
         bool: True si la suppression a réussi, False sinon
     """
-    file_entry = File.get_by_id(file_id)
-    
-    if not file_entry:
-        return False
-    
-    # Chemin complet du fichier
-    file_path = os.path.join(Config.UPLOAD_FOLDER, file_entry.filename)
-    
-    # Supprimer le fichier physique s'il existe
-    if os.path.exists(file_path):
-        try:
-            os.remove(file_path)
-        except Exception as e:
-            print(f"Erreur lors de la suppression du fichier: {e}")
+    conn = File.get_db_connection()
+    try:
+        file_row = conn.execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone()
+        if not file_row:
             return False
-    
-    # Supprimer l'entrée de la base de données
-    success = file_entry.delete()
-    
-    return success
+        
+        # Supprimer l'entrée ; le fichier physique n'est supprimé qu'à la dernière référence,
+        # en arrière-plan après le commit
+        released = delete_file_entry(conn, file_row)
+        conn.commit()
+    finally:
+        conn.close()
+    if released:
+        unlinker.enqueue([released])
+    
+    return True
 
 def get_file_size_display(size_in_bytes):
     """
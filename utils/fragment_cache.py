@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from markupsafe import Markup
+from config import Config
+from database.versions import get_version
+
+# Compteur de version des données affichées (table data_versions), incrémenté
+# par des triggers à chaque écriture sur files ou users (database/db_setup.py)
+DATA_VERSION = 'data'
+
+
+class FragmentCache:
+    """
+    Cache LRU des fragments HTML rendus (tableaux des tableaux de bord).
+
+    Les fragments sont valables pour une version donnée des données : dès que
+    la version partagée change, le cache est vidé. La taille totale des
+    fragments conservés est limitée à max_bytes.
+    """
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes if max_bytes is not None else Config.FRAGMENT_CACHE_MAX_BYTES
+        self._entries = OrderedDict()  # {clé: (html, taille)}
+        self._lock = threading.Lock()
+        self._version = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _sync(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self.size = 0
+            self._version = version
+
+    def _store(self, key, html, size):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self._entries[key] = (html, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def get_or_render(self, key, render):
+        """
+        Retourne un fragment depuis le cache, ou le rend via render() en cas d'absence.
+
+        Args:
+            key (tuple): Clé du fragment (template et paramètres qui le font varier).
+            render: Fonction sans argument qui interroge la base et rend le fragment.
+
+        Returns:
+            Markup: Fragment HTML, à insérer tel quel dans le template de la page.
+        """
+        version = get_version(DATA_VERSION)
+        with self._lock:
+            self._sync(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        html = Markup(render())
+        size = len(html.encode('utf-8'))
+        if size <= self.max_bytes:
+            with self._lock:
+                # Ne pas conserver un fragment rendu pendant qu'une écriture changeait la version
+                if version == self._version:
+                    self._store(key, html, size)
+        return html
+
+    def clear(self):
+        """
+        Vide le cache local.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Retourne les compteurs du cache.
+
+        Returns:
+            dict: Taille, occupation mémoire, succès, échecs, évictions et taux de succès.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'version': self._version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,260 @@
+"""
+Cache en mémoire des petits fichiers les plus téléchargés.
+
+Quelques petits fichiers (documents hebdomadaires, modèles partagés) font
+l'essentiel des téléchargements. Leurs octets stockés et leur ligne files
+sont gardés en mémoire dans la limite de HOT_CACHE_MAX_BYTES : un
+téléchargement servi depuis le cache ne lit ni SQLite ni le stockage.
+
+L'admission suit le principe de TinyLFU : la fréquence d'accès de chaque
+fichier est estimée par un count-min sketch (compteurs de 4 bits divisés par
+deux périodiquement pour oublier les anciens accès). Un fichier n'entre dans
+le cache que s'il a été demandé au moins HOT_CACHE_MIN_FREQUENCY fois et
+qu'il est plus fréquent que les fichiers les moins récemment servis qu'il
+faudrait évincer pour lui faire de la place : un pic de fichiers lus une
+seule fois ne chasse pas les fichiers réellement populaires.
+
+Les suppressions et modifications de fichiers incrémentent le compteur de
+version 'files' (trigger de database/migrations.py) ; chaque worker le
+relit au plus toutes les HOT_CACHE_VERSION_CHECK secondes et vide son cache
+s'il a changé. Les routes de suppression invalident en plus immédiatement
+le cache du worker qui les exécute.
+
+Un fichier servi depuis le cache est signalé au stockage (touch) au plus une
+fois par TIER_TOUCH_INTERVAL : en mode 'tiered', les fichiers les plus
+téléchargés ne passent pas pour inutilisés et restent sur le disque local.
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from database.versions import get_version
+from utils.storage import get_storage
+
+# Compteur de version partagé (table data_versions)
+FILES_VERSION = 'files'
+
+# Colonnes de files conservées avec le contenu (utilisées par utils/downloads.py)
+ROW_KEYS = ('id', 'filename', 'original_filename', 'filesize', 'upload_date', 'sha256', 'codec')
+
+
+class FrequencySketch:
+    """
+    Count-min sketch à compteurs de 4 bits : estimation approchée (par excès)
+    du nombre d'accès à une clé, en mémoire constante. Après sample_size
+    incréments, tous les compteurs sont divisés par deux.
+    """
+    DEPTH = 4
+    MAX_COUNT = 15
+
+    def __init__(self, width):
+        self.width = 1 << max(4, (width - 1).bit_length())  # puissance de 2
+        self._mask = self.width - 1
+        self._rows = [bytearray(self.width) for _ in range(self.DEPTH)]
+        self._seeds = [random.getrandbits(64) for _ in range(self.DEPTH)]
+        self.sample_size = 10 * self.width
+        self._additions = 0
+
+    def _indexes(self, key):
+        return [hash((seed, key)) & self._mask for seed in self._seeds]
+
+    def increment(self, key):
+        for row, index in zip(self._rows, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key):
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def _age(self):
+        for row in self._rows:
+            row[:] = bytes(count >> 1 for count in row)
+        self._additions //= 2
+
+
+class HotFileCache:
+    """
+    Cache LRU des petits fichiers (octets stockés et ligne files) avec admission
+    par fréquence, partagé par les threads d'un worker.
+    """
+    def __init__(self, max_bytes=None, max_file_size=None, min_frequency=None, check_interval=None):
+        self.max_bytes = max_bytes if max_bytes is not None else Config.HOT_CACHE_MAX_BYTES
+        self.max_file_size = max_file_size if max_file_size is not None else Config.HOT_CACHE_MAX_FILE_SIZE
+        self.min_frequency = min_frequency if min_frequency is not None else Config.HOT_CACHE_MIN_FREQUENCY
+        self.check_interval = check_interval if check_interval is not None else Config.HOT_CACHE_VERSION_CHECK
+        self._sketch = FrequencySketch(Config.HOT_CACHE_SKETCH_WIDTH)
+        self._entries = OrderedDict()  # {file_id: (ligne, octets stockés, dernier touch)}
+        self._lock = threading.Lock()
+        self._version = None
+        self._next_check = 0.0
+        # Incrémenté à chaque invalidation : un contenu lu avant ne doit pas être conservé
+        self._generation = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.admissions = 0
+        self.rejections = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _sync(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        version = get_version(FILES_VERSION)
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += len(self._entries)
+                self._entries.clear()
+                self.size = 0
+                self._generation += 1
+                self._version = version
+            self._next_check = now + self.check_interval
+
+    def _victims(self, file_id, size):
+        """
+        Entrées à évincer pour faire de la place à file_id, les moins récemment
+        servies d'abord ; None si l'une d'elles est au moins aussi fréquente.
+        """
+        frequency = self._sketch.estimate(file_id)
+        if frequency < self.min_frequency:
+            return None
+        needed = self.size + size - self.max_bytes
+        victims = []
+        for key, (_, data, _) in self._entries.items():
+            if needed <= 0:
+                break
+            if self._sketch.estimate(key) >= frequency:
+                return None
+            victims.append(key)
+            needed -= len(data)
+        return victims
+
+    def _store(self, file_row, data, generation):
+        file_id = file_row['id']
+        if generation != self._generation or file_id in self._entries:
+            return
+        victims = self._victims(file_id, len(data))
+        if victims is None:
+            self.rejections += 1
+            return
+        for key in victims:
+            _, evicted, _ = self._entries.pop(key)
+            self.size -= len(evicted)
+            self.evictions += 1
+        # Le chargement vient de lire le fichier dans le stockage (accès déjà noté)
+        self._entries[file_id] = ({key: file_row[key] for key in ROW_KEYS}, data, time.monotonic())
+        self.size += len(data)
+        self.admissions += 1
+
+    def _load(self, file_row):
+        # Lecture bornée : un fichier plus gros qu'annoncé n'est pas mis en cache
+        try:
+            with get_storage().open_read(file_row['filename']) as f:
+                data = f.read(self.max_file_size + 1)
+        except FileNotFoundError:
+            return None
+        return data if len(data) <= self.max_file_size else None
+
+    def get(self, file_id, loader):
+        """
+        Retourne un fichier depuis le cache, ou sa ligne via loader(file_id) en cas d'absence.
+        Un fichier assez fréquent est alors lu et admis dans le cache.
+
+        Args:
+            file_id (int): ID du fichier.
+            loader: Fonction de chargement de la ligne files depuis la base.
+
+        Returns:
+            tuple: (ligne du fichier ou None s'il n'existe pas,
+                    octets stockés ou None s'ils doivent être lus dans le stockage).
+        """
+        if not self.max_bytes:
+            return loader(file_id), None
+
+        self._sync()
+        with self._lock:
+            self._sketch.increment(file_id)
+            entry = self._entries.get(file_id)
+            if entry is not None:
+                self._entries.move_to_end(file_id)
+                self.hits += 1
+                row, data, touched = entry
+                now = time.monotonic()
+                touch = now - touched >= Config.TIER_TOUCH_INTERVAL
+                if touch:
+                    self._entries[file_id] = (row, data, now)
+            else:
+                self.misses += 1
+                generation = self._generation
+        if entry is not None:
+            if touch:
+                get_storage().touch(row['filename'])
+            return row, data
+
+        file_row = loader(file_id)
+        if file_row is None or file_row['filesize'] > self.max_file_size:
+            return file_row, None
+        with self._lock:
+            # Ne lire le contenu que s'il a une chance d'être admis
+            if self._victims(file_id, file_row['filesize']) is None:
+                self.rejections += 1
+                return file_row, None
+
+        data = self._load(file_row)
+        if data is not None:
+            with self._lock:
+                self._store(file_row, data, generation)
+        return file_row, data
+
+    def invalidate(self, file_ids=None):
+        """
+        Retire des fichiers du cache local (après une suppression).
+
+        Args:
+            file_ids (iterable): IDs des fichiers supprimés (None : tout le cache,
+                                 par exemple après la suppression d'utilisateurs).
+        """
+        with self._lock:
+            self._generation += 1
+            if file_ids is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self.size = 0
+                return
+            for file_id in file_ids:
+                entry = self._entries.pop(file_id, None)
+                if entry is not None:
+                    self.size -= len(entry[1])
+                    self.invalidations += 1
+
+    def stats(self):
+        """
+        Retourne les compteurs du cache.
+
+        Returns:
+            dict: Taille, occupation mémoire, succès, échecs, admissions, refus,
+                  évictions, invalidations et taux de succès.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'admissions': self.admissions,
+                'rejections': self.rejections,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+hot_file_cache = HotFileCache()
@@ -0,0 +1,101 @@
+"""
+Identifiants uniques triables (format ULID) générés sans coordination entre
+threads ni entre workers.
+
+Un ULID fait 128 bits : 48 bits d'horodatage en millisecondes suivis de 80 bits
+aléatoires, encodés en 26 caractères base32 (Crockford). L'ordre alphabétique
+suit l'ordre de création. Dans un même processus, les identifiants d'une même
+milliseconde sont obtenus en incrémentant la partie aléatoire : ils restent
+strictement croissants. Entre workers, l'unicité repose sur les 80 bits tirés
+par chacun (os.urandom), retirés après un fork pour que deux processus ne
+partagent jamais la même suite.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+_ENCODING = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_RANDOM_BITS = 80
+_RANDOM_LIMIT = 1 << _RANDOM_BITS
+
+
+def _encode(value):
+    chars = []
+    for _ in range(26):
+        chars.append(_ENCODING[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def _random_part():
+    return int.from_bytes(os.urandom(_RANDOM_BITS // 8), 'big')
+
+
+class UlidGenerator:
+    """
+    Générateur monotone d'ULID, partagé par les threads d'un processus.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._random = 0
+
+    def reset(self):
+        """Oublie la suite en cours (appelé dans le processus enfant après un fork)."""
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._random = 0
+
+    def new(self):
+        """
+        Produit un nouvel identifiant, supérieur à tous ceux déjà produits par ce processus.
+
+        Returns:
+            str: ULID de 26 caractères.
+        """
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._random = _random_part()
+            else:
+                # Même milliseconde (ou horloge système reculée) : incrément
+                self._random += 1
+                if self._random >= _RANDOM_LIMIT:
+                    self._last_ms += 1
+                    self._random = _random_part()
+            value = (self._last_ms << _RANDOM_BITS) | self._random
+        return _encode(value)
+
+
+ulid_generator = UlidGenerator()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ulid_generator.reset)
+
+
+def new_ulid():
+    """
+    Produit un identifiant unique triable (voir UlidGenerator).
+
+    Returns:
+        str: ULID de 26 caractères.
+    """
+    return ulid_generator.new()
+
+
+def ulid_at(moment):
+    """
+    Produit un identifiant daté d'un instant passé, pour les lignes antérieures
+    aux ULID (partie aléatoire seule, sans garantie d'ordre dans la milliseconde).
+
+    Args:
+        moment (datetime or str): Date de création de l'objet identifié.
+
+    Returns:
+        str: ULID de 26 caractères.
+    """
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment)
+    timestamp_ms = max(0, int(moment.timestamp() * 1000))
+    return _encode((timestamp_ms << _RANDOM_BITS) | _random_part())
@@ -0,0 +1,295 @@
+"""
+Métriques de l'application : latence des requêtes par endpoint, durée des
+requêtes SQL par requête normalisée, octets envoyés et reçus.
+
+Les métriques sont exposées au format texte de Prometheus (/admin/metrics).
+Un profileur par échantillonnage peut être déclenché par requête pour
+enregistrer les piles des requêtes lentes.
+"""
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from flask import g, request, session, has_request_context, before_render_template, template_rendered
+from config import Config
+
+# Bornes des histogrammes de latence, en secondes
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    """
+    Normalise une requête SQL pour regrouper ses exécutions :
+    espaces compactés, littéraux remplacés par ?, listes IN (?, ?, ...) réduites.
+
+    Args:
+        sql (str): Requête SQL.
+
+    Returns:
+        str: Requête normalisée.
+    """
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(?, ...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class Histogram:
+    """
+    Histogramme cumulatif au sens de Prometheus (compteurs par borne supérieure).
+    """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+class Registry:
+    """
+    Compteurs et histogrammes étiquetés, partagés par les threads d'un worker.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # {(nom, étiquettes): valeur}
+        self._histograms = {}  # {(nom, étiquettes): Histogram}
+        self._help = {}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self, gauges=None):
+        """
+        Produit le texte d'exposition Prometheus.
+
+        Args:
+            gauges (dict): Valeurs instantanées supplémentaires {nom: valeur}.
+
+        Returns:
+            str: Métriques au format texte.
+        """
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.buckets), list(h.counts), h.count, h.sum) for key, h in histograms]
+
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, 'counter')
+            lines.append(f"{name}{_labels(labels)} {value}")
+
+        for (name, labels), buckets, counts, count, total in histograms:
+            declare(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(labels, ('le', bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {total}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for name, value in sorted((gauges or {}).items()):
+            declare(name, 'gauge')
+            lines.append(f"{name} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Registry()
+metrics.describe('http_request_duration_seconds', "Durée des requêtes HTTP par endpoint")
+metrics.describe('http_requests_total', "Requêtes HTTP par endpoint et code de statut")
+metrics.describe('sqlite_statement_duration_seconds', "Durée d'exécution des requêtes SQL normalisées")
+metrics.describe('http_request_sql_seconds', "Temps passé dans SQLite par requête HTTP, par endpoint")
+metrics.describe('template_render_duration_seconds', "Durée de rendu des templates Jinja")
+metrics.describe('upload_bytes_total', "Octets reçus et écrits sur disque par les uploads")
+metrics.describe('download_bytes_total', "Octets de fichiers envoyés (ou délégués au proxy)")
+
+
+def observe_sql(sql, elapsed):
+    """
+    Enregistre la durée d'exécution d'une requête SQL.
+
+    Args:
+        sql (str): Requête exécutée.
+        elapsed (float): Durée en secondes.
+    """
+    if Config.METRICS_ENABLED:
+        metrics.observe('sqlite_statement_duration_seconds', elapsed, SQL_BUCKETS, sql=normalize_sql(sql))
+        if has_request_context() and '_request_sql' in g:
+            g._request_sql['seconds'] += elapsed
+
+
+class SamplingProfiler:
+    """
+    Profileur par échantillonnage d'un thread : relève sa pile toutes les
+    Config.PROFILE_INTERVAL secondes et compte les piles identiques
+    (format « folded » lisible par flamegraph.pl ou speedscope).
+    """
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _should_profile():
+    # Déclenché par un administrateur (en-tête X-Profile ou ?_profile=1) ou par tirage aléatoire
+    if request.headers.get('X-Profile') or request.args.get('_profile'):
+        return bool(session.get('is_admin'))
+    return Config.PROFILE_SAMPLE_RATE > 0 and random.random() < Config.PROFILE_SAMPLE_RATE
+
+
+def _start_request():
+    g._metrics_start = time.perf_counter()
+    # Partagé avec la fonction de fin de réponse : le SQL exécuté pendant l'envoi
+    # d'un corps en flux (stream_with_context) est aussi compté
+    g._request_sql = {'seconds': 0.0}
+    g._profiler = None
+    if _should_profile():
+        g._profiler = SamplingProfiler(threading.get_ident(), Config.PROFILE_INTERVAL)
+        g._profiler.start()
+
+
+def _end_request(response):
+    start = g.pop('_metrics_start', None)
+    if start is None:
+        return response
+    endpoint = request.endpoint or 'unknown'
+    metrics.inc('http_requests_total', endpoint=endpoint, status=response.status_code)
+    request_sql = g.pop('_request_sql')
+    profiler = g.pop('_profiler', None)
+    forced = profiler is not None and bool(request.headers.get('X-Profile') or request.args.get('_profile'))
+    if forced:
+        # Nom annoncé dès maintenant : le fichier n'est écrit qu'après l'envoi du corps
+        forced_filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{secrets.token_hex(4)}.folded"
+        response.headers['X-Profile-Dump'] = forced_filename
+
+    def finished():
+        # Appelée à la fermeture de la réponse : la durée inclut l'envoi des corps
+        # en flux (archives ZIP, API NDJSON, plages d'octets)
+        elapsed = time.perf_counter() - start
+        metrics.observe('http_request_duration_seconds', elapsed, REQUEST_BUCKETS, endpoint=endpoint)
+        metrics.observe('http_request_sql_seconds', request_sql['seconds'], REQUEST_BUCKETS, endpoint=endpoint)
+        if profiler is not None:
+            profiler.stop()
+            if forced or elapsed >= Config.SLOW_REQUEST_THRESHOLD:
+                os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+                filename = forced_filename if forced else \
+                    f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(elapsed * 1000)}ms.folded"
+                profiler.dump(os.path.join(Config.PROFILE_DIR, filename))
+
+    response.call_on_close(finished)
+    return response
+
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault('_template_starts', []).append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    starts = g.get('_template_starts')
+    if starts:
+        metrics.observe('template_render_duration_seconds', time.perf_counter() - starts.pop(),
+                        REQUEST_BUCKETS, template=template.name)
+
+
+def _teardown_request(exception=None):
+    # Requête interrompue par une exception : arrêter le profileur sans écrire de fichier
+    profiler = g.pop('_profiler', None)
+    if profiler is not None:
+        profiler.stop()
+
+
+def init_app(app):
+    """
+    Installe la mesure des requêtes sur l'application Flask.
+    À appeler avant l'enregistrement des autres before_request pour que leur
+    durée soit incluse.
+
+    Args:
+        app (Flask): Application Flask.
+    """
+    if not Config.METRICS_ENABLED:
+        return
+    app.before_request(_start_request)
+    app.after_request(_end_request)
+    app.teardown_request(_teardown_request)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
@@ -0,0 +1,142 @@
+"""
+Migration des fichiers stockés à plat dans UPLOAD_FOLDER vers l'arborescence
+répartie (utils/blobs.py:storage_name), pendant que l'application tourne.
+
+Pour chaque lot de lignes files (pagination sur l'ID) :
+1. le fichier est lié (hard link) à son nouvel emplacement, l'ancien reste en place ;
+2. files.filename est réécrit en une transaction, seulement si la ligne n'a pas
+   changé entre-temps ;
+3. après un délai de grâce (téléchargements en cours sur l'ancien chemin), les
+   anciens noms sont confiés au worker de suppression, qui ne supprime que ceux
+   qu'aucune ligne ne référence plus.
+
+La progression (dernier ID traité) est enregistrée après chaque lot : une
+migration interrompue reprend là où elle s'était arrêtée.
+
+Usage : python -m utils.migrate_storage [--rate N] [--restart]
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from config import Config
+from database.connection import get_db_connection
+from utils.blobs import blob_path, storage_name
+from utils.reconcile import Throttle
+from utils.unlinker import unlinker
+
+# Nombre de lignes traitées par transaction
+BATCH_SIZE = 500
+
+
+def _read_checkpoint():
+    try:
+        with open(Config.STORAGE_MIGRATION_STATE) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _write_checkpoint(last_id):
+    temp_path = Config.STORAGE_MIGRATION_STATE + '.tmp'
+    with open(temp_path, 'w') as f:
+        f.write(str(last_id))
+    os.replace(temp_path, Config.STORAGE_MIGRATION_STATE)
+
+
+def _link(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        pass
+    except OSError:
+        # Système de fichiers sans liens physiques : copie puis renommage atomique
+        temp_path = target + '.migrating'
+        shutil.copy2(source, temp_path)
+        os.replace(temp_path, target)
+
+
+def migrate(rate=None, grace=None, restart=False, verbose=True):
+    """
+    Migre les fichiers vers l'arborescence répartie.
+
+    Args:
+        rate (int): Nombre maximal de fichiers déplacés par seconde (None : Config).
+        grace (float): Délai en secondes avant la suppression des anciens chemins (None : Config).
+        restart (bool): Ignorer la progression enregistrée et tout reparcourir.
+        verbose (bool): Afficher la progression après chaque lot.
+
+    Returns:
+        dict: Lignes parcourues, fichiers déplacés, fichiers manquants et lignes modifiées entre-temps.
+    """
+    rate = Config.STORAGE_MIGRATION_MAX_FILES_PER_SEC if rate is None else rate
+    grace = Config.STORAGE_MIGRATION_GRACE_PERIOD if grace is None else grace
+    throttle = Throttle(rate)
+    counts = {'rows': 0, 'moved': 0, 'missing': 0, 'conflicts': 0}
+    pending = []  # [(instant de suppression, anciens noms)]
+    last_id = 0 if restart else _read_checkpoint()
+
+    conn = get_db_connection()
+    try:
+        while True:
+            rows = conn.execute(
+                "SELECT id, filename FROM files WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            counts['rows'] += len(rows)
+
+            moves = []
+            for row in rows:
+                target = storage_name(row['filename'].rsplit('/', 1)[-1])
+                if row['filename'] == target:
+                    continue
+                source = blob_path(row['filename'])
+                if not os.path.exists(source):
+                    counts['missing'] += 1
+                    continue
+                throttle.tick()
+                _link(source, blob_path(target))
+                moves.append((target, row['id'], row['filename']))
+
+            if moves:
+                conn.execute("BEGIN IMMEDIATE")
+                updated = 0
+                for target, file_id, old_filename in moves:
+                    cursor = conn.execute(
+                        "UPDATE files SET filename = ? WHERE id = ? AND filename = ?",
+                        (target, file_id, old_filename)
+                    )
+                    updated += cursor.rowcount
+                conn.commit()
+                counts['moved'] += updated
+                counts['conflicts'] += len(moves) - updated
+                pending.append((time.monotonic() + grace, [old for _, _, old in moves]))
+
+            _write_checkpoint(last_id)
+            while pending and pending[0][0] <= time.monotonic():
+                unlinker.enqueue(pending.pop(0)[1])
+            if verbose:
+                print(f"Migration : jusqu'à l'ID {last_id}, {json.dumps(counts)}")
+    finally:
+        conn.close()
+
+    for delete_at, names in pending:
+        time.sleep(max(0.0, delete_at - time.monotonic()))
+        unlinker.enqueue(names)
+    unlinker.flush(timeout=60)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migre UPLOAD_FOLDER vers l'arborescence répartie.")
+    parser.add_argument('--rate', type=int, default=None, help="fichiers déplacés par seconde au maximum (0 : illimité)")
+    parser.add_argument('--grace', type=float, default=None, help="délai avant suppression des anciens chemins (secondes)")
+    parser.add_argument('--restart', action='store_true', help="ignorer la progression enregistrée")
+    parser.add_argument('--quiet', action='store_true', help="n'afficher que le résumé")
+    args = parser.parse_args()
+    print(json.dumps(migrate(args.rate, args.grace, args.restart, verbose=not args.quiet), indent=2))
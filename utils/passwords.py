@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+
+# Bornes des histogrammes de latence, en millisecondes
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class HashingOverloaded(Exception):
+    """
+    Levée quand trop d'opérations de hachage sont déjà en attente :
+    la requête doit être refusée (503) plutôt que de bloquer un worker.
+    """
+
+
+class _HashingPool:
+    """
+    Pool de processus dédié au hachage et à la vérification des mots de passe,
+    avec une limite sur le nombre d'opérations en attente.
+    """
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = None
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+        self.rejected = 0
+
+    def _get_executor(self):
+        # Création paresseuse, au premier hachage du processus (voir _after_fork)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=Config.HASH_POOL_WORKERS)
+            return self._executor
+
+    def _after_fork(self):
+        # Processus enfant (gunicorn --preload) : le pool hérité du parent, créé par
+        # exemple pour le compte administrateur par défaut, n'a plus ni threads de
+        # gestion ni processus utilisables ; l'enfant crée le sien au premier besoin
+        self._executor = None
+        self._pending = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def _reset_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _admit(self):
+        with self._lock:
+            if self._pending is None:
+                self._pending = threading.BoundedSemaphore(Config.HASH_POOL_MAX_PENDING)
+        if not self._pending.acquire(blocking=False):
+            with self._stats_lock:
+                self.rejected += 1
+            raise HashingOverloaded('Trop de demandes de hachage en attente')
+
+    def _record(self, operation, elapsed):
+        elapsed_ms = elapsed * 1000
+        with self._stats_lock:
+            stats = self._stats.setdefault(operation, {
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            })
+            stats['count'] += 1
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if elapsed_ms <= bound:
+                    stats['buckets'][i] += 1
+                    break
+            else:
+                stats['buckets'][-1] += 1
+
+    def run(self, operation, func, *args):
+        """
+        Exécute func(*args) dans le pool et attend le résultat.
+
+        Args:
+            operation (str): Nom de l'opération pour les métriques ('hash', 'verify').
+            func: Fonction à exécuter (doit être importable par les processus du pool).
+
+        Returns:
+            Le résultat de func.
+        """
+        self._admit()
+        start = time.perf_counter()
+        try:
+            if Config.HASH_POOL_WORKERS <= 0:
+                return func(*args)
+            executor = self._get_executor()
+            try:
+                return executor.submit(func, *args).result()
+            except BrokenProcessPool:
+                # Un processus du pool est mort : recréer le pool et réessayer une fois
+                self._reset_executor(executor)
+                return self._get_executor().submit(func, *args).result()
+        finally:
+            self._pending.release()
+            self._record(operation, time.perf_counter() - start)
+
+    def stats(self):
+        """
+        Retourne les métriques de latence par opération.
+
+        Returns:
+            dict: Nombre d'appels, latence moyenne/maximale et histogramme par opération.
+        """
+        with self._stats_lock:
+            result = {'rejected': self.rejected, 'buckets_ms': list(LATENCY_BUCKETS_MS), 'operations': {}}
+            for operation, stats in self._stats.items():
+                result['operations'][operation] = {
+                    'count': stats['count'],
+                    'avg_ms': stats['total_ms'] / stats['count'] if stats['count'] else 0.0,
+                    'max_ms': stats['max_ms'],
+                    'buckets': list(stats['buckets']),
+                }
+            return result
+
+
+_pool = _HashingPool()
+os.register_at_fork(after_in_child=_pool._after_fork)
+
+
+def hash_password(password):
+    """
+    Hache un mot de passe dans le pool de processus, avec la méthode configurée.
+
+    Args:
+        password (str): Mot de passe en clair.
+
+    Returns:
+        str: Hash au format werkzeug (méthode$sel$hash).
+    """
+    return _pool.run('hash', generate_password_hash, password,
+                     Config.PASSWORD_HASH_METHOD, Config.PASSWORD_SALT_LENGTH)
+
+
+def verify_password(pwhash, password):
+    """
+    Vérifie un mot de passe dans le pool de processus.
+
+    Args:
+        pwhash (str): Hash stocké.
+        password (str): Mot de passe en clair.
+
+    Returns:
+        bool: True si le mot de passe correspond.
+    """
+    return _pool.run('verify', check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """
+    Indique si un hash a été produit avec une autre méthode que celle configurée
+    (par exemple après une hausse du nombre d'itérations dans Config).
+
+    Args:
+        pwhash (str): Hash stocké.
+
+    Returns:
+        bool: True si le hash doit être recalculé à la prochaine connexion.
+    """
+    return pwhash.split('$', 1)[0] != Config.PASSWORD_HASH_METHOD
+
+
+def get_hashing_stats():
+    """
+    Retourne les métriques du pool de hachage.
+
+    Returns:
+        dict: Statistiques par opération et nombre de demandes refusées.
+    """
+    return _pool.stats()
@@ -0,0 +1,282 @@
+"""
+Miniatures des images partagées (png, jpg, gif), générées en arrière-plan.
+
+Les uploads confient les IDs des nouveaux fichiers à un pool de threads qui
+produit les miniatures hors du chemin de la requête. Elles sont rangées dans
+Config.PREVIEW_FOLDER sous l'empreinte du contenu (un même contenu partagé
+plusieurs fois n'a qu'une miniature) ; la taille totale du dossier est bornée,
+les miniatures les moins récemment servies étant supprimées en premier (la date
+de modification sert de date de dernier accès).
+
+Pillow est optionnel : sans lui, aucune miniature n'est proposée et les
+tableaux de bord n'affichent que les noms.
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import abort, send_file
+from config import Config
+from database.connection import get_db_connection
+from utils.compression import open_stored
+from utils.ids import new_ulid
+from utils.metrics import metrics
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+metrics.describe('previews_generated_total', "Miniatures générées")
+metrics.describe('previews_failed_total', "Fichiers dont la miniature n'a pas pu être générée")
+metrics.describe('preview_requests_total', "Requêtes de miniature, servies (hit) ou absentes (miss)")
+
+# Suffixe du marqueur d'échec : la génération n'est pas retentée à chaque affichage
+FAILED_SUFFIX = '.failed'
+
+
+def has_preview(filename):
+    """
+    Indique si un fichier peut avoir une miniature (Pillow installé et format image).
+
+    Args:
+        filename (str): Nom original du fichier.
+
+    Returns:
+        bool: True si une miniature peut être demandée pour ce fichier.
+    """
+    if Image is None or '.' not in filename:
+        return False
+    return filename.rsplit('.', 1)[1].lower() in Config.PREVIEW_EXTENSIONS
+
+
+def preview_key(file_row):
+    """
+    Clé de la miniature d'un fichier : l'empreinte de son contenu, ou à défaut
+    une empreinte de son nom de stockage (fichiers antérieurs au stockage par empreinte).
+    """
+    if file_row['sha256']:
+        return file_row['sha256']
+    return hashlib.sha1(file_row['filename'].encode('utf-8')).hexdigest()
+
+
+def render_preview(source, target):
+    """
+    Réduit une image aux dimensions de Config.PREVIEW_SIZE et l'enregistre en JPEG.
+
+    Args:
+        source: Fichier binaire ouvert en lecture (contenu d'origine de l'image).
+        target (str): Chemin du JPEG à créer.
+    """
+    size = (Config.PREVIEW_SIZE, Config.PREVIEW_SIZE)
+    with Image.open(source) as image:
+        # JPEG : décodage directement à une résolution réduite
+        image.draft('RGB', size)
+        image.thumbnail(size)
+        if image.mode not in ('RGB', 'L'):
+            # Transparence (png, gif) : aplatie sur un fond blanc
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        image.save(target, 'JPEG', quality=Config.PREVIEW_QUALITY, optimize=True)
+
+
+class PreviewStore:
+    """
+    Génération et cache disque des miniatures.
+    """
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = set()  # clés en cours de génération
+        self._total_bytes = None  # taille du dossier, calculée au premier ajout
+        self._evicting = False  # un seul parcours du dossier à la fois
+        self.stats_counters = {'scheduled': 0, 'dropped': 0, 'generated': 0, 'failed': 0, 'evicted': 0}
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats_counters[key] += amount
+
+    def path(self, key):
+        return os.path.join(Config.PREVIEW_FOLDER, key[:2], f"{key}.jpg")
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=Config.PREVIEW_WORKERS,
+                                                    thread_name_prefix='preview')
+            return self._executor
+
+    def schedule(self, file_ids):
+        """
+        Planifie la génération des miniatures de fichiers venant d'être enregistrés.
+        Les fichiers sans miniature possible sont ignorés par le worker.
+
+        Args:
+            file_ids (iterable): IDs de la table files.
+        """
+        if Image is None:
+            return
+        file_ids = list(file_ids)
+        if file_ids:
+            self._ensure_started().submit(self._generate_files, file_ids)
+
+    def _generate_files(self, file_ids):
+        conn = get_db_connection()
+        try:
+            placeholders = ', '.join('?' * len(file_ids))
+            rows = conn.execute(
+                f"SELECT id, filename, original_filename, sha256, codec FROM files WHERE id IN ({placeholders})",
+                file_ids
+            ).fetchall()
+        finally:
+            conn.close()
+        for row in rows:
+            if has_preview(row['original_filename']):
+                self._generate(row)
+
+    def _claim(self, key):
+        with self._lock:
+            if key in self._pending:
+                return False
+            if len(self._pending) >= Config.PREVIEW_MAX_PENDING:
+                self.stats_counters['dropped'] += 1
+                return False
+            self._pending.add(key)
+            self.stats_counters['scheduled'] += 1
+            return True
+
+    def _generate(self, file_row, key=None):
+        key = key or preview_key(file_row)
+        target = self.path(key)
+        if os.path.exists(target) or os.path.exists(target + FAILED_SUFFIX):
+            return
+        if not self._claim(key):
+            return
+        # Nom temporaire unique entre threads et workers, puis renommage atomique
+        temp_path = f"{target}.{new_ulid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open_stored(file_row['filename'], file_row['codec']) as source:
+                render_preview(source, temp_path)
+            os.replace(temp_path, target)
+            self._count('generated')
+            metrics.inc('previews_generated_total')
+            self._added(os.path.getsize(target))
+        except Exception as e:
+            # Image illisible, tronquée ou trop grande : marquer l'échec pour ne pas réessayer
+            print(f"Miniature impossible pour le fichier {file_row['id']}: {e}")
+            self._count('failed')
+            metrics.inc('previews_failed_total')
+            try:
+                open(target + FAILED_SUFFIX, 'wb').close()
+            except OSError:
+                pass
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _scan(self):
+        entries = []
+        for shard in os.scandir(Config.PREVIEW_FOLDER):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _added(self, size):
+        # Le parcours du dossier se fait hors du verrou : les autres workers
+        # (et les envois planifiés) ne restent pas bloqués derrière ces E/S
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += size
+                if self._total_bytes <= Config.PREVIEW_CACHE_MAX_BYTES:
+                    return
+            if self._evicting:
+                return
+            self._evicting = True
+            known = self._total_bytes
+        try:
+            entries = sorted(self._scan())
+            total = sum(entry[1] for entry in entries)
+            evicted = 0
+            if total > Config.PREVIEW_CACHE_MAX_BYTES:
+                # Éviction jusqu'à 90 % de la limite pour ne pas reparcourir le dossier à chaque ajout
+                target = Config.PREVIEW_CACHE_MAX_BYTES * 0.9
+                for _, entry_size, path in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= entry_size
+                    evicted += 1
+            with self._lock:
+                # Ajouts survenus pendant le parcours : conservés dans le total
+                if known is not None and self._total_bytes is not None:
+                    total += self._total_bytes - known
+                self._total_bytes = total
+                self.stats_counters['evicted'] += evicted
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def send(self, file_row):
+        """
+        Envoie la miniature d'un fichier, ou répond 404 si elle n'est pas (encore)
+        disponible ; une miniature absente ou évincée est alors régénérée en arrière-plan.
+
+        Args:
+            file_row (sqlite3.Row): Ligne de la table files.
+
+        Returns:
+            Response: Image JPEG, cacheable par le navigateur.
+        """
+        if not has_preview(file_row['original_filename']):
+            abort(404)
+        key = preview_key(file_row)
+        path = self.path(key)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            metrics.inc('preview_requests_total', result='miss')
+            if not os.path.exists(path + FAILED_SUFFIX):
+                self._ensure_started().submit(self._generate, file_row, key)
+            abort(404)
+
+        metrics.inc('preview_requests_total', result='hit')
+        now = time.time()
+        if now - mtime > Config.PREVIEW_TOUCH_INTERVAL:
+            # Date de dernier accès pour l'éviction (mise à jour au plus une fois par intervalle)
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        # La miniature dépend du seul contenu : elle ne change jamais pour une même clé
+        response = send_file(path, mimetype='image/jpeg', etag=key, conditional=True,
+                             max_age=Config.PREVIEW_MAX_AGE)
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.stats_counters)
+            counters['pending'] = len(self._pending)
+            counters['cached_bytes'] = self._total_bytes or 0
+        counters['enabled'] = Image is not None
+        return counters
+
+
+preview_store = PreviewStore()
@@ -0,0 +1,293 @@
+"""
+Réconciliation entre le stockage des fichiers (utils/storage.py) et la base de données.
+
+Détecte (et répare avec --repair) :
+- les fichiers physiques qu'aucune ligne files ni aucun blob ne référence ;
+- les lignes files dont le fichier physique a disparu ;
+- les lignes files dont l'utilisateur (uploaded_by) n'existe plus ;
+- les compteurs de références de blobs incorrects ;
+- les sessions d'upload par morceaux abandonnées.
+
+Le parcours se fait par lots (StorageBackend.iter_entries d'un côté, pagination par curseur
+sur l'ID de l'autre) : la mémoire utilisée ne dépend pas du nombre de fichiers.
+Le débit d'E/S est limité pour pouvoir tourner en production.
+
+Usage : python -m utils.reconcile [--repair] [--rate N]
+"""
+import argparse
+import fcntl
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from config import Config
+from database.connection import get_db_connection
+from utils.blobs import blob_sha256, storage_name
+from utils.bulk import delete_files, relink_files
+from utils.unlinker import unlinker
+from utils.storage import get_storage
+from utils.uploads import discard_upload
+
+# Nombre d'entrées traitées par requête SQL
+BATCH_SIZE = 500
+
+
+class Throttle:
+    """
+    Limite le nombre d'opérations d'E/S par seconde.
+    """
+    def __init__(self, rate):
+        self.rate = rate
+        self._start = time.monotonic()
+        self._count = 0
+
+    def tick(self, count=1):
+        if not self.rate:
+            return
+        self._count += count
+        expected = self._count / self.rate
+        elapsed = time.monotonic() - self._start
+        if expected > elapsed:
+            time.sleep(expected - elapsed)
+
+
+class Report:
+    """
+    Compteurs de la réconciliation ; chaque anomalie est écrite au fil de l'eau
+    (rien n'est accumulé en mémoire).
+    """
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+        self.counts = {
+            'disk_entries': 0, 'file_rows': 0, 'blob_rows': 0,
+            'orphan_files': 0, 'missing_files': 0, 'orphan_owners': 0,
+            'bad_refcounts': 0, 'stale_uploads': 0, 'repaired': 0,
+        }
+
+    def add(self, kind, detail=None):
+        self.counts[kind] += 1
+        if self.verbose and detail is not None:
+            print(f"[{kind}] {detail}")
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def check_disk(conn, report, throttle, repair):
+    """
+    Fichiers physiques sans ligne files ni blob correspondant.
+    Les fichiers récents (moins de RECONCILE_GRACE_PERIOD secondes) sont ignorés :
+    ils peuvent appartenir à un upload en cours de validation.
+    """
+    grace_limit = time.time() - Config.RECONCILE_GRACE_PERIOD
+    orphans = []
+    for batch in _batched(get_storage().iter_entries(), BATCH_SIZE):
+        throttle.tick(len(batch))
+        report.counts['disk_entries'] += len(batch)
+        names = [name for name, _ in batch]
+        placeholders = ', '.join('?' for _ in names)
+        referenced = {row[0] for row in conn.execute(
+            f"SELECT filename FROM files WHERE filename IN ({placeholders})", names
+        )}
+        # Un blob n'est référencé qu'à son emplacement réparti (storage_name)
+        hashes = {name: blob_sha256(name) for name in names}
+        candidates = [sha256 for sha256 in hashes.values() if sha256]
+        if candidates:
+            referenced.update(storage_name(row[0]) for row in conn.execute(
+                f"SELECT sha256 FROM blobs WHERE sha256 IN ({', '.join('?' for _ in candidates)})", candidates
+            ))
+        for name, mtime in batch:
+            if name not in referenced and mtime < grace_limit:
+                report.add('orphan_files', name)
+                orphans.append(name)
+        if repair and orphans:
+            # Le worker de suppression revérifie sous verrou avant de supprimer
+            unlinker.enqueue(orphans)
+            report.counts['repaired'] += len(orphans)
+        orphans = []
+
+
+def check_rows(conn, report, throttle, repair, owner_id):
+    """
+    Lignes files dont le fichier physique manque ou dont l'utilisateur n'existe plus,
+    parcourues par pagination sur l'ID.
+    """
+    storage = get_storage()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            """SELECT files.id, files.filename, files.uploaded_by, users.id AS owner
+               FROM files LEFT JOIN users ON files.uploaded_by = users.id
+               WHERE files.id > ? ORDER BY files.id LIMIT ?""",
+            (last_id, BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        report.counts['file_rows'] += len(rows)
+        throttle.tick(len(rows))
+
+        missing = []
+        orphaned = []
+        for row in rows:
+            if not storage.exists(row['filename']):
+                report.add('missing_files', f"id={row['id']} filename={row['filename']}")
+                missing.append(row['id'])
+            elif row['owner'] is None:
+                report.add('orphan_owners', f"id={row['id']} uploaded_by={row['uploaded_by']}")
+                orphaned.append(row['id'])
+
+        if repair and (missing or (orphaned and owner_id)):
+            conn.execute("BEGIN IMMEDIATE")
+            if missing:
+                delete_files(conn, missing)
+                report.counts['repaired'] += len(missing)
+            if orphaned and owner_id:
+                report.counts['repaired'] += relink_files(conn, orphaned, owner_id)
+            conn.commit()
+
+
+def check_blobs(conn, report, throttle, repair):
+    """
+    Compteurs de références des blobs comparés au nombre réel de lignes files.
+    Les réservations d'envoi (refcount 0, utils/blobs.py:prepare_blob) ne sont
+    signalées qu'une fois abandonnées depuis plus de BLOB_CLAIM_TIMEOUT secondes.
+    """
+    abandoned = datetime.now() - timedelta(seconds=Config.BLOB_CLAIM_TIMEOUT)
+    last_sha = ''
+    while True:
+        rows = conn.execute(
+            """SELECT sha256, refcount, refcount = 0 AND created_at < ? AS abandoned,
+                      (SELECT COUNT(*) FROM files WHERE files.sha256 = blobs.sha256) AS actual
+               FROM blobs WHERE sha256 > ? ORDER BY sha256 LIMIT ?""",
+            (abandoned, last_sha, BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        last_sha = rows[-1]['sha256']
+        report.counts['blob_rows'] += len(rows)
+        throttle.tick(len(rows))
+
+        for row in rows:
+            if row['refcount'] == row['actual'] and not row['abandoned']:
+                continue
+            report.add('bad_refcounts', f"sha256={row['sha256']} refcount={row['refcount']} actual={row['actual']}")
+            if not repair:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            actual = conn.execute("SELECT COUNT(*) FROM files WHERE sha256 = ?", (row['sha256'],)).fetchone()[0]
+            if actual:
+                conn.execute("UPDATE blobs SET refcount = ? WHERE sha256 = ?", (actual, row['sha256']))
+                deleted = False
+            else:
+                # Ne pas retirer une réservation reprise entre-temps par un autre envoi
+                deleted = conn.execute(
+                    "DELETE FROM blobs WHERE sha256 = ? AND (refcount > 0 OR created_at < ?)",
+                    (row['sha256'], abandoned)
+                ).rowcount == 1
+            conn.commit()
+            if deleted:
+                unlinker.enqueue([storage_name(row['sha256'])])
+            report.counts['repaired'] += 1
+
+
+def check_uploads(conn, report, repair):
+    """
+    Sessions d'upload par morceaux inactives depuis plus de UPLOAD_SESSION_TTL secondes.
+    """
+    limit = datetime.now() - timedelta(seconds=Config.UPLOAD_SESSION_TTL)
+    last_id = ''
+    while True:
+        rows = conn.execute(
+            "SELECT id FROM uploads WHERE updated_at < ? AND id > ? ORDER BY id LIMIT ?",
+            (limit, last_id, BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        for row in rows:
+            report.add('stale_uploads', row['id'])
+            if repair:
+                discard_upload(row['id'])
+                report.counts['repaired'] += 1
+
+
+def reconcile(repair=False, rate=None, verbose=True):
+    """
+    Lance une réconciliation complète.
+
+    Args:
+        repair (bool): Réparer les anomalies au lieu de seulement les signaler.
+        rate (int): Nombre maximal d'opérations d'E/S par seconde (None : Config).
+        verbose (bool): Écrire chaque anomalie sur la sortie standard.
+
+    Returns:
+        dict: Compteurs de la réconciliation.
+    """
+    report = Report(verbose)
+    throttle = Throttle(Config.RECONCILE_MAX_OPS_PER_SEC if rate is None else rate)
+    conn = get_db_connection()
+    try:
+        # Les fichiers dont l'utilisateur a disparu sont rattachés au premier administrateur
+        owner = conn.execute("SELECT id FROM users WHERE is_admin = 1 ORDER BY id LIMIT 1").fetchone()
+        check_disk(conn, report, throttle, repair)
+        check_rows(conn, report, throttle, repair, owner['id'] if owner else None)
+        check_blobs(conn, report, throttle, repair)
+        check_uploads(conn, report, repair)
+    finally:
+        conn.close()
+    if repair:
+        unlinker.flush(timeout=60)
+    return report.counts
+
+
+def _run_locked(repair):
+    # Un seul processus à la fois (plusieurs workers gunicorn démarrent le planificateur)
+    os.makedirs(os.path.dirname(Config.RECONCILE_LOCK_PATH), exist_ok=True)
+    with open(Config.RECONCILE_LOCK_PATH, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        return reconcile(repair=repair)
+
+
+def start_scheduler():
+    """
+    Démarre la réconciliation périodique (toutes les RECONCILE_INTERVAL secondes)
+    dans un thread d'arrière-plan. Sans effet si RECONCILE_INTERVAL vaut 0.
+    """
+    if not Config.RECONCILE_INTERVAL:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(Config.RECONCILE_INTERVAL)
+            try:
+                counts = _run_locked(Config.RECONCILE_REPAIR)
+                if counts is not None:
+                    print(f"Réconciliation terminée : {json.dumps(counts)}")
+            except Exception as e:
+                print(f"Erreur lors de la réconciliation: {e}")
+
+    thread = threading.Thread(target=loop, name='reconcile', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Réconcilie le stockage des fichiers et la base de données.")
+    parser.add_argument('--repair', action='store_true', help="réparer les anomalies détectées")
+    parser.add_argument('--rate', type=int, default=None, help="opérations d'E/S maximales par seconde (0 : illimité)")
+    parser.add_argument('--quiet', action='store_true', help="n'afficher que le résumé")
+    args = parser.parse_args()
+    print(json.dumps(reconcile(repair=args.repair, rate=args.rate, verbose=not args.quiet), indent=2))
@@ -0,0 +1,545 @@
+"""
+Stockage des fichiers partagés derrière une interface commune.
+
+Chaque fichier est désigné par son nom de stockage (files.filename, par
+exemple ab/cd/<sha256>) ; le backend décide où vont les octets :
+- LocalStorage : disque local (UPLOAD_FOLDER), le mode par défaut ;
+- MemoryStorage : en mémoire, pour les essais et les benchmarks ;
+- S3Storage : service compatible S3 (AWS, MinIO...), boto3 requis ;
+- TieredStorage : disque local rapide (niveau chaud) devant un backend froid.
+  Les fichiers non téléchargés depuis TIER_DEMOTE_AFTER_DAYS jours sont
+  déplacés vers le niveau froid (utils/tiering.py) et rapatriés en
+  arrière-plan au premier accès.
+
+Le backend utilisé est choisi par Config.STORAGE_BACKEND (get_storage()).
+"""
+import io
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils.ids import new_ulid
+from utils.metrics import metrics
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+    class ClientError(Exception):
+        """
+        Erreur d'un appel S3, au format de botocore (attribut response), quand
+        botocore n'est pas installé : un client compatible peut être fourni à S3Storage.
+        """
+        def __init__(self, error_response, operation_name):
+            super().__init__(f"{operation_name}: {error_response.get('Error', {}).get('Code')}")
+            self.response = error_response
+            self.operation_name = operation_name
+
+# Taille des blocs copiés d'un backend à l'autre
+COPY_BLOCK_SIZE = 1024 * 1024
+
+metrics.describe('storage_promotions_total', "Fichiers rapatriés du niveau froid vers le disque local")
+metrics.describe('storage_demotions_total', "Fichiers déplacés du disque local vers le niveau froid")
+
+
+class _LimitedReader(io.RawIOBase):
+    """
+    Lecture d'une plage [début, fin) d'un fichier local déjà positionné.
+    """
+    def __init__(self, fileobj, remaining):
+        self._fileobj = fileobj
+        self._remaining = remaining
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def readinto(self, buffer):
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                return 0
+            buffer = memoryview(buffer)[:self._remaining]
+        count = self._fileobj.readinto(buffer)
+        if self._remaining is not None:
+            self._remaining -= count
+        return count
+
+    def close(self):
+        self._fileobj.close()
+        super().close()
+
+
+class StorageBackend:
+    """
+    Interface des backends de stockage. Les noms sont des chemins relatifs
+    (séparateur /) ; un nom absent lève FileNotFoundError en lecture et en suppression.
+    """
+    def open_read(self, name, start=0, stop=None):
+        """
+        Ouvre un fichier stocké en lecture, éventuellement limitée à une plage d'octets.
+
+        Args:
+            name (str): Nom de stockage.
+            start (int): Premier octet lu.
+            stop (int): Fin exclusive de la plage (None : jusqu'à la fin).
+
+        Returns:
+            Fichier binaire en lecture (à fermer après usage). Seul LocalStorage
+            et MemoryStorage renvoient un fichier dans lequel on peut se déplacer.
+        """
+        raise NotImplementedError
+
+    def write_stream(self, name, stream):
+        """
+        Écrit un fichier à partir d'un flux ; le fichier n'est visible qu'une fois complet.
+
+        Args:
+            name (str): Nom de stockage.
+            stream: Fichier binaire ouvert en lecture.
+
+        Returns:
+            int: Nombre d'octets écrits.
+        """
+        raise NotImplementedError
+
+    def put_file(self, name, local_path):
+        """
+        Copie un fichier local sous un nom de stockage. Le fichier local est conservé :
+        l'appelant le supprime une fois l'enregistrement en base validé.
+        """
+        with open(local_path, 'rb') as source:
+            self.write_stream(name, source)
+
+    def delete(self, name):
+        raise NotImplementedError
+
+    def exists(self, name):
+        raise NotImplementedError
+
+    def size(self, name):
+        raise NotImplementedError
+
+    def local_path(self, name):
+        """
+        Chemin sur le disque local, si le fichier y est : permet sendfile et la
+        délégation au proxy inverse. None pour les backends distants.
+        """
+        return None
+
+    def touch(self, name):
+        """
+        Note un accès à un fichier servi sans passer par le backend (cache mémoire) ;
+        seul le disque local de TieredStorage s'en sert.
+        """
+
+    def iter_entries(self):
+        """
+        Parcourt les fichiers stockés sans tout charger en mémoire.
+
+        Yields:
+            tuple: (nom de stockage, date de dernière modification en secondes).
+        """
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    """
+    Fichiers rangés sous un dossier local.
+    """
+    def __init__(self, root, skip=()):
+        self.root = root
+        self.skip = {os.path.abspath(path) for path in skip}
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def open_read(self, name, start=0, stop=None):
+        fileobj = open(self.path(name), 'rb', buffering=0)
+        if not start and stop is None:
+            return io.BufferedReader(fileobj)
+        fileobj.seek(start)
+        return io.BufferedReader(_LimitedReader(fileobj, None if stop is None else stop - start))
+
+    def write_stream(self, name, stream):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Nom temporaire unique à côté de la destination, puis renommage atomique
+        temp_path = f"{path}.{new_ulid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as target:
+                shutil.copyfileobj(stream, target, COPY_BLOCK_SIZE)
+                size = target.tell()
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return size
+
+    def put_file(self, name, local_path):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Lien physique sous un nom temporaire puis renommage atomique : pas de copie
+        temp_path = f"{path}.{new_ulid()}.tmp"
+        try:
+            os.link(local_path, temp_path)
+        except OSError:
+            # Dossier temporaire sur un autre système de fichiers : copie
+            super().put_file(name, local_path)
+            return
+        try:
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def delete(self, name):
+        os.remove(self.path(name))
+
+    def exists(self, name):
+        return os.path.isfile(self.path(name))
+
+    def size(self, name):
+        return os.path.getsize(self.path(name))
+
+    def local_path(self, name):
+        path = self.path(name)
+        return path if os.path.isfile(path) else None
+
+    def touch(self, name):
+        """
+        Note l'accès à un fichier dans sa date de modification (au plus une fois
+        par TIER_TOUCH_INTERVAL) : c'est elle qui décide du passage au niveau froid.
+        """
+        path = self.path(name)
+        now = time.time()
+        try:
+            if now - os.stat(path).st_mtime > Config.TIER_TOUCH_INTERVAL:
+                os.utime(path, (now, now))
+        except OSError:
+            pass
+
+    def iter_entries(self):
+        # Pile de dossiers (os.scandir) : pas de liste complète en mémoire
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if os.path.abspath(entry.path) not in self.skip:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False) and not entry.name.endswith('.tmp'):
+                            relative = os.path.relpath(entry.path, self.root).replace(os.sep, '/')
+                            yield relative, entry.stat(follow_symlinks=False).st_mtime
+            except FileNotFoundError:
+                continue
+
+
+class MemoryStorage(StorageBackend):
+    """
+    Fichiers gardés en mémoire dans le processus (essais, benchmarks sans disque).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files = {}  # {nom: (contenu, date de modification)}
+
+    def _get(self, name):
+        with self._lock:
+            try:
+                return self._files[name][0]
+            except KeyError:
+                raise FileNotFoundError(name) from None
+
+    def open_read(self, name, start=0, stop=None):
+        return io.BytesIO(self._get(name)[start:stop])
+
+    def write_stream(self, name, stream):
+        data = stream.read()
+        with self._lock:
+            self._files[name] = (data, time.time())
+        return len(data)
+
+    def delete(self, name):
+        with self._lock:
+            if self._files.pop(name, None) is None:
+                raise FileNotFoundError(name)
+
+    def exists(self, name):
+        with self._lock:
+            return name in self._files
+
+    def size(self, name):
+        return len(self._get(name))
+
+    def iter_entries(self):
+        with self._lock:
+            entries = [(name, mtime) for name, (_, mtime) in self._files.items()]
+        yield from entries
+
+
+class S3Storage(StorageBackend):
+    """
+    Fichiers stockés comme objets d'un bucket S3 (ou d'un service compatible,
+    via endpoint_url). Les lectures de plage utilisent l'en-tête Range de GetObject,
+    les écritures l'envoi en plusieurs parties de boto3.
+    """
+    def __init__(self, bucket, prefix='', endpoint_url=None, client=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("Le backend S3 nécessite le paquet boto3")
+            client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+
+    def _key(self, name):
+        return self.prefix + name
+
+    def _missing(self, error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def _head(self, name):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(name))
+        except ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+
+    def open_read(self, name, start=0, stop=None):
+        if stop is not None and stop <= start:
+            return io.BytesIO(b'')
+        params = {'Bucket': self.bucket, 'Key': self._key(name)}
+        if start or stop is not None:
+            params['Range'] = f"bytes={start}-{'' if stop is None else stop - 1}"
+        try:
+            return self.client.get_object(**params)['Body']
+        except ClientError as e:
+            if self._missing(e):
+                raise FileNotFoundError(name) from None
+            raise
+
+    def write_stream(self, name, stream):
+        counter = _CountingReader(stream)
+        self.client.upload_fileobj(counter, self.bucket, self._key(name))
+        return counter.count
+
+    def put_file(self, name, local_path):
+        self.client.upload_file(local_path, self.bucket, self._key(name))
+
+    def delete(self, name):
+        if self._head(name) is None:
+            raise FileNotFoundError(name)
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(name))
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def size(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head['ContentLength']
+
+    def iter_entries(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get('Contents', ()):
+                yield item['Key'][len(self.prefix):], item['LastModified'].timestamp()
+
+
+class _CountingReader(io.RawIOBase):
+    """
+    Flux en lecture qui compte les octets lus (taille d'un envoi vers S3).
+    """
+    def __init__(self, stream):
+        self._stream = stream
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        self.count += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class TieredStorage(StorageBackend):
+    """
+    Disque local (chaud) devant un backend froid. Les écritures vont sur le
+    disque local ; une lecture d'un fichier absent du disque est servie depuis
+    le niveau froid et déclenche son rapatriement en arrière-plan. La copie
+    froide est conservée : un fichier rapatrié puis de nouveau inutilisé est
+    simplement retiré du disque local.
+    """
+    def __init__(self, hot, cold):
+        self.hot = hot
+        self.cold = cold
+        self._lock = threading.Lock()
+        self._promoting = set()
+        self._executor = None
+
+    def open_read(self, name, start=0, stop=None):
+        try:
+            fileobj = self.hot.open_read(name, start, stop)
+            self.hot.touch(name)
+            return fileobj
+        except FileNotFoundError:
+            fileobj = self.cold.open_read(name, start, stop)
+            self.promote(name)
+            return fileobj
+
+    def write_stream(self, name, stream):
+        return self.hot.write_stream(name, stream)
+
+    def put_file(self, name, local_path):
+        self.hot.put_file(name, local_path)
+
+    def delete(self, name):
+        found = False
+        for tier in (self.hot, self.cold):
+            try:
+                tier.delete(name)
+                found = True
+            except FileNotFoundError:
+                pass
+        if not found:
+            raise FileNotFoundError(name)
+
+    def exists(self, name):
+        return self.hot.exists(name) or self.cold.exists(name)
+
+    def size(self, name):
+        try:
+            return self.hot.size(name)
+        except FileNotFoundError:
+            return self.cold.size(name)
+
+    def local_path(self, name):
+        path = self.hot.local_path(name)
+        if path is not None:
+            self.hot.touch(name)
+        return path
+
+    def iter_entries(self):
+        # Un fichier présent dans les deux niveaux apparaît deux fois
+        yield from self.hot.iter_entries()
+        yield from self.cold.iter_entries()
+
+    def touch(self, name):
+        self.hot.touch(name)
+
+    def promote(self, name):
+        """
+        Planifie la copie d'un fichier du niveau froid vers le disque local.
+        """
+        with self._lock:
+            if name in self._promoting:
+                return
+            self._promoting.add(name)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='promote')
+        self._executor.submit(self._promote, name)
+
+    def _promote(self, name):
+        try:
+            with self.cold.open_read(name) as source:
+                self.hot.write_stream(name, source)
+            metrics.inc('storage_promotions_total')
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Erreur lors du rapatriement du fichier {name}: {e}")
+        finally:
+            with self._lock:
+                self._promoting.discard(name)
+
+    def demote(self, name, older_than):
+        """
+        Déplace un fichier du disque local vers le niveau froid s'il n'a pas été
+        lu depuis older_than (date en secondes).
+
+        Returns:
+            bool: True si le fichier a quitté le disque local.
+        """
+        path = self.hot.local_path(name)
+        if path is None or os.stat(path).st_mtime >= older_than:
+            return False
+        if not self.cold.exists(name):
+            with self.hot.open_read(name) as source:
+                self.cold.write_stream(name, source)
+        # Revérifier : un téléchargement a pu le rendre de nouveau « chaud » pendant la copie
+        try:
+            if os.stat(path).st_mtime >= older_than:
+                return False
+            self.hot.delete(name)
+        except FileNotFoundError:
+            return False
+        metrics.inc('storage_demotions_total')
+        return True
+
+
+def _s3_backend():
+    return S3Storage(Config.S3_BUCKET, Config.S3_PREFIX, Config.S3_ENDPOINT_URL)
+
+
+def create_storage(kind):
+    """
+    Construit un backend à partir de son nom ('local', 'memory', 's3' ou 'tiered').
+    """
+    local = lambda: LocalStorage(Config.UPLOAD_FOLDER, skip=[Config.UPLOAD_TEMP_FOLDER])
+    if kind == 'local':
+        return local()
+    if kind == 'memory':
+        return MemoryStorage()
+    if kind == 's3':
+        return _s3_backend()
+    if kind == 'tiered':
+        return TieredStorage(local(), _s3_backend())
+    raise ValueError(f"Backend de stockage inconnu : {kind}")
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """
+    Retourne le backend de stockage de l'application (Config.STORAGE_BACKEND),
+    créé au premier appel.
+
+    Returns:
+        StorageBackend: Backend partagé par tous les threads du processus.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage(Config.STORAGE_BACKEND)
+    return _storage
+
+
+def set_storage(backend):
+    """
+    Remplace le backend de stockage (essais, benchmarks).
+
+    Args:
+        backend (StorageBackend): Nouveau backend.
+    """
+    global _storage
+    with _storage_lock:
+        _storage = backend
@@ -0,0 +1,101 @@
+"""
+Déplacement des fichiers peu utilisés du disque local vers le niveau froid
+(Config.STORAGE_BACKEND = 'tiered', voir utils/storage.py:TieredStorage).
+
+La date de modification d'un fichier local sert de date de dernier accès :
+chaque téléchargement la rafraîchit (au plus une fois par TIER_TOUCH_INTERVAL).
+Un fichier non lu depuis TIER_DEMOTE_AFTER_DAYS jours est copié vers le niveau
+froid s'il n'y est pas déjà, puis retiré du disque local. Il sera rapatrié
+automatiquement au prochain téléchargement.
+
+Usage : python -m utils.tiering [--days N] [--rate N]
+"""
+import argparse
+import fcntl
+import json
+import os
+import threading
+import time
+from config import Config
+from utils.reconcile import Throttle
+from utils.storage import TieredStorage, get_storage
+
+
+def demote(older_than_days=None, rate=None, verbose=True):
+    """
+    Passe en revue le disque local et déplace les fichiers inutilisés vers le niveau froid.
+
+    Args:
+        older_than_days (float): Ancienneté minimale du dernier accès (par défaut TIER_DEMOTE_AFTER_DAYS).
+        rate (int): Fichiers examinés par seconde (par défaut TIER_MAX_OPS_PER_SEC).
+        verbose (bool): Afficher chaque fichier déplacé.
+
+    Returns:
+        dict: Nombre de fichiers examinés, déplacés et en erreur.
+    """
+    storage = get_storage()
+    if not isinstance(storage, TieredStorage):
+        raise RuntimeError("Le déplacement vers le niveau froid nécessite STORAGE_BACKEND = 'tiered'")
+    if older_than_days is None:
+        older_than_days = Config.TIER_DEMOTE_AFTER_DAYS
+    throttle = Throttle(Config.TIER_MAX_OPS_PER_SEC if rate is None else rate)
+    older_than = time.time() - older_than_days * 24 * 3600
+
+    counts = {'scanned': 0, 'demoted': 0, 'errors': 0}
+    for name, mtime in storage.hot.iter_entries():
+        counts['scanned'] += 1
+        if mtime >= older_than:
+            continue
+        throttle.tick()
+        try:
+            if storage.demote(name, older_than):
+                counts['demoted'] += 1
+                if verbose:
+                    print(f"[demoted] {name}")
+        except Exception as e:
+            counts['errors'] += 1
+            print(f"Erreur lors du déplacement du fichier {name}: {e}")
+    return counts
+
+
+def _run_locked():
+    # Un seul processus à la fois (plusieurs workers gunicorn démarrent le planificateur)
+    os.makedirs(os.path.dirname(Config.TIER_LOCK_PATH), exist_ok=True)
+    with open(Config.TIER_LOCK_PATH, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        return demote(verbose=False)
+
+
+def start_scheduler():
+    """
+    Démarre le déplacement périodique (toutes les TIER_INTERVAL secondes) dans un
+    thread d'arrière-plan. Sans effet hors du mode 'tiered' ou si TIER_INTERVAL vaut 0.
+    """
+    if Config.STORAGE_BACKEND != 'tiered' or not Config.TIER_INTERVAL:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(Config.TIER_INTERVAL)
+            try:
+                counts = _run_locked()
+                if counts is not None:
+                    print(f"Déplacement vers le niveau froid terminé : {json.dumps(counts)}")
+            except Exception as e:
+                print(f"Erreur lors du déplacement vers le niveau froid: {e}")
+
+    thread = threading.Thread(target=loop, name='tiering', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Déplace les fichiers inutilisés vers le niveau froid.")
+    parser.add_argument('--days', type=float, default=None, help="jours sans téléchargement (par défaut TIER_DEMOTE_AFTER_DAYS)")
+    parser.add_argument('--rate', type=int, default=None, help="fichiers examinés par seconde (0 : illimité)")
+    parser.add_argument('--quiet', action='store_true', help="n'afficher que le résumé")
+    args = parser.parse_args()
+    print(json.dumps(demote(args.days, args.rate, verbose=not args.quiet), indent=2))
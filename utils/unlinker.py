@@ -0,0 +1,159 @@
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+from config import Config
+from database.connection import get_db_connection
+from utils.blobs import is_referenced
+from utils.storage import get_storage
+
+
+class Unlinker:
+    """
+    Suppression asynchrone des fichiers physiques.
+
+    Les routes suppriment les lignes en base puis confient les noms de fichiers
+    à ce worker, qui les supprime par lots hors du chemin de la requête et
+    réessaie les échecs. Il vérifie sous verrou d'écriture qu'aucun fichier ni
+    blob ne référence de nouveau ces noms (un upload du même contenu a pu les
+    recréer entre-temps) et les inscrit dans pending_unlinks, puis les supprime
+    après le commit ; un upload du même contenu attend la fin de la suppression.
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats_counters = {'queued': 0, 'unlinked': 0, 'skipped': 0, 'retried': 0, 'failed': 0}
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats_counters[key] += amount
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='unlinker', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, filenames):
+        """
+        Planifie la suppression de fichiers stockés.
+
+        Args:
+            filenames (iterable): Noms de stockage (valeurs de files.filename).
+        """
+        count = 0
+        for filename in filenames:
+            self._queue.put((filename, 0))
+            count += 1
+        if count:
+            self._count('queued', count)
+            self._ensure_started()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < Config.UNLINK_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _process(self, batch):
+        retry = []
+        storage = get_storage()
+        conn = get_db_connection()
+        try:
+            # Réserver les noms qui ne sont plus référencés, dans une transaction courte
+            claimed = []
+            conn.execute("BEGIN IMMEDIATE")
+            for filename, attempts in batch:
+                if is_referenced(conn, filename):
+                    self._count('skipped')
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO pending_unlinks (filename, claimed_at) VALUES (?, ?)",
+                    (filename, datetime.now())
+                )
+                claimed.append((filename, attempts))
+            conn.commit()
+
+            # Suppressions physiques hors transaction : le verrou d'écriture de SQLite
+            # n'attend pas le stockage (appels réseau avec S3)
+            for filename, attempts in claimed:
+                try:
+                    storage.delete(filename)
+                    self._count('unlinked')
+                except FileNotFoundError:
+                    self._count('skipped')
+                except Exception as e:
+                    if attempts + 1 >= Config.UNLINK_MAX_RETRIES:
+                        print(f"Erreur lors de la suppression du fichier {filename}: {e}")
+                        self._count('failed')
+                    else:
+                        retry.append((filename, attempts + 1))
+                finally:
+                    # Un envoi du même contenu attendait peut-être la fin de cette suppression
+                    conn.execute("DELETE FROM pending_unlinks WHERE filename = ?", (filename,))
+                    conn.commit()
+        finally:
+            conn.close()
+        return retry
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                retry = self._process(batch)
+            except Exception as e:
+                # Base verrouillée ou indisponible : tout le lot est réessayé
+                print(f"Erreur du worker de suppression: {e}")
+                retry = [(filename, attempts + 1) for filename, attempts in batch
+                         if attempts + 1 < Config.UNLINK_MAX_RETRIES]
+                self._count('failed', len(batch) - len(retry))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if retry:
+                self._count('retried', len(retry))
+                time.sleep(Config.UNLINK_RETRY_DELAY)
+                for item in retry:
+                    self._queue.put(item)
+
+    def flush(self, timeout=5.0):
+        """
+        Attend que la file soit vide (au plus timeout secondes).
+
+        Args:
+            timeout (float): Délai maximal d'attente en secondes.
+
+        Returns:
+            bool: True si toutes les suppressions planifiées ont été traitées.
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self):
+        """
+        Retourne les compteurs du worker de suppression.
+
+        Returns:
+            dict: Fichiers planifiés, supprimés, ignorés, réessayés, en échec et en attente.
+        """
+        with self._stats_lock:
+            result = dict(self.stats_counters)
+        result['pending'] = self._queue.unfinished_tasks
+        return result
+
+
+unlinker = Unlinker()
+
+# Laisser une chance aux suppressions en attente de se terminer à l'arrêt du processus
+atexit.register(unlinker.flush)
@@ -0,0 +1,471 @@
+import fcntl
+import hashlib
+import os
+import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from werkzeug.utils import secure_filename
+from config import Config
+from database.connection import get_db_connection
+from database.models import File
+from database.user_stats import remaining_quota
+from utils.blobs import BlobUnavailable, abandon_blob, prepare_blob, store_blob
+from utils.compression import codec_for, compressing_writer, compress_file
+from utils.metrics import metrics
+from utils.unlinker import unlinker
+
+# Taille des blocs lus depuis le flux de la requête (jamais le corps entier en mémoire)
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# Tentatives d'enregistrement quand un blob disparaît entre sa préparation et la transaction
+STORE_ATTEMPTS = 3
+
+
+class UploadError(Exception):
+    """
+    Erreur d'upload par morceaux, avec le code HTTP à renvoyer au client.
+    """
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+
+# Empreintes SHA-256 en cours, par upload : {upload_id: (offset, hasher, dernier accès)}.
+# Si l'état manque (morceau reçu par un autre worker, redémarrage, morceau interrompu),
+# les morceaux suivants ne sont plus hachés et l'empreinte est calculée une seule fois,
+# sur le fichier complet, par finalize_upload().
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def copy_stream(stream, fileobj, hasher=None, limit=None):
+    """
+    Copie un flux vers un fichier par blocs, en mettant à jour l'empreinte au fil de l'eau.
+
+    Args:
+        stream: Flux source (request.stream, FileStorage.stream...).
+        fileobj: Fichier destination ouvert en écriture binaire.
+        hasher: Objet hashlib à alimenter (optionnel).
+        limit (int): Nombre maximal d'octets acceptés (optionnel).
+
+    Returns:
+        int: Nombre d'octets copiés.
+    """
+    written = 0
+    while True:
+        block = stream.read(STREAM_BLOCK_SIZE)
+        if not block:
+            break
+        written += len(block)
+        if limit is not None and written > limit:
+            raise UploadError('Le morceau dépasse la taille annoncée du fichier', status=413)
+        fileobj.write(block)
+        if hasher is not None:
+            hasher.update(block)
+    metrics.inc('upload_bytes_total', written)
+    return written
+
+
+def stream_to_temp(stream, codec=None):
+    """
+    Écrit un flux dans un fichier temporaire en calculant son SHA-256 au fil de l'eau.
+    Avec un codec, le contenu est compressé pendant l'écriture ; la taille et
+    l'empreinte restent celles du contenu d'origine.
+
+    Args:
+        stream: Flux source (FileStorage.stream, request.stream...).
+        codec (str): Compression à appliquer ('gzip', voir utils/compression.py), None sinon.
+
+    Returns:
+        tuple: (chemin temporaire, taille en octets, empreinte SHA-256 hexadécimale).
+    """
+    os.makedirs(Config.UPLOAD_TEMP_FOLDER, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=Config.UPLOAD_TEMP_FOLDER, suffix='.part')
+    hasher = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            writer = compressing_writer(f, codec)
+            size = copy_stream(stream, writer, hasher)
+            writer.close()
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, size, hasher.hexdigest()
+
+
+def save_uploaded_files(files, user_id, allowed_file):
+    """
+    Enregistre un lot de fichiers d'un formulaire multipart.
+
+    Les fichiers sont écrits sur disque en parallèle (pool de threads), puis
+    toutes les entrées sont validées en une seule transaction (File.save_many).
+
+    Args:
+        files (list): Objets FileStorage provenant de request.files.getlist().
+        user_id (int): ID de l'utilisateur qui télécharge les fichiers.
+        allowed_file: Fonction indiquant si l'extension d'un nom de fichier est autorisée.
+
+    Returns:
+        list: Un dictionnaire par fichier : filename, ok, et file_id/size ou error.
+    """
+    results = [{'filename': f.filename, 'ok': False} for f in files]
+    accepted = []
+    for index, file in enumerate(files):
+        if not file.filename:
+            results[index]['error'] = 'Aucun fichier sélectionné'
+        elif not allowed_file(file.filename):
+            results[index]['error'] = 'Type de fichier non autorisé'
+        else:
+            accepted.append(index)
+
+    def write(index):
+        return stream_to_temp(files[index].stream, codec_for(files[index].filename))
+
+    written = []
+    with ThreadPoolExecutor(max_workers=max(1, min(Config.UPLOAD_WORKERS, len(accepted) or 1))) as executor:
+        futures = [(index, executor.submit(write, index)) for index in accepted]
+        for index, future in futures:
+            try:
+                written.append((index, future.result()))
+            except OSError as e:
+                results[index]['error'] = f"Erreur d'écriture : {e}"
+
+    if not written:
+        return results
+
+    # Contenus rangés dans le stockage hors transaction (envois réseau en parallèle
+    # avec S3), une seule fois par empreinte : {sha256: [chemin temporaire, compression, taille, jeton]}
+    prepared = {}
+    for index, (temp_path, filesize, sha256) in written:
+        prepared.setdefault(sha256, [temp_path, codec_for(files[index].filename), filesize, None])
+
+    def prepare(sha256):
+        temp_path, codec, filesize, _ = prepared[sha256]
+        prepared[sha256][3] = prepare_blob(temp_path, sha256, filesize, codec)[1]
+
+    conn = get_db_connection()
+    entries = []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(Config.UPLOAD_WORKERS, len(prepared)))) as executor:
+            for sha256, future in [(sha256, executor.submit(prepare, sha256)) for sha256 in prepared]:
+                try:
+                    future.result()
+                except OSError as e:
+                    for index, (_, _, written_sha256) in written:
+                        if written_sha256 == sha256:
+                            results[index]['error'] = f"Erreur d'écriture : {e}"
+                    prepared[sha256] = None
+
+        for attempt in range(STORE_ATTEMPTS):
+            entries = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                # Quota vérifié dans la transaction : deux envois simultanés ne peuvent pas le dépasser
+                remaining = remaining_quota(user_id, conn)
+                for index, (_, filesize, sha256) in written:
+                    if prepared[sha256] is None:
+                        continue
+                    if remaining is not None:
+                        if filesize > remaining:
+                            results[index]['error'] = 'Quota de stockage dépassé'
+                            continue
+                        remaining -= filesize
+                    stored_filename, codec = store_blob(conn, sha256, prepared[sha256][3])
+                    entries.append((index, File(
+                        filename=stored_filename,
+                        original_filename=secure_filename(files[index].filename),
+                        uploaded_by=user_id,
+                        upload_date=datetime.now(),
+                        filesize=filesize,
+                        sha256=sha256,
+                        codec=codec
+                    )))
+                File.save_many([entry for _, entry in entries], conn)
+                conn.commit()
+                break
+            except BlobUnavailable as e:
+                # Contenu supprimé entre sa préparation et la transaction : le ranger de nouveau
+                conn.rollback()
+                if attempt + 1 >= STORE_ATTEMPTS:
+                    raise
+                prepare(e.sha256)
+            except BaseException:
+                conn.rollback()
+                raise
+    finally:
+        conn.close()
+        # Les réservations restées sans référence (quota, erreur) sont libérées
+        released = [abandon_blob(sha256, item[3]) for sha256, item in prepared.items() if item]
+        unlinker.enqueue(filename for filename in released if filename)
+        for _, (temp_path, _, _) in written:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    for index, entry in entries:
+        results[index].update(ok=True, file_id=entry.id, uid=entry.uid, size=entry.filesize)
+    return results
+
+
+def _temp_path(upload_id):
+    return os.path.join(Config.UPLOAD_TEMP_FOLDER, f"{upload_id}.part")
+
+
+def _hash_file(path, length):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        remaining = length
+        while remaining > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            hasher.update(block)
+            remaining -= len(block)
+    return hasher
+
+
+def _take_hasher(upload_id, offset):
+    # Retiré avant l'écriture du morceau : un morceau interrompu ne doit pas laisser
+    # une empreinte ayant consommé des octets jamais acquittés
+    with _hashers_lock:
+        state = _hashers.pop(upload_id, None)
+    if offset == 0:
+        return hashlib.sha256()
+    if state and state[0] == offset:
+        return state[1]
+    return None
+
+
+def _keep_hasher(upload_id, offset, hasher):
+    now = time.monotonic()
+    with _hashers_lock:
+        _hashers[upload_id] = (offset, hasher, now)
+        # Sessions abandonnées (ou terminées sur un autre worker) : ne pas les garder indéfiniment
+        for key in [key for key, state in _hashers.items() if now - state[2] > Config.UPLOAD_SESSION_TTL]:
+            del _hashers[key]
+
+
+def create_upload(user_id, filename, total_size):
+    """
+    Démarre une session d'upload par morceaux.
+
+    Args:
+        user_id (int): ID de l'utilisateur qui télécharge le fichier.
+        filename (str): Nom original du fichier.
+        total_size (int): Taille totale annoncée en octets.
+
+    Returns:
+        str: Identifiant de la session d'upload.
+    """
+    if total_size is None or total_size < 0:
+        raise UploadError('Taille de fichier invalide')
+    if total_size > Config.MAX_UPLOAD_SIZE:
+        raise UploadError('Le fichier est trop volumineux', status=413)
+    remaining = remaining_quota(user_id)
+    if remaining is not None and total_size > remaining:
+        raise UploadError('Quota de stockage dépassé', status=413)
+
+    upload_id = secrets.token_hex(16)
+    os.makedirs(Config.UPLOAD_TEMP_FOLDER, exist_ok=True)
+    open(_temp_path(upload_id), 'wb').close()
+
+    conn = get_db_connection()
+    now = datetime.now()
+    conn.execute(
+        """INSERT INTO uploads (id, user_id, original_filename, total_size, received, created_at, updated_at)
+           VALUES (?, ?, ?, ?, 0, ?, ?)""",
+        (upload_id, user_id, filename, total_size, now, now)
+    )
+    conn.commit()
+    conn.close()
+    return upload_id
+
+
+def get_upload(upload_id, user_id):
+    """
+    Récupère une session d'upload appartenant à un utilisateur.
+
+    Args:
+        upload_id (str): Identifiant de la session.
+        user_id (int): ID de l'utilisateur propriétaire.
+
+    Returns:
+        sqlite3.Row: Ligne de la table uploads.
+    """
+    conn = get_db_connection()
+    upload = conn.execute(
+        "SELECT * FROM uploads WHERE id = ? AND user_id = ?", (upload_id, user_id)
+    ).fetchone()
+    conn.close()
+    if not upload:
+        raise UploadError('Session d\'upload introuvable', status=404)
+    return upload
+
+
+def append_chunk(upload, offset, stream):
+    """
+    Ajoute un morceau à la fin du fichier temporaire d'un upload.
+
+    Le morceau doit commencer exactement au dernier offset acquitté ; les octets
+    écrits au-delà (morceau interrompu) sont tronqués avant l'écriture.
+
+    Args:
+        upload (sqlite3.Row): Session d'upload.
+        offset (int): Position du morceau annoncée par le client.
+        stream: Flux du corps de la requête.
+
+    Returns:
+        int: Nouvel offset acquitté.
+    """
+    received = upload['received']
+    if offset != received:
+        raise UploadError('Offset inattendu', status=409, offset=received)
+
+    path = _temp_path(upload['id'])
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Fichier temporaire introuvable', status=410)
+
+    with f:
+        # Un seul écrivain à la fois pour un même upload, y compris entre workers
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('Un morceau est déjà en cours d\'envoi', status=409, offset=received)
+
+        hasher = _take_hasher(upload['id'], received)
+        f.truncate(received)
+        f.seek(received)
+        written = copy_stream(stream, f, hasher, limit=upload['total_size'] - received)
+        f.flush()
+        os.fsync(f.fileno())
+
+        new_offset = received + written
+        conn = get_db_connection()
+        cursor = conn.execute(
+            "UPDATE uploads SET received = ?, updated_at = ? WHERE id = ? AND received = ?",
+            (new_offset, datetime.now(), upload['id'], received)
+        )
+        conn.commit()
+        conn.close()
+        if cursor.rowcount != 1:
+            raise UploadError('Offset modifié pendant l\'envoi', status=409)
+
+    # Empreinte conservée seulement une fois le nouvel offset validé
+    if hasher is not None:
+        _keep_hasher(upload['id'], new_offset, hasher)
+    return new_offset
+
+
+def finalize_upload(upload, expected_sha256=None):
+    """
+    Termine un upload : vérifie la taille et l'empreinte, range le contenu dans
+    le stockage par empreinte et l'enregistre dans la base de données.
+
+    Args:
+        upload (sqlite3.Row): Session d'upload.
+        expected_sha256 (str): Empreinte attendue, calculée par le client (optionnel).
+
+    Returns:
+        tuple: (File enregistré, empreinte SHA-256 hexadécimale).
+    """
+    if upload['received'] != upload['total_size']:
+        raise UploadError('Upload incomplet', status=409, offset=upload['received'])
+
+    path = _temp_path(upload['id'])
+    with _hashers_lock:
+        state = _hashers.get(upload['id'])
+    if state and state[0] == upload['received']:
+        sha256 = state[1].hexdigest()
+    else:
+        # Empreinte incrémentale indisponible : un seul passage sur le fichier complet
+        sha256 = _hash_file(path, upload['received']).hexdigest()
+    if expected_sha256 and expected_sha256.lower() != sha256:
+        raise UploadError('Empreinte SHA-256 différente', status=422)
+
+    # Les morceaux sont reçus tels quels (reprise à un offset exact) : la compression
+    # se fait ici, en un passage, dans un second fichier temporaire
+    source, codec = path, codec_for(upload['original_filename'])
+    stored = False
+    token = None
+    conn = get_db_connection()
+    try:
+        if codec and not conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone():
+            source = f"{path}.{codec}"
+            compress_file(path, source, codec)
+
+        # Contenu rangé dans le stockage avant la transaction (envoi réseau avec S3)
+        codec, token = prepare_blob(source, sha256, upload['total_size'], codec if source != path else None)
+        for attempt in range(STORE_ATTEMPTS):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                # Quota revérifié à la fin : d'autres fichiers ont pu être envoyés depuis l'initialisation
+                remaining = remaining_quota(upload['user_id'], conn)
+                if remaining is not None and upload['total_size'] > remaining:
+                    raise UploadError('Quota de stockage dépassé', status=413)
+
+                # Référencer le contenu, stocké une seule fois sous son empreinte
+                stored_filename, codec = store_blob(conn, sha256, token)
+                file_entry = File(
+                    filename=stored_filename,
+                    original_filename=secure_filename(upload['original_filename']),
+                    uploaded_by=upload['user_id'],
+                    upload_date=datetime.now(),
+                    filesize=upload['total_size'],
+                    sha256=sha256,
+                    codec=codec
+                )
+                file_entry.save(conn)
+                conn.execute("DELETE FROM uploads WHERE id = ?", (upload['id'],))
+                conn.commit()
+                stored = True
+                break
+            except BlobUnavailable:
+                # Contenu supprimé entre sa préparation et la transaction : le ranger de nouveau
+                conn.rollback()
+                if attempt + 1 >= STORE_ATTEMPTS:
+                    raise
+                codec, token = prepare_blob(source, sha256, upload['total_size'],
+                                            codec_for(upload['original_filename']) if source != path else None)
+            except BaseException:
+                conn.rollback()
+                raise
+    finally:
+        conn.close()
+        released = abandon_blob(sha256, token)
+        if released:
+            unlinker.enqueue([released])
+        # Succès : les fichiers reçus ne sont plus utiles ; échec : ne garder que le fichier
+        # reçu (la session peut encore être finalisée)
+        for leftover in ([path, source] if stored else [source] if source != path else []):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    with _hashers_lock:
+        _hashers.pop(upload['id'], None)
+    return file_entry, sha256
+
+
+def discard_upload(upload_id):
+    """
+    Supprime une session d'upload et son fichier temporaire.
+
+    Args:
+        upload_id (str): Identifiant de la session.
+    """
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+
+    conn = get_db_connection()
+    conn.execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+    conn.commit()
+    conn.close()
+
+    try:
+        os.remove(_temp_path(upload_id))
+    except FileNotFoundError:
+        pass